@@ -1,6 +1,7 @@
 from bot import Bot
 from server import newgame, play_one_turn
 from server.sbc_parameters import LOG_LEVEL
+from server.report_format import read_binary_report
 
 import random
 import string
@@ -10,15 +11,23 @@ import json
 import logging
 from time import time
 
-def get_report(player_name: str, working_folder: str, turn: int):
+REPORT_CHANNEL = "file-binary"      # file-json, file-yaml or file-binary
+IN_MEMORY = True                    # simulation without any file : reports as dicts, orders as objects
+
+def get_report(player_name: str, working_folder: str, turn: int, channel: str = REPORT_CHANNEL):
+    # BINARY : columns of typed arrays, parsed as is by the bot
+    if channel == "file-binary":
+        return read_binary_report(f"{working_folder}/report.{player_name}.T{turn}.NPZ")
+
+    # YAML
+    if channel == "file-yaml":
+        with open(f"{working_folder}/report.{player_name}.T{turn}.YML", "r", encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
     # JSON
     with open(f"{working_folder}/report.{player_name}.T{turn}.JSON", "r", encoding='utf-8') as f:
         report = json.load(f)
 
-    # YAML
-    # with open(f"{working_folder}/report.{player_name}.T{turn}.YML", "r", encoding='utf-8') as f:
-    #     report = yaml.safe_load(f)
-
     return report
 
 
@@ -35,14 +44,18 @@ if __name__ == "__main__":
     # init game settings
     game_folder = '/dev/shm/sbc-' + ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
     logger.info(f"{LOG_LEVEL(0)}Temporary folder for this game will be {game_folder}")
-    os.makedirs(game_folder, exist_ok=True)
-    os.makedirs(f"{game_folder}/orders/archive")
+    if not IN_MEMORY:
+        os.makedirs(game_folder, exist_ok=True)
+        os.makedirs(f"{game_folder}/orders/archive")
 
     # init server
     start = time()
     with open("config.EXAMPLE.yml", "r") as f:
         game_config = yaml.safe_load(f)
-    newgame("testing", game_folder, game_config)
+    if IN_MEMORY:
+        reports = newgame("testing", game_folder, game_config, report_channel="dict", persist=False)
+    else:
+        newgame("testing", game_folder, game_config, report_channel=REPORT_CHANNEL)
     stop = time()
     logger.debug(f"{LOG_LEVEL(1)}# Timing # game creation in {(stop-start)*1000:.1f} ms")
 
@@ -64,16 +77,23 @@ if __name__ == "__main__":
         # bots play
         logger.info(f"{LOG_LEVEL(1)}bots reads report from turn {turn_nb}, make choices and writing orders for turn {turn_nb+1}")
         start = time()
+        orders = []
         for bot in bots:
-            report = get_report(bot.name, game_folder, turn_nb)
-            bot.play_turn(report)
-            bot.write_order()
+            if IN_MEMORY:
+                bot.play_turn(reports[bot.name])
+                orders.append(bot.get_orders())
+            else:
+                bot.play_turn(get_report(bot.name, game_folder, turn_nb))
+                bot.write_order()
         stop = time()
         logger.debug(f"{LOG_LEVEL(1)}# Timing # Bots playing in {(stop - start) * 1000:.1f} ms")
 
         # server play one turn
         start = time()
-        play_one_turn("testing", game_folder)
+        if IN_MEMORY:
+            reports = play_one_turn("testing", game_folder, report_channel="dict", orders=orders, persist=False)
+        else:
+            play_one_turn("testing", game_folder, report_channel=REPORT_CHANNEL)
         stop = time()
         logger.debug(f"{LOG_LEVEL(1)}# Timing # Game engine running turn {turn_nb} in {(stop - start) * 1000:.1f} ms")
 
@@ -4,6 +4,8 @@ import random
 from time import time
 import os
 import json
+from server.report_format import is_columnar
+from server.orders import Orders
 
 class Bot:
     def __init__(self, config: dict, game_folder: str):
@@ -12,7 +14,7 @@ class Bot:
 
         # init instance variables
         self.turn = 0
-        self.orders = []
+        self.orders = {}    # parsed orders, see server.orders.Orders.from_dict()
         self.report = None
         self.me = None
         self.colonies = {}
@@ -52,7 +54,10 @@ class Bot:
             json.dump(self.brain, f, ensure_ascii=False, indent=4)
 
     def parse_report(self, report: dict):
-        """ Parse the orders given in dict format and create objects for easy & quick manipulation """
+        """
+        Parse the report and create objects for easy & quick manipulation
+        report is a dict (JSON/YAML report) or the columns of a binary report (see server/report_format.py)
+        """
         self.report = report
 
         # reset the object memory (class attribute)
@@ -63,6 +68,26 @@ class Bot:
         Colony.reset()
         Ship.reset()
 
+        if is_columnar(report):
+            current_turn = self.parse_columns(report)
+        else:
+            current_turn = self.parse_dict(report)
+
+        # update star.visited
+        # visited if we have a colony or if we have a ship
+        # store info in brain for persistency
+        positions = self.positions_where_i_am()
+        for position in positions:
+            if Star.exists(position):
+                self.brain["visited_stars"].add(position.to_tuple())
+        for (x, y, z) in self.brain["visited_stars"]:
+            star = Star(x, y, z)
+            star.visited = True
+
+        return current_turn
+
+    def parse_dict(self, report: dict):
+        """ parse a report given as a dict """
         # parsing turn
         current_turn = report["turn"]
 
@@ -133,16 +158,70 @@ class Bot:
                                   )
             self.ships.append(s)
 
-        # update star.visited
-        # visited if we have a colony or if we have a ship
-        # store info in brain for persistency
-        positions = self.positions_where_i_am()
-        for position in positions:
-            if Star.exists(position):
-                self.brain["visited_stars"].add(position.to_tuple())
-        for (x, y, z) in self.brain["visited_stars"]:
-            star = Star(x, y, z)
-            star.visited = True
+        return current_turn
+
+    def parse_columns(self, columns: dict):
+        """ parse a binary report, given as columns of typed arrays : no intermediate dicts """
+        current_turn = int(columns["turn"])
+
+        # parsing stars & planets
+        stars = []
+        for name, (x, y, z) in zip(columns["star_name"].tolist(), columns["star_xyz"].tolist()):
+            star = Star(Position(x, y, z))
+            star.name = name or None
+            stars.append(star)
+
+        for star_id, numero, temperature, humidity, food_factor, meca_factor, max_food_prod, max_wf, max_parts_prod, max_ro in zip(
+                columns["planet_star"].tolist(), columns["planet_numero"].tolist(),
+                columns["planet_temperature"].tolist(), columns["planet_humidity"].tolist(),
+                columns["planet_food_factor"].tolist(), columns["planet_meca_factor"].tolist(),
+                columns["planet_max_food_prod"].tolist(), columns["planet_max_wf"].tolist(),
+                columns["planet_max_parts_prod"].tolist(), columns["planet_max_ro"].tolist()):
+            star = stars[star_id]
+            p = Planet(star,
+                       numero,
+                       temperature=temperature,
+                       humidity=humidity,
+                       max_food_prod=max_food_prod,
+                       max_parts_prod=max_parts_prod,
+                       max_ro=max_ro,
+                       max_wf=max_wf,
+                       food_factor=food_factor,
+                       meca_factor=meca_factor
+                       )
+            self.planets.append(p)
+            star.planets[p.numero] = p
+
+        # parsing players
+        self.me = Player(self.name)
+        self.me.EU = int(columns["player_EU"])
+        self.me.tech = Technologies(int(columns["tech_bio"]), int(columns["tech_meca"]), int(columns["tech_gv"]))
+
+        # parsing colonies
+        for name, (x, y, z), numero, wf, ro, food, parts, food_production, parts_production in zip(
+                columns["colony_name"].tolist(), columns["colony_star_xyz"].tolist(),
+                columns["colony_numero"].tolist(), columns["colony_WF"].tolist(), columns["colony_RO"].tolist(),
+                columns["colony_food"].tolist(), columns["colony_parts"].tolist(),
+                columns["colony_food_production"].tolist(), columns["colony_parts_production"].tolist()):
+            colony = Colony(self.me,
+                            Planet(Star(x, y, z), numero),
+                            name=name,
+                            RO=ro,
+                            WF=wf,
+                            food=food,
+                            parts=parts,
+                            food_production=food_production,
+                            parts_production=parts_production
+                            )
+            self.colonies[colony.name] = colony
+
+        # parsing ships
+        for owner, name, ship_type, size, (x, y, z) in zip(columns["ship_owner"].tolist(), columns["ship_name"].tolist(),
+                                                            columns["ship_type"].tolist(), columns["ship_size"].tolist(),
+                                                            columns["ship_xyz"].tolist()):
+            s = Ship(Player(owner), name, type=ship_type, size=size)
+            s.position = Position(x, y, z)
+            self.ships.append(s)
 
         return current_turn
 
@@ -163,16 +242,20 @@ class Bot:
         return pos_where_i_am
 
     def play_turn(self, report: dict):
+        """ choose the orders for the next turn, as parsed structures : no text to write then to parse again """
         self.turn = self.parse_report(report)
-        self.orders = [f"player {self.name}"]
+        production = {}
+        movements = []
+        combat = []
+        self.orders = {"player": self.name, "production": production, "movements": movements, "combat": combat}
 
         # PRODUCTION
         for colony in self.me.colonies:
-            self.orders.append(f"PRODUCTION PL {colony.name}")
+            commands = production[colony.name] = []
 
             available_food = colony.food + colony.food_production
             if available_food > 100 and len(self.me.ships) < 2:
-                self.orders.append(f"BUILD 1 BF1 {generate_name()}-{random.randrange(1,99)}")
+                commands.append(["BUILD", "1", "BF1", f"{generate_name()}-{random.randrange(1,99)}"])
             else:
                 # the half of production to develop WF/RO for production
                 WF_trained = int(available_food / 2 // 5)
@@ -182,25 +265,25 @@ class Bot:
                 RO_manufactured = int(available_parts / 2 // 5)
                 parts_selling = int(available_parts - RO_manufactured * 5)
 
-                self.orders.append(f"BUILD {WF_trained} WF")
-                self.orders.append(f"SELL {food_selling} food")
-                self.orders.append(f"BUILD {RO_manufactured} RO")
-                self.orders.append(f"SELL {parts_selling} parts")
-                self.orders.append(f"RESEARCH {food_selling} BIO")
-                self.orders.append(f"RESEARCH {parts_selling} MECA")
+                commands.append(["BUILD", str(WF_trained), "WF"])
+                commands.append(["SELL", str(food_selling), "food"])
+                commands.append(["BUILD", str(RO_manufactured), "RO"])
+                commands.append(["SELL", str(parts_selling), "parts"])
+                commands.append(["RESEARCH", str(food_selling), "BIO"])
+                commands.append(["RESEARCH", str(parts_selling), "MECA"])
 
         # MOVEMENTS
-        self.orders.append(f"MOVEMENTS")
         for ship in self.me.ships:
             # destination = self.closest_unvisited_star(ship)
-            # x = destination.position.x
-            # y = destination.position.y
-            # z = destination.position.z
-            # self.orders.append(f"JUMP {ship.type}{ship.size} {ship.name} {x} {y} {z}")
-            self.orders.append(f"EXPLORE {ship.type}{ship.size} {ship.name}")
+            # movements.append(["JUMP", f"{ship.type}{ship.size}", ship.name, str(x), str(y), str(z)])
+            movements.append(["EXPLORE", f"{ship.type}{ship.size}", ship.name])
 
         # COMBAT
-        self.orders.append(f"COMBAT")
+        # nothing yet
+
+    def get_orders(self):
+        """ orders of the turn for the game engine, without any file (in-memory simulations) """
+        return Orders.from_dict(self.orders)
 
     # N'est plus utile : était utilisé pour l'explo, mais la comamnde EXPLORE fait le taff
     # def closest_unvisited_star(self, ship: Ship):
@@ -220,8 +303,23 @@ class Bot:
     #
     #     return destination
 
+    def orders_lines(self):
+        """ orders as the lines of an orders file, names including spaces are quoted """
+        def line(words):
+            return " ".join(f'"{word}"' if " " in word else word for word in words)
+
+        lines = [line(["player", self.orders["player"]])]
+        for colony_name, commands in self.orders["production"].items():
+            lines.append(line(["PRODUCTION", "PL", colony_name]))
+            lines.extend(line(command) for command in commands)
+        lines.append("MOVEMENTS")
+        lines.extend(line(command) for command in self.orders["movements"])
+        lines.append("COMBAT")
+        lines.extend(line(command) for command in self.orders["combat"])
+        return lines
+
     def write_order(self):
-        with open(f"{self.game_folder}/orders/orders.{self.name}.T{str(self.turn)}.txt", "w") as f:
-            f.write('\n'.join(self.orders))      # adding line separators (='\n') between each item of the list
+        with open(f"{self.game_folder}/orders/orders.{self.name}.T{str(self.turn)}.txt", "w", encoding="utf-8") as f:
+            f.write('\n'.join(self.orders_lines()))      # adding line separators (='\n') between each item of the list
 
 
@@ -10,6 +10,8 @@ class Position:
     Si une position avec les coords (x, y, z) existe déjà, renvoie cette position
     Sinon en crée une nouvelle et l'enregistre
     """
+    __slots__ = ("x", "y", "z", "ships", "distances")
+
     positions = {}
 
     def __new__(cls, x: int, y: int, z: int):
@@ -58,6 +60,8 @@ class Position:
 
 class Star:
     """ Fabrique pour éviter les doublons """
+    __slots__ = ("position", "name", "visited", "planets")
+
     stars = {}
 
     def __new__(cls, *args, **kwargs):
@@ -113,6 +117,8 @@ class Star:
 
 class Planet:
     """ Fabrique pour éviter les doublons """
+    __slots__ = ("star", "numero", "temperature", "humidity", "food_factor", "meca_factor", "max_food_prod", "max_parts_prod", "max_ro", "max_wf")
+
     planets = {}
 
     def __new__(cls, star: Star, numero: int, **kwargs):
@@ -143,6 +149,8 @@ class Planet:
 
 class Player:
     """ Fabrique pour éviter les doublons """
+    __slots__ = ("name", "ships", "colonies", "tech", "EU")
+
     players = {}
 
     def __new__(cls, name: str):
@@ -155,7 +163,7 @@ class Player:
             instance = object.__new__(cls)
             cls.players[name] = instance
             instance.name = name
-            instance.ships = set()  # to easily get all ships from a player
+            instance.ships = []  # to easily get all ships from a player, in creation order
             instance.colonies = []
 
             return instance
@@ -164,7 +172,7 @@ class Player:
     def reset(cls):
         cls.players = {}
 
-@dataclass
+@dataclass(slots=True)
 class Technologies:
     bio: int
     meca: int
@@ -172,6 +180,8 @@ class Technologies:
 
 class Colony:
     """ Fabrique pour éviter les doublons """
+    __slots__ = ("player", "planet", "name", "RO", "WF", "food", "parts", "food_production", "parts_production")
+
     colonies = {}
 
     def __new__(cls, player: Player, planet: Planet, **kwargs):
@@ -206,6 +216,8 @@ class Colony:
 
 class Ship:
     """ Fabrique pour éviter les doublons """
+    __slots__ = ("player", "name", "type", "size", "_position")
+
     ships = {}
 
     def __new__(cls, player: Player, ship_name: str, **kwargs):
@@ -225,7 +237,7 @@ class Ship:
             instance._position = None
 
             # creating backref to easily get all ships from a player
-            player.ships.add(instance)
+            player.ships.append(instance)
 
             return instance
 
@@ -6,6 +6,8 @@ import logging
 import yaml
 
 from server import play, newgame
+from server.data import GameData
+from server.daemon import GameServer, HostedGame
 
 SHM_FOLDER = "/dev/shm/"
 
@@ -19,6 +21,8 @@ if __name__ == "__main__":
     parser_newgame.add_argument("game_name", help="name of the game to create")
     parser_newgame.add_argument("config_file", help="path to config file")
     parser_newgame.add_argument("--tmp", help="Determine game working folder, where tmp files will be written. If not given, a temp directory will be choosen automatically")
+    parser_newgame.add_argument("--channel", type=str, choices=["file-json", "file-yaml", "file-binary"], help="reports format, default= file-json", default="file-json")
+    parser_newgame.add_argument("--seed", type=int, help="seed of the game, same seed gives the same game. Default is a random seed")
     parser_newgame.add_argument("--loglevel", type=str, choices=["error", "info", "debug"], help="logging level, default= error. Error are always printed", default="error")
     parser_newgame.add_argument("--logfile", type=str, help="the file to store the logs, default is None : logging is printed & not stored")
 
@@ -26,9 +30,29 @@ if __name__ == "__main__":
     parser_play = subparsers.add_parser("play", help="play one turn")
     parser_play.add_argument("game_name", help="name of the game to play one turn")
     parser_play.add_argument("game_folder", help="Determine game folder, where tmp files will be written.")
+    parser_play.add_argument("--workers", type=int, help="number of processes generating the reports, default= 1", default=1)
+    parser_play.add_argument("--compact", action="store_true", help="write JSON reports without indentation")
+    parser_play.add_argument("--channel", type=str, choices=["file-json", "file-yaml", "file-binary"], help="reports format, default= file-json", default="file-json")
     parser_play.add_argument("--loglevel", type=str, choices=["error", "info", "debug"], help="logging level, default= error. Error are always printed", default="error")
     parser_play.add_argument("--logfile", type=str, help="the file to store the logs, default is None : logging is printed & not stored")
 
+    # game server
+    parser_serve = subparsers.add_parser("serve", help="host many games, play their turns when their deadline hits")
+    parser_serve.add_argument("config_file", help="path to the config file of the hosted games, see server/daemon.py")
+    parser_serve.add_argument("--workers", type=int, help="number of worker processes playing the turns, default= 2", default=2)
+    parser_serve.add_argument("--resident", type=int, help="number of worlds kept in memory by each worker, default= 8", default=8)
+    parser_serve.add_argument("--loglevel", type=str, choices=["error", "info", "debug"], help="logging level, default= error. Error are always printed", default="error")
+    parser_serve.add_argument("--logfile", type=str, help="the file to store the logs, default is None : logging is printed & not stored")
+
+    # rebuild a past turn
+    parser_rebuild = subparsers.add_parser("rebuild", help="rebuild the world at a past turn, from checkpoint and turn journal")
+    parser_rebuild.add_argument("game_name", help="name of the game")
+    parser_rebuild.add_argument("game_folder", help="game folder, where checkpoints and turn journal are stored")
+    parser_rebuild.add_argument("turn", type=int, help="the turn to rebuild")
+    parser_rebuild.add_argument("output", help="snapshot file to write, readable with GameData().load_gamedata()")
+    parser_rebuild.add_argument("--loglevel", type=str, choices=["error", "info", "debug"], help="logging level, default= error. Error are always printed", default="error")
+    parser_rebuild.add_argument("--logfile", type=str, help="the file to store the logs, default is None : logging is printed & not stored")
+
     args = parser.parse_args()
 
     # --- GLOBAL/SHARED FLAGS ---
@@ -67,11 +91,23 @@ if __name__ == "__main__":
         with open("config.EXAMPLE.yml", "r") as f:
             config = yaml.safe_load(f)
 
-        newgame(args.game_name, args.tmp, config)
+        newgame(args.game_name, args.tmp, config, report_channel=args.channel, seed=args.seed)
 
     # --- NEW GAME FLAGS ---
     elif args.command == "play":
-        play.play_one_turn(args.game_name, args.game_folder)
+        play.play_one_turn(args.game_name, args.game_folder, report_workers=args.workers, compact_reports=args.compact,
+                           report_channel=args.channel)
+
+    # --- SERVE FLAGS ---
+    elif args.command == "serve":
+        with open(args.config_file, "r") as f:
+            games = [HostedGame.from_dict(game) for game in yaml.safe_load(f)["games"]]
+        GameServer(games, workers=args.workers, resident=args.resident).serve_forever()
+
+    # --- REBUILD FLAGS ---
+    elif args.command == "rebuild":
+        GameData().load_game(args.game_folder, args.game_name, args.turn)
+        GameData().dump_gamedata(args.output)
 
 
 
@@ -0,0 +1,72 @@
+"""
+Memory benchmark of the world objects : __slots__ classes (server/data.py) against dict-backed objects (previous layout)
+
+The galaxy is created by the game engine, then copied twice, outside of the registries :
+with the classes of the game engine, and into dict-backed objects with the same attributes.
+    python memory_benchmark.py [nb_of_players]      # default 7000 players : about 100k planets
+"""
+import sys
+import tracemalloc
+from timeit import timeit
+
+from server.data import GameData, Star, Planet, Position
+from server.newgame import create_galaxy
+
+
+class DictObject:
+    """ previous layout : attributes stored in the __dict__ of each object """
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+
+def traced(build):
+    """ memory allocated by build() and kept, in bytes """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def new_object(cls, **attributes):
+    """ an object of the game engine, outside of its registry """
+    instance = object.__new__(cls)
+    for name, value in attributes.items():
+        setattr(instance, name, value)
+    return instance
+
+
+def copy_galaxy(positions, stars, planets, layout):
+    """ copy of the galaxy objects, with the classes of the game engine or dict-backed objects """
+    def make(cls, **attributes):
+        return new_object(cls, **attributes) if layout == "slots" else DictObject(**attributes)
+
+    new_positions = {p: make(Position, x=p.x, y=p.y, z=p.z, ships=set()) for p in positions}
+    new_stars = {s: make(Star, position=new_positions[s.position], _name=s.name, visited_by={}, planets={}, seen_by=set())
+                 for s in stars}
+    new_planets = [make(Planet, star=new_stars[p.star], numero=p.numero, temperature=p.temperature,
+                        humidity=p.humidity, colony=None) for p in planets]
+    for planet in new_planets:
+        planet.star.planets[planet.numero] = planet
+    return list(new_positions.values()), list(new_stars.values()), new_planets
+
+
+if __name__ == "__main__":
+    nb_of_players = int(sys.argv[1]) if len(sys.argv) > 1 else 7000
+
+    GameData.reset()
+    create_galaxy(nb_of_players)
+    galaxy = list(Position.positions.values()), list(Star.stars.values()), list(Planet.planets.values())
+    print(f"{len(galaxy[0])} positions, {len(galaxy[1])} stars, {len(galaxy[2])} planets")
+
+    copies = {}
+    for layout in ("dict", "slots"):
+        copies[layout], size = traced(lambda: copy_galaxy(*galaxy, layout))
+        print(f"{layout:>5} layout : {size / 1e6:6.1f} MB")
+
+    # attribute access in a hot loop
+    for layout, (positions, stars, planets) in copies.items():
+        t = timeit(lambda: sum(planet.temperature + planet.humidity for planet in planets), number=10)
+        print(f"{layout:>5} layout : attribute access {t / 10 / len(planets) * 1e9:.1f} ns per planet")
@@ -0,0 +1,80 @@
+"""
+Parsing benchmark of the orders files : tokenizer of server/orders.py against the previous line splitting
+
+A synthetic orders file is written, as the ones of the bots : colonies with their production, then many ships moving.
+    python orders_benchmark.py [nb_of_lines]      # default 50000 lines
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+from timeit import timeit
+
+from server.orders import Orders
+
+# previous parsing : split on #, regex split, quotes stripped from each token, header verbs lowercased again and again
+previous_regex = re.compile(r"""[^ \t"'\n]+|"[^"]*"|'[^']*'""")
+
+
+def previous_parsing_line(line: str):
+    line = line.split("#")[0]
+    return [m.group().strip("\"'") for m in previous_regex.finditer(line)]
+
+
+def previous_parsing_file(filename: str):
+    prod, move, combat, flag = {}, [], [], None
+    with open(filename, "r") as f:
+        for line in f:
+            result = previous_parsing_line(line)
+            if result:
+                if result[0].lower() == "production":
+                    flag = prod[result[2].lower()] = []
+                elif result[0].lower() == "movements":
+                    flag = move
+                elif result[0].lower() == "combat":
+                    flag = combat
+                elif result[0].lower() == "player":
+                    flag = None
+                else:
+                    flag.append(result)
+    return prod, move, combat
+
+
+def synthetic_orders(nb_of_lines: int, rnd: random.Random):
+    """ lines of an orders file : 1/10 of production, the rest of movements, some quoted names and comments """
+    nb_of_colonies = max(1, nb_of_lines // 50)
+    lines = ["player Bob"]
+    for i in range(nb_of_colonies):
+        lines.append(f'PRODUCTION PL "Colony {i}"')
+        lines.append(f"BUILD {rnd.randrange(100)} WF")
+        lines.append(f"SELL {rnd.randrange(100)} food   # income of the turn")
+        lines.append(f'BUILD 1 BF{rnd.randrange(1, 5)} "Firefly {i}"')
+        lines.append(f"RESEARCH {rnd.randrange(100)} bio")
+    lines.append("MOVEMENTS")
+    while len(lines) < nb_of_lines:
+        ship = rnd.randrange(10 ** 6)
+        if rnd.random() < 0.5:
+            lines.append(f"EXPLORE BS1 Scout-{ship}")
+        else:
+            lines.append(f"JUMP BF2 Fighter-{ship} {rnd.randrange(-50, 50)} {rnd.randrange(-50, 50)} "
+                         f"{rnd.randrange(-50, 50)}")
+    lines.append("COMBAT")
+    return lines
+
+
+if __name__ == "__main__":
+    nb_of_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "orders.txt")
+        with open(filename, "w") as f:
+            f.write("\n".join(synthetic_orders(nb_of_lines, random.Random(1))))
+
+        orders = Orders(filename)
+        print(f"{nb_of_lines} lines : {len(orders.prod_cmd)} colonies, {len(orders.move_cmd)} movements, "
+              f"{len(orders.diagnostics)} errors")
+
+        for name, parse in (("previous", previous_parsing_file), ("tokenizer", Orders)):
+            t = timeit(lambda: parse(filename), number=5) / 5
+            print(f"{name:>9} : {t * 1000:7.1f} ms, {t / nb_of_lines * 1e9:6.0f} ns per line")
@@ -0,0 +1,197 @@
+"""
+Combat phase : every ATTACK order of the turn is resolved together, combats are simultaneous
+
+    COMBAT
+    ATTACK BF2 Firefly Bob          # the fighter Firefly attacks the ships of Bob in its sector
+
+An attack puts 2 players at war in the sector (Position) of the attacking ship,
+all the attacks of a sector make one engagement, the sectors don't depend on each other :
+they are resolved in parallel (threads), each one with its own random stream (see server/rng.py).
+
+Resolution of an engagement, in one vectorized pass over its ships :
+    - the fighters of the players at war fire FIGHTER_SHOTS_PER_LEVEL shots by level of size,
+      at the ships of the attacked player (fighter given an ATTACK order) or of all the enemies of their owner
+    - each shot hits with HIT_CHANCE, a hit lands on a targeted ship with a chance proportional to its size
+    - a ship loses one level every HULL_PER_LEVEL hits, a ship without level is destroyed
+Hits are computed from the ships as they were before the combat : a destroyed ship has fired too.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import numpy as np
+
+from server.data import GameData, Player, Ship, Position
+from server.commands import CompiledCommand, CompiledOrders, PhaseContext, Verb
+from server.report import Report
+import server.sbc_parameters as sbc
+
+# logging
+logger = logging.getLogger("sbc")
+
+FIGHTERS = (sbc.BIO_FIGHTER, sbc.MECA_FIGHTER)
+
+
+class Engagement:
+    """
+    Combat in a sector between the players at war
+
+    Usage :
+        engagement = Engagement(position)
+        engagement.add_attack(ship, target_player)
+        engagement.prepare()                # arrays of the ships, before the combat
+        hits = engagement.resolve(rng)      # hits taken by engagement.ships[i], rng : numpy Generator
+    """
+    def __init__(self, position: Position):
+        self.position = position
+        self.enemies = {}       # player: set of the players at war with him in this sector
+        self.attacks = {}       # ship: attacked player
+
+        # set by prepare()
+        self.ships = []
+        self.sizes = None       # size of self.ships[i]
+        self.shooter_group = None   # targets group of the shots of self.ships[i], -1 if it doesn't fire
+        self.groups = []        # groups of targets : array of indexes in self.ships
+
+    def add_attack(self, ship: Ship, target: Player):
+        self.attacks[ship] = target
+        self.enemies.setdefault(ship.player, set()).add(target)
+        self.enemies.setdefault(target, set()).add(ship.player)
+
+    def prepare(self):
+        """ ships of the players at war in a stable order, and who fires at who """
+        self.ships = sorted((ship for ship in self.position.ships if ship.player in self.enemies),
+                            key=lambda ship: (ship.player.name, ship.name))
+        self.sizes = np.fromiter((ship.size for ship in self.ships), dtype=np.int64, count=len(self.ships))
+
+        owner_ids = {player: i for i, player in enumerate(self.enemies)}
+        owners = np.fromiter((owner_ids[ship.player] for ship in self.ships), dtype=np.int64, count=len(self.ships))
+        groups = {}     # targeted players: group id
+        shooter_group = []
+        for ship in self.ships:
+            if ship.type not in FIGHTERS:
+                shooter_group.append(-1)
+                continue
+            targets = frozenset([self.attacks[ship]]) if ship in self.attacks else frozenset(self.enemies[ship.player])
+            shooter_group.append(groups.setdefault(targets, len(groups)))
+        self.shooter_group = np.array(shooter_group, dtype=np.int64)
+        self.groups = [np.flatnonzero(np.isin(owners, [owner_ids[player] for player in targets])) for targets in groups]
+
+    def resolve(self, rng: np.random.Generator):
+        """ hits taken by each ship, all the fighters fire at the same time """
+        count = len(self.ships)
+        hits_taken = np.zeros(count, dtype=np.int64)
+        shooters = self.shooter_group >= 0
+        if not shooters.any():
+            return hits_taken
+
+        shots = self.sizes[shooters] * sbc.FIGHTER_SHOTS_PER_LEVEL
+        hits = rng.binomial(shots, sbc.HIT_CHANCE)
+        hits_by_group = np.bincount(self.shooter_group[shooters], weights=hits, minlength=len(self.groups))
+
+        for targets, group_hits in zip(self.groups, hits_by_group.astype(np.int64).tolist()):
+            weights = self.sizes[targets]
+            if group_hits == 0 or weights.sum() == 0:
+                continue
+            landing = rng.choice(targets, size=group_hits, p=weights / weights.sum())
+            hits_taken += np.bincount(landing, minlength=count)
+
+        return hits_taken
+
+
+def combat_phase(players_orders: List[Tuple[Player, CompiledOrders, Report]], workers: int = 1):
+    """
+    orders execution for the combat phase, all players together
+
+    players_orders : (player, orders, report) of the players who have sent orders
+    workers : number of threads resolving the engagements
+    """
+    engagements = {}    # key = position, value = Engagement
+    reports = {}
+    for player, orders, report in players_orders:
+        reports[player] = report
+        context = PhaseContext(player, report)
+        for command in orders.combat:
+            logger.debug(f"{sbc.LOG_LEVEL(5)}cmd: {command.source}")
+            COMBAT_HANDLERS[command.verb](command, context, engagements)
+
+    # sectors in a stable order, the random stream of a sector only depends on its coords
+    engagements = sorted(engagements.values(), key=lambda e: (e.position.x, e.position.y, e.position.z))
+    rng = GameData().rng
+    generators = []
+    for engagement in engagements:
+        engagement.prepare()
+        position = engagement.position
+        generators.append(rng.generator("combat", GameData().turn, position.x, position.y, position.z))
+
+    if workers > 1 and len(engagements) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(Engagement.resolve, engagements, generators))
+    else:
+        results = [engagement.resolve(generator) for engagement, generator in zip(engagements, generators)]
+
+    for engagement, hits_taken in zip(engagements, results):
+        apply_hits(engagement, hits_taken, reports)
+
+
+def attack_cmd(command: CompiledCommand, context: PhaseContext, engagements: dict):
+    """
+        ATTACK BF2 Firefly Bob
+        command.name = "Firefly", command.target = "Bob"
+    """
+    player, report = context.player, context.report
+
+    # Ship concerned
+    ship = command.ship_of(player)
+    if ship is None:
+        report.record_combat(f"{command.name} doesn't exist for player {player.name}", 5)
+        return
+    if ship.type not in FIGHTERS:
+        report.record_combat(f"{ship.name} is not a fighter, it can't attack", 5)
+        return
+
+    # attacked player, he must have ships in the sector
+    target = Player.get(command.target)
+    if target is None or target is player:
+        report.record_combat(f"{ship.name} can't attack {command.target}", 5)
+        return
+    position = ship.position
+    if not any(other.player is target for other in position.ships):
+        report.record_combat(f"there is no ship of {target.name} in {position.x} {position.y} {position.z}", 5)
+        return
+
+    engagement = engagements.get(position)
+    if engagement is None:
+        engagement = engagements[position] = Engagement(position)
+    engagement.add_attack(ship, target)
+
+
+# execution of the combat commands, the attacks of all the players are gathered in engagements
+COMBAT_HANDLERS = {
+    Verb.ATTACK: attack_cmd,
+}
+
+
+def apply_hits(engagement: Engagement, hits_taken: np.ndarray, reports: dict):
+    """ damages of the ships, and report of the combat to the players at war """
+    position = engagement.position
+    lost_levels = (hits_taken // sbc.HULL_PER_LEVEL).tolist()
+    messages = []
+    for ship, size, lost in zip(engagement.ships, engagement.sizes.tolist(), lost_levels):
+        if lost == 0:
+            continue
+        if lost >= size:
+            messages.append(f"{ship.type}{size} {ship.name} of {ship.player.name} has been destroyed")
+            ship.delete()
+        else:
+            messages.append(f"{ship.type}{size} {ship.name} of {ship.player.name} has lost {lost} levels")
+            ship.size = size - lost
+            ship.record()
+
+    for player in sorted(engagement.enemies, key=lambda player: player.name):
+        report = reports.get(player)
+        if report is None:
+            continue
+        enemies = ", ".join(sorted(enemy.name for enemy in engagement.enemies[player]))
+        report.record_combat(f"Combat in {position.x} {position.y} {position.z} against {enemies}", 5)
+        for message in messages:
+            report.record_combat(message, 5)
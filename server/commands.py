@@ -0,0 +1,108 @@
+"""
+Compiled orders : the commands of a player are compiled once, after the ingestion and before the phases
+
+    compiled = compile_orders(player, orders)       # orders : see server/orders.py
+    production_phase(player, compiled, report)      # then movement_phase(), combat_phase()
+
+A compiled command has its verb as an enum, its quantities and coords as integers, and its references resolved :
+colony executing a production command, ship (if it already exists), destination position, attacked player.
+The phases execute them through a dispatch table (verb: function), without parsing anything.
+
+A ship built during the production can be given orders in the same turn : the ship of a command
+is resolved at compilation when it exists, else at execution by its name (see CompiledCommand.ship_of()).
+The errors of compilation (a colony the player doesn't own) go to compiled.diagnostics, for the report.
+"""
+import random
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List
+
+from server.data import Player, Colony, Ship, Position
+from server.orders import Command, Orders
+
+
+class Verb(Enum):
+    BUILD = "build"
+    RESEARCH = "research"
+    SELL = "sell"
+    JUMP = "jump"
+    NAME = "name"
+    EXPLORE = "explore"
+    ATTACK = "attack"
+
+
+@dataclass(slots=True)
+class CompiledCommand:
+    verb: Verb
+    source: Command             # the command as written, for the reports
+    colony: Colony = None       # colony executing a production command
+    qty: int = 0
+    what: str = None            # lowercase : wf, ro, food, parts, tech name, ship type (bf, ms, ...)
+    size: int = 0               # size of the ship
+    name: str = None            # name of the ship, or of the star (NAME)
+    ship: Ship = None           # None if the ship doesn't exist at compilation
+    position: Position = None   # destination of JUMP X Y Z, star of NAME
+    target: str = None          # JUMP BF1 Firefly PL Earth : planet name, ATTACK : attacked player name
+
+    def ship_of(self, player: Player):
+        """ the ship of the command, None if it doesn't exist """
+        return self.ship if self.ship is not None else Ship.get(self.name, player)
+
+
+@dataclass
+class CompiledOrders:
+    production: List[CompiledCommand] = field(default_factory=list)     # in the order of execution
+    movements: List[CompiledCommand] = field(default_factory=list)
+    combat: List[CompiledCommand] = field(default_factory=list)
+    diagnostics: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PhaseContext:
+    """ what the commands of a player need during a phase """
+    player: Player
+    report: "Report"
+    rng: random.Random = None
+    planner: "ExplorationPlanner" = None    # exploration targets, built at the first EXPLORE
+
+
+def compile_command(command: Command, player: Player, colony: Colony = None):
+    """ command checked by orders.check_command() """
+    arguments = command.arguments
+    compiled = CompiledCommand(Verb(command.verb), command, colony=colony)
+    match compiled.verb:
+        case Verb.BUILD if len(arguments) == 2:
+            # BUILD 10 WF
+            compiled.qty, compiled.what = int(arguments[0]), arguments[1].lower()
+        case Verb.BUILD:
+            # BUILD 1 BF2 Firefly
+            compiled.qty = int(arguments[0])
+            compiled.what, compiled.size, compiled.name = Ship.parse_ship(arguments[1:])
+        case Verb.RESEARCH | Verb.SELL:
+            compiled.qty, compiled.what = int(arguments[0]), arguments[1].lower()
+        case Verb.JUMP | Verb.EXPLORE | Verb.ATTACK:
+            compiled.what, compiled.size, compiled.name = Ship.parse_ship(arguments[:2])
+            compiled.ship = Ship.get(compiled.name, player)
+            if compiled.verb is Verb.JUMP and len(arguments) == 5:
+                # JUMP BF2 Firefly X Y Z
+                compiled.position = Position(int(arguments[2]), int(arguments[3]), int(arguments[4]))
+            elif len(arguments) > 2:
+                # JUMP BF2 Firefly PL Earth, ATTACK BF2 Firefly Bob
+                compiled.target = arguments[-1]
+        case Verb.NAME:
+            compiled.position = Position(int(arguments[0]), int(arguments[1]), int(arguments[2]))
+            compiled.name = arguments[3]
+    return compiled
+
+def compile_orders(player: Player, orders: Orders):
+    """ compiled commands of the player, see module docstring """
+    compiled = CompiledOrders()
+    for colony_name, commands in orders.prod_cmd.items():
+        colony = Colony.get(colony_name)
+        if colony is None or colony.player is not player:
+            compiled.diagnostics.append(f"Error : colony {colony_name} doesn't exist for player {player.name}")
+            continue
+        compiled.production.extend(compile_command(command, player, colony) for command in commands)
+    compiled.movements = [compile_command(command, player) for command in orders.move_cmd]
+    compiled.combat = [compile_command(command, player) for command in orders.combat_cmd]
+    return compiled
@@ -0,0 +1,205 @@
+"""
+Game server : a long-running process hosting many games, turns are played when their deadline hits
+
+    python game.py serve games.yml --workers 4 --resident 8
+
+The games are shared between worker processes, a game is always played by the same worker (affinity),
+so its world stays warm in the memory of this worker between turns : no reloading of the world
+(checkpoint + turn journal) at each turn.
+Workers are daemonic processes : reports are generated by the worker itself (report_workers = 1).
+A worker keeps at most `resident` worlds, the least recently used one is evicted :
+a checkpoint is written (see GameData.dump_gamedata()), the game will be loaded from it at its next turn.
+The world of a failed turn is dropped without checkpoint : the game is loaded again from its last saved turn.
+
+Each game has its own World (see server/data.py), bound while its turn is played
+
+Config file (YAML) :
+    games:
+      - name: alpha
+        folder: /var/sbc/alpha
+        interval: 86400        # seconds between 2 turns
+        channel: file-json     # optional, see report.distribute_reports()
+"""
+import logging
+import multiprocessing
+import queue
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import time, sleep
+from typing import List
+
+from server.data import GameData, World, checkpoint_file
+from server.play import play_one_turn
+from server.sbc_parameters import LOG_LEVEL
+
+# logging
+logger = logging.getLogger("sbc")
+
+
+@dataclass
+class HostedGame:
+    """ a game hosted by the server """
+    name: str
+    folder: str
+    interval: float             # seconds between 2 turns
+    channel: str = "file-json"
+    compact: bool = False
+    deadline: float = 0         # time of the next turn (time.time())
+
+    @classmethod
+    def from_dict(cls, config: dict, now: float = None):
+        game = cls(name=config["name"], folder=config["folder"], interval=float(config["interval"]),
+                   channel=config.get("channel", "file-json"), compact=config.get("compact", False))
+        game.deadline = (time() if now is None else now) + game.interval
+        return game
+
+
+class WarmWorlds:
+    """
+    Worlds of the games played by a process, the least recently used are evicted to a checkpoint
+
+    Usage :
+        worlds = WarmWorlds(capacity=8)
+        turn = worlds.play(game)        # plays one turn of the game, its world stays in memory
+        worlds.evict_all()
+    """
+    def __init__(self, capacity: int):
+        assert capacity > 0
+        self.capacity = capacity
+        self.worlds = OrderedDict()     # key = game name, value = (game, World)
+
+    def play(self, game: HostedGame):
+        """ plays one turn of the game, returns the new turn """
+        _, world = self.worlds.pop(game.name, (game, None))
+        if world is None:
+            # a new world : play_one_turn() loads it from the game folder
+            world = World()
+        try:
+            with world.bound():
+                play_one_turn(game.name, game.folder, compact_reports=game.compact, report_channel=game.channel)
+                turn = GameData().turn
+        except Exception:
+            # the world is left in the middle of the turn : it is forgotten, the next turn loads the game again
+            # from its folder (last saved turn), the orders of the failed turn are still waiting there
+            logger.warning(f"game {game.name} : world dropped after a failed turn")
+            raise
+        self.worlds[game.name] = (game, world)
+
+        while len(self.worlds) > self.capacity:
+            self.evict(next(iter(self.worlds)))
+        return turn
+
+    def evict(self, game_name: str):
+        """ writes a checkpoint of the game and forgets its world """
+        game, world = self.worlds.pop(game_name)
+        with world.bound():
+            GameData().dump_gamedata(checkpoint_file(game.folder, game.name, GameData().turn))
+            logger.info(f"{LOG_LEVEL(1)}game {game.name} evicted at turn {GameData().turn}")
+
+    def evict_all(self):
+        for game_name in list(self.worlds):
+            self.evict(game_name)
+
+
+def worker_main(inbox, outbox, capacity: int):
+    """ worker process : plays the turns of its games, until a None is received """
+    worlds = WarmWorlds(capacity)
+    for game in iter(inbox.get, None):
+        try:
+            turn = worlds.play(game)
+            outbox.put((game.name, turn, None))
+        except Exception as error:
+            logger.exception(f"game {game.name} : turn failed")
+            outbox.put((game.name, None, repr(error)))
+    worlds.evict_all()
+
+
+class GameServer:
+    """
+    Scheduler of the turns of the hosted games, and pool of worker processes playing them
+
+    Usage :
+        server = GameServer(games, workers=4, resident=8)
+        server.serve_forever()      # or server.start(), server.run_pending(), server.collect(), server.stop()
+    """
+    def __init__(self, games: List[HostedGame], workers: int = 2, resident: int = 8):
+        self.games = {game.name: game for game in games}
+        self.workers = workers
+        self.resident = resident
+        self.affinity = {}      # key = game name, value = worker index
+        self.in_flight = set()  # games whose turn is being played
+        self.processes = []
+        self.inboxes = []
+        self.outbox = None
+
+        # games spread over the workers, the same number of games for each one
+        for i, name in enumerate(sorted(self.games)):
+            self.affinity[name] = i % workers
+
+    def start(self):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.outbox = context.Queue()
+        for _ in range(self.workers):
+            inbox = context.Queue()
+            process = context.Process(target=worker_main, args=(inbox, self.outbox, self.resident), daemon=True)
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+    def run_pending(self, now: float = None):
+        """ sends the games whose deadline has hit to their worker, returns their names """
+        now = time() if now is None else now
+        sent = []
+        for name, game in self.games.items():
+            if game.deadline <= now and name not in self.in_flight:
+                self.inboxes[self.affinity[name]].put(game)
+                self.in_flight.add(name)
+                # next deadline, the turns missed while the server was down are skipped, not played in a row
+                game.deadline += game.interval
+                if game.deadline <= now:
+                    game.deadline = now + game.interval
+                sent.append(name)
+        return sent
+
+    def collect(self, timeout: float = 0):
+        """ results of the turns played : list of (game name, turn, error) """
+        results = []
+        deadline = time() + timeout
+        while self.in_flight:
+            try:
+                result = self.outbox.get(timeout=max(0.0, deadline - time()))
+            except queue.Empty:
+                break
+            name, turn, error = result
+            self.in_flight.discard(name)
+            if error:
+                logger.error(f"game {name} : turn failed ({error})")
+            else:
+                logger.info(f"{LOG_LEVEL(1)}game {name} : turn {turn} played")
+            results.append(result)
+        return results
+
+    def next_deadline(self):
+        waiting = [game.deadline for name, game in self.games.items() if name not in self.in_flight]
+        return min(waiting, default=None)
+
+    def serve_forever(self, poll: float = 1.0):
+        self.start()
+        try:
+            while True:
+                self.run_pending()
+                self.collect(timeout=poll)
+                deadline = self.next_deadline()
+                if deadline is not None and not self.in_flight:
+                    sleep(min(poll, max(0.0, deadline - time())))
+        finally:
+            self.stop()
+
+    def stop(self):
+        """ workers end their current turn, evict their worlds to checkpoints and stop """
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join()
+        self.processes, self.inboxes = [], []
@@ -1,18 +1,116 @@
 from typing import List
 import math
-import json
 from enum import Enum
+import numpy as np
 from server.names import generate_name
+from server.spatial import SpatialGrid, DistanceMatrix
+from server.journal import Journal
+from server.rng import RandomService
+from server.visibility import VisibilityEngine
+import os
+import re
+import server.sbc_parameters as sbc
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 
+SNAPSHOT_VERSION = 3    # binary format of GameData.dump_gamedata(), to increase at each format change
+SUPPORTED_SNAPSHOT_VERSIONS = (1, 2, 3)    # version 1 : no game seed, version 2 : no ships in the intel
+
+
+class World:
+    """
+    Everything of one game : game memory (GameData), registries of the game objects, and the engines kept in sync
+
+    The data classes read their registries in the current world : Player.players is current_world().players,
+    the world is bound to the current thread (or asyncio task) by a context variable.
+    A process can hold several games, and threads can play different games at the same time :
+        world = World()
+        with world.bound():
+            play_one_turn(...)      # or newgame(...), production_phase(...), Report(...), ...
+    Without bound world, the default world of the process is used.
+    """
+    __slots__ = ("gamedata", "players", "relations", "positions", "stars", "star_names", "star_index", "distances",
+                 "jump_tables", "planets", "colonies", "colony_names", "ships", "visibility", "journal")
+
+    def __init__(self):
+        self.gamedata = None        # created at first GameData()
+        self.star_index = SpatialGrid(cell_size=sbc.VISIBILITY_RANGE)
+        # fog of war of the players, kept up to date by the hooks of Ship and Colony (see server/visibility.py)
+        self.visibility = VisibilityEngine(Star, Player, sbc.VISIBILITY_RANGE)
+        # changes of the world during the turn, see server/journal.py
+        self.journal = Journal()
+        self.clear()
+
+    def clear(self):
+        """ empty registries, the game memory is kept """
+        self.players = {}
+        self.relations = {}
+        self.positions = {}
+        self.stars = {}
+        self.star_names = {}
+        self.star_index.clear()
+        self.distances = None       # DistanceMatrix, built at first use after stars creation
+        self.jump_tables = {}       # GV level: jump success chances, see movements.jump_success_table()
+        self.planets = {}
+        self.colonies = {}
+        self.colony_names = {}
+        self.ships = {}
+
+    @contextmanager
+    def bound(self):
+        """ makes this world the current world, until the end of the with block """
+        token = _current_world.set(self)
+        try:
+            yield self
+        finally:
+            _current_world.reset(token)
+
+
+_current_world = ContextVar("world")
+
+def current_world():
+    """ the world bound by World.bound(), or the default world of the process """
+    return _current_world.get(default_world)
+
+
+class WorldRegistry:
+    """ class attribute stored in the current world : players = WorldRegistry("players") in class Player """
+    __slots__ = ("key",)
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __get__(self, instance, owner):
+        return getattr(current_world(), self.key)
+
+
+class WorldEngine:
+    """ engine of the current world : visibility.pop_diff(player) is current_world().visibility.pop_diff(player) """
+    __slots__ = ("key",)
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __getattr__(self, name: str):
+        return getattr(getattr(current_world(), self.key), name)
+
+    def __repr__(self):
+        return f"WorldEngine({self.key})"
+
+
+# the journal and the fog of war of the current world
+journal = WorldEngine("journal")
+visibility = WorldEngine("visibility")
+
 class GameData:
     """
     Global container for game memory
     """
-    _instance = None
+    _instance = WorldRegistry("gamedata")
 
     def __new__(cls, *args, **kwargs):
-        """ Singleton """
+        """ Singleton of the current world """
         if cls._instance:
             return cls._instance
         else:
@@ -21,20 +119,14 @@ class GameData:
             # initialisation
             instance.turn = 0
 
-            """ Datastructure for colonies_memory :
-                colonies_memory =
-                {
-                    player1: {
-                        planet1: colony_memory_object,
-                        planet2: colony_memory_object
-                    },
-                    player2: {
-                        planet1: colony_memory_object,
-                        planet2: colony_memory_object
-                    },
-                }
-            """
-            instance.colonies_memory = {}
+            # random streams of the game, see server/rng.py
+            instance.rng = RandomService()
+
+            # sizes of the world at the end of the last turn, see memory_metrics()
+            instance.metrics = {}
+
+            # what each player knows about the others : {player: Intel}, see update_intel()
+            instance.intel = {}
 
             # instance.players = {}      # Not necessary, info present within class
             # instance.positions = {}
@@ -43,62 +135,375 @@ class GameData:
             # instance.colonies = {}
             # instance.ships = {}
 
-            cls._instance = instance
+            current_world().gamedata = instance
             return instance
 
-    def update_colonies_memory(self):
-        """ remember colonies of other players """
+    def intel_of(self, player: "Player"):
+        """ Intel of the player, created at first use """
+        intel = self.intel.get(player)
+        if intel is None:
+            intel = self.intel[player] = Intel()
+        return intel
+
+    def update_intel(self):
+        """
+        Players remember the colonies and ships of the other players in the sectors where they are
+        Only the positions of their own colonies and ships are visited (see VisibilityEngine.observer_positions()),
+        the cost depends on the size of the fleets, not on the size of the galaxy
+
+        Forgotten : the colonies and ships seen gone (destroyed, or moved away for a ship),
+        and the ships not seen for INTEL_SHIP_TURNS turns
+        The intel only depends on the world : the journal gets one "intel" op, the update is done again at replay
+        """
         for player in Player.players.values():
-            # add player in memory
-            if player not in self.colonies_memory:
-                self.colonies_memory[player] = {}
-
-            # update colonies viewed this turn
-            planets = planet_i_can_see(player)
-
-            for planet in planets:
-                # is there a colony here ?
-                try:
-                    colony = Colony(planet)
-
-                    if colony.player != player:
-                        self.colonies_memory[player][planet] = ColonyMemory(
-                            player=colony.player,
-                            planet=planet,
-                            WF=colony.WF,
-                            RO=colony.RO,
-                            turn=self.turn
-                        )
-
-                except LookupError as e:
-                    # the colony doesn't exists
-                    continue
+            intel = self.intel_of(player)
+            for position in visibility.observer_positions(player):
+                # colonies of the star in this sector
+                star = Star.stars.get(position)
+                if star is not None:
+                    for planet in star.planets.values():
+                        colony = planet.colony
+                        if colony is None:
+                            # a colony remembered here doesn't exist anymore
+                            intel.forget_colony(planet)
+                        elif colony.player is not player:
+                            intel.remember_colony(ColonyMemory(player=colony.player, planet=planet, WF=colony.WF,
+                                                               RO=colony.RO, turn=self.turn))
+
+                # ships remembered in this sector, that aren't there anymore
+                remembered = intel.ships_at.get(Position.key(position.x, position.y, position.z))
+                if remembered:
+                    for key in remembered - {(ship.player, ship.name.lower()) for ship in position.ships}:
+                        intel.forget_ship(key)
+
+                # ships in this sector
+                for ship in position.ships:
+                    if ship.player is not player:
+                        intel.remember_ship(ShipMemory(player=ship.player, name=ship.name, ship_type=ship.type,
+                                                       size=ship.size, position=position, turn=self.turn))
+
+            intel.forget_ships_before(self.turn - sbc.INTEL_SHIP_TURNS)
+        journal.record("intel")
 
     def load_gamedata(self, filename):
-        """ Loads game data from JSON file """
-        # loads data from file
-        with open(filename, "r", encoding='utf8') as f:
-            data = json.load(f)
+        """
+        Loads the whole world from a binary snapshot written by dump_gamedata()
+        Previous registries (players, stars, planets, ...) are cleared
+        """
+        with open(filename, "rb") as f:
+            archive = np.load(f, allow_pickle=False)
+            data = {key: archive[key] for key in archive.files}
+
+        version = int(data["version"])
+        if version not in SUPPORTED_SNAPSHOT_VERSIONS:
+            raise ValueError(f"snapshot {filename} has version {version}, supported: {SUPPORTED_SNAPSHOT_VERSIONS}")
+
+        GameData.reset()
+        self.turn = int(data["turn"])
+        if "rng_seed" in data:
+            self.rng = RandomService(int(data["rng_seed"]))
+
+        # players & technologies
+        players = []
+        for name, email, temperature, eu in zip(data["player_name"].tolist(), data["player_email"].tolist(),
+                                                data["player_temperature"].tolist(), data["player_EU"].tolist()):
+            player = Player(name=name, email=email, prefered_temperature=temperature, create=True)
+            player.EU = eu
+            players.append(player)
+        for player_id, tech, level, progression in zip(data["tech_player"].tolist(), data["tech_name"].tolist(),
+                                                       data["tech_level"].tolist(), data["tech_progression"].tolist()):
+            players[player_id].techs[tech] = Technologies(level=level, progression=progression)
+
+        # relations between players
+        for (player1_id, player2_id), value in zip(data["relation_players"].tolist(), data["relation_value"].tolist()):
+            RelationShip.set_relationship(players[player1_id], players[player2_id], Relation(value))
+
+        # stars & fog of war
+        stars = []
+        for (x, y, z), name in zip(data["star_xyz"].tolist(), data["star_name"].tolist()):
+            star = Star(Position(x, y, z), create=True)
+            if name:
+                star.name = name
+            stars.append(star)
+        for star_id, player_id, turn in zip(data["visited_star"].tolist(), data["visited_player"].tolist(),
+                                            data["visited_turn"].tolist()):
+            stars[star_id].visited_by[players[player_id]] = turn
+        for star_id, player_id in zip(data["seen_star"].tolist(), data["seen_player"].tolist()):
+            stars[star_id].seen_by.add(players[player_id])
+
+        # planets
+        planets = []
+        for star_id, numero, temperature, humidity in zip(data["planet_star"].tolist(), data["planet_numero"].tolist(),
+                                                          data["planet_temperature"].tolist(),
+                                                          data["planet_humidity"].tolist()):
+            planets.append(Planet(star=stars[star_id], numero=numero, temperature=temperature, humidity=humidity,
+                                  create=True))
 
-        # place the data to the good place
-        # TODO : to be done
+        # colonies
+        for planet_id, player_id, wf, ro, food, parts in zip(data["colony_planet"].tolist(),
+                                                              data["colony_player"].tolist(),
+                                                              data["colony_WF"].tolist(), data["colony_RO"].tolist(),
+                                                              data["colony_food"].tolist(),
+                                                              data["colony_parts"].tolist()):
+            colony = Colony(planet=planets[planet_id], player=players[player_id], WF=wf, RO=ro, create=True)
+            colony.food = food
+            colony.parts = parts
+
+        # ships
+        for name, player_id, ship_type, size, (x, y, z) in zip(data["ship_name"].tolist(), data["ship_player"].tolist(),
+                                                                data["ship_type"].tolist(), data["ship_size"].tolist(),
+                                                                data["ship_xyz"].tolist()):
+            Ship(name=name, player=players[player_id], size=size, ship_type=ship_type, position=Position(x, y, z),
+                 create=True)
+
+        # memory of other players' colonies
+        for observer_id, planet_id, owner_id, wf, ro, turn in zip(data["memory_observer"].tolist(),
+                                                                   data["memory_planet"].tolist(),
+                                                                   data["memory_owner"].tolist(),
+                                                                   data["memory_WF"].tolist(),
+                                                                   data["memory_RO"].tolist(),
+                                                                   data["memory_turn"].tolist()):
+            self.intel_of(players[observer_id]).remember_colony(ColonyMemory(
+                player=players[owner_id], planet=planets[planet_id], WF=wf, RO=ro, turn=turn))
+
+        # memory of other players' ships (version 3)
+        if "intel_ship_observer" in data:
+            for observer_id, owner_id, name, ship_type, size, (x, y, z), turn in zip(
+                    data["intel_ship_observer"].tolist(), data["intel_ship_owner"].tolist(),
+                    data["intel_ship_name"].tolist(), data["intel_ship_type"].tolist(),
+                    data["intel_ship_size"].tolist(), data["intel_ship_xyz"].tolist(), data["intel_ship_turn"].tolist()):
+                self.intel_of(players[observer_id]).remember_ship(ShipMemory(
+                    player=players[owner_id], name=name, ship_type=ship_type, size=size, position=Position(x, y, z),
+                    turn=turn))
 
     def dump_gamedata(self, filename):
-        """ dumps game data to a json file """
-        # create a unique structure with all data
-        data = {}
-        # TODO : implement this
+        """
+        Dumps the whole world to a compact binary snapshot
+
+        Format is a numpy archive (.npz, uncompressed) of columnar arrays :
+        objects are referenced by integer ids (index in their own table) instead of nested dicts
+        """
+        player_ids = {player: i for i, player in enumerate(Player.players.values())}
+        star_ids = {star: i for i, star in enumerate(Star.stars.values())}
+        planet_ids = {planet: i for i, planet in enumerate(Planet.planets.values())}
+        players = player_ids.keys()
+        stars = star_ids.keys()
+        planets = planet_ids.keys()
+        colonies = Colony.colonies.values()
+        ships = Ship.ships.values()
+
+        techs = [(player_ids[player], name, tech.level, tech.progression)
+                 for player in players for name, tech in player.techs.items()]
+        visited = [(star_ids[star], player_ids[player], turn)
+                   for star in stars for player, turn in star.visited_by.items()]
+        seen = [(star_ids[star], player_ids[player]) for star in stars for player in star.seen_by]
+        relations = [(player_ids[player1], player_ids[player2], relation.value)
+                     for (player1, player2), relation in RelationShip.relations.items()]
+        memory = [(player_ids[observer], planet_ids[planet], player_ids[mem.player], mem.WF, mem.RO, mem.turn)
+                  for observer, intel in self.intel.items() for planet, mem in intel.colonies.items()]
+        ships_memory = [(player_ids[observer], mem) for observer, intel in self.intel.items()
+                        for mem in intel.ships.values()]
+
+        arrays = {
+            "version": np.array(SNAPSHOT_VERSION),
+            "turn": np.array(self.turn),
+            "rng_seed": np.array(self.rng.seed, dtype=np.int64),
+
+            "player_name": np.array([player.name for player in players], dtype=str),
+            "player_email": np.array([player.email for player in players], dtype=str),
+            "player_temperature": np.array([player.prefered_temperature for player in players], dtype=np.int32),
+            "player_EU": np.array([player.EU for player in players], dtype=np.int64),
+
+            "tech_player": np.array([t[0] for t in techs], dtype=np.int32),
+            "tech_name": np.array([t[1] for t in techs], dtype=str),
+            "tech_level": np.array([t[2] for t in techs], dtype=np.int32),
+            "tech_progression": np.array([t[3] for t in techs], dtype=np.int64),
+
+            "relation_players": np.array([r[:2] for r in relations], dtype=np.int32).reshape(-1, 2),
+            "relation_value": np.array([r[2] for r in relations], dtype=np.int8),
+
+            "star_xyz": np.array([(star.position.x, star.position.y, star.position.z) for star in stars],
+                                 dtype=np.int32).reshape(-1, 3),
+            "star_name": np.array([star.name or "" for star in stars], dtype=str),
+            "visited_star": np.array([v[0] for v in visited], dtype=np.int32),
+            "visited_player": np.array([v[1] for v in visited], dtype=np.int32),
+            "visited_turn": np.array([v[2] for v in visited], dtype=np.int32),
+            "seen_star": np.array([v[0] for v in seen], dtype=np.int32),
+            "seen_player": np.array([v[1] for v in seen], dtype=np.int32),
+
+            "planet_star": np.array([star_ids[planet.star] for planet in planets], dtype=np.int32),
+            "planet_numero": np.array([planet.numero for planet in planets], dtype=np.int8),
+            "planet_temperature": np.array([planet.temperature for planet in planets], dtype=np.int32),
+            "planet_humidity": np.array([planet.humidity for planet in planets], dtype=np.int32),
+
+            "colony_planet": np.array([planet_ids[colony.planet] for colony in colonies], dtype=np.int32),
+            "colony_player": np.array([player_ids[colony.player] for colony in colonies], dtype=np.int32),
+            "colony_WF": np.array([colony.WF for colony in colonies], dtype=np.int64),
+            "colony_RO": np.array([colony.RO for colony in colonies], dtype=np.int64),
+            "colony_food": np.array([colony.food for colony in colonies], dtype=np.float64),
+            "colony_parts": np.array([colony.parts for colony in colonies], dtype=np.float64),
+
+            "ship_name": np.array([ship.name for ship in ships], dtype=str),
+            "ship_player": np.array([player_ids[ship.player] for ship in ships], dtype=np.int32),
+            "ship_type": np.array([ship.type for ship in ships], dtype=str),
+            "ship_size": np.array([ship.size for ship in ships], dtype=np.int32),
+            "ship_xyz": np.array([(ship.position.x, ship.position.y, ship.position.z) for ship in ships],
+                                 dtype=np.int32).reshape(-1, 3),
+
+            "memory_observer": np.array([m[0] for m in memory], dtype=np.int32),
+            "memory_planet": np.array([m[1] for m in memory], dtype=np.int32),
+            "memory_owner": np.array([m[2] for m in memory], dtype=np.int32),
+            "memory_WF": np.array([m[3] for m in memory], dtype=np.int64),
+            "memory_RO": np.array([m[4] for m in memory], dtype=np.int64),
+            "memory_turn": np.array([m[5] for m in memory], dtype=np.int32),
+
+            "intel_ship_observer": np.array([observer_id for observer_id, mem in ships_memory], dtype=np.int32),
+            "intel_ship_owner": np.array([player_ids[mem.player] for _, mem in ships_memory], dtype=np.int32),
+            "intel_ship_name": np.array([mem.name for _, mem in ships_memory], dtype=str),
+            "intel_ship_type": np.array([mem.ship_type for _, mem in ships_memory], dtype=str),
+            "intel_ship_size": np.array([mem.size for _, mem in ships_memory], dtype=np.int32),
+            "intel_ship_xyz": np.array([(mem.position.x, mem.position.y, mem.position.z) for _, mem in ships_memory],
+                                       dtype=np.int32).reshape(-1, 3),
+            "intel_ship_turn": np.array([mem.turn for _, mem in ships_memory], dtype=np.int32),
+        }
+
+        # file object : np.savez would add a .npz suffix to a filename
+        with open(filename, "wb") as f:
+            np.savez(f, **arrays)
+
+    def load_game(self, tmp_folder: str, game_name: str, turn: int = None):
+        """
+        Loads the world at a given turn (default: the last one played)
+        from the last checkpoint before this turn, then replays the turn journal up to this turn
+        """
+        checkpoints = find_checkpoints(tmp_folder, game_name)
+        if turn is not None:
+            checkpoints = [t for t in checkpoints if t <= turn]
+        if not checkpoints:
+            raise LookupError(f"no checkpoint found for game {game_name} in {tmp_folder} (turn={turn})")
+
+        checkpoint_turn = max(checkpoints)
+        self.load_gamedata(checkpoint_file(tmp_folder, game_name, checkpoint_turn))
+        for journal_turn, ops in Journal.read(journal_file(tmp_folder, game_name), checkpoint_turn, turn):
+            self.apply_journal(journal_turn, ops)
+
+        if turn is not None and self.turn != turn:
+            raise LookupError(f"game {game_name} can't be rebuilt at turn {turn}, journal stops at turn {self.turn}")
+
+    def apply_journal(self, turn: int, ops: list):
+        """ replays the changes recorded during a turn (see server/journal.py) """
+        self.turn = turn
+        for op, *args in ops:
+            match op:
+                case "ship":
+                    player_name, name, ship_type, size, x, y, z = args
+                    player = Player(player_name)
+                    if Ship.exists(name, player):
+                        ship = Ship(name, player)
+                        ship.size = size
+                        ship.position = Position(x, y, z)
+                    else:
+                        Ship(name=name, player=player, size=size, ship_type=ship_type, position=Position(x, y, z),
+                             create=True)
+                case "ship-del":
+                    player_name, name = args
+                    Ship(name, Player(player_name)).delete()
+                case "colony":
+                    x, y, z, numero, player_name, wf, ro, food, parts = args
+                    planet = Planet(star=Star(x, y, z), numero=numero)
+                    if planet.colony:
+                        colony = planet.colony
+                        colony.WF = wf
+                        colony.RO = ro
+                    else:
+                        colony = Colony(planet=planet, player=Player(player_name), WF=wf, RO=ro, create=True)
+                    colony.food = food
+                    colony.parts = parts
+                case "colony-del":
+                    x, y, z, numero = args
+                    Colony(Planet(star=Star(x, y, z), numero=numero)).delete()
+                case "player":
+                    player_name, eu = args
+                    Player(player_name).EU = eu
+                case "tech":
+                    player_name, tech, level, progression = args
+                    Player(player_name).techs[tech] = Technologies(level=level, progression=progression)
+                case "star-name":
+                    x, y, z, name = args
+                    Star(x, y, z).name = name
+                case "visited":
+                    x, y, z, player_name, visit_turn = args
+                    Star(x, y, z).visited_by[Player(player_name)] = visit_turn
+                case "seen":
+                    x, y, z, player_name = args
+                    visibility.mark_seen(Player(player_name), Star(x, y, z))
+                case "relation":
+                    player1_name, player2_name, value = args
+                    RelationShip.set_relationship(Player(player1_name), Player(player2_name), Relation(value))
+                case "intel":
+                    self.update_intel()
+                case "memory":
+                    # journals written before the "intel" op
+                    observer_name, x, y, z, numero, owner_name, wf, ro, memory_turn = args
+                    planet = Planet(star=Star(x, y, z), numero=numero)
+                    self.intel_of(Player(observer_name)).remember_colony(ColonyMemory(
+                        player=Player(owner_name), planet=planet, WF=wf, RO=ro, turn=memory_turn))
+                case "memory-del":
+                    observer_name, x, y, z, numero = args
+                    self.intel_of(Player(observer_name)).forget_colony(Planet(star=Star(x, y, z), numero=numero))
+                case "intel-ship":
+                    observer_name, owner_name, name, ship_type, size, x, y, z, memory_turn = args
+                    self.intel_of(Player(observer_name)).remember_ship(ShipMemory(
+                        player=Player(owner_name), name=name, ship_type=ship_type, size=size,
+                        position=Position(x, y, z), turn=memory_turn))
+                case _:
+                    raise ValueError(f"unknown journal op {op}")
+
+    def save_game(self, tmp_folder: str, game_name: str):
+        """
+        Saves the current turn : appends the turn journal, and writes a full checkpoint periodically
+        """
+        if journal.recording:
+            journal.append_to(journal_file(tmp_folder, game_name))
+        if self.turn % sbc.CHECKPOINT_INTERVAL == 0:
+            self.dump_gamedata(checkpoint_file(tmp_folder, game_name, self.turn))
+
+    @classmethod
+    def reset(cls):
+        """ clears the whole world : game memory and every registry """
+        if cls._instance:
+            cls._instance.turn = 0
+            cls._instance.rng = RandomService()
+            cls._instance.intel = {}
+        current_world().clear()
+        visibility.reset()
+
+
+def checkpoint_file(tmp_folder: str, game_name: str, turn: int):
+    """ filename of a full snapshot of the world """
+    return f"{tmp_folder}/{game_name}.T{turn}.gamedata"
+
+def journal_file(tmp_folder: str, game_name: str):
+    """ filename of the turn journal of a game """
+    return f"{tmp_folder}/{game_name}.journal"
+
+def find_checkpoints(tmp_folder: str, game_name: str):
+    """ turns for which a checkpoint exists """
+    pattern = re.compile(re.escape(game_name) + r"\.T(\d+)\.gamedata")
+    turns = []
+    for filename in os.listdir(tmp_folder):
+        match = pattern.fullmatch(filename)
+        if match:
+            turns.append(int(match.group(1)))
+    return sorted(turns)
 
-        # save data to json file
-        with open(filename, "w", encoding="utf8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
 
 class Relation(Enum):
     ALLY = 1
     NEUTRAL = 2
     ENEMY = 3
 
-@dataclass
+@dataclass(slots=True)
 class Technologies:
     level: int
     progression: int
@@ -119,9 +524,13 @@ class Player:
     Selection :
         Player("GLadOS")
         Player(name="GLadOS")
+        Player.get("GLadOS")      # None if it doesn't exist
 
+    player.colonies and player.ships are ordered sets : {object: None}
     """
-    players = {}
+    __slots__ = ("name", "techs", "email", "prefered_temperature", "EU", "colonies", "ships", "suitability")
+
+    players = WorldRegistry("players")
 
     def __new__(cls, name: str, email: str = None, prefered_temperature: int = None, create: bool = False):
         """
@@ -158,8 +567,9 @@ class Player:
             instance.email = email
             instance.prefered_temperature = prefered_temperature
             instance.EU = 0
-            instance.colonies = []
-            instance.ships = []
+            instance.colonies = {}    # ordered set, see Colony.delete()
+            instance.ships = {}       # ordered set, see Ship.delete()
+            instance.suitability = {}     # cache of planets suitability, see economy.planets_suitability()
 
             # backrefs
             cls.players[lower_name] = instance
@@ -175,6 +585,10 @@ class Player:
             else:
                 raise LookupError(f"Player({lower_name}) doesn't exists !")
 
+    @classmethod
+    def reset(cls):
+        current_world().players = {}
+
     @classmethod
     def exists(cls, name: str):
         lower_name = name.lower()
@@ -183,6 +597,11 @@ class Player:
             exists = True
         return exists
 
+    @classmethod
+    def get(cls, name: str):
+        """ selection without checks, None if the player doesn't exist """
+        return cls.players.get(name.lower())
+
 class RelationShip:
     """
     Stocke les relations entre les joueurs
@@ -201,7 +620,11 @@ class RelationShip:
     Les getters et setters se chargent de vérifier l'ordre du tuple
     """
     # _instance = None
-    relations = {}
+    relations = WorldRegistry("relations")
+
+    @classmethod
+    def reset(cls):
+        current_world().relations = {}
 
     # def __new__(cls):
     #     """ Singleton """
@@ -214,6 +637,7 @@ class RelationShip:
 
     @classmethod
     def set_relationship(cls, player1: Player, player2: Player, relation: Relation):
+        journal.record("relation", player1.name, player2.name, relation.value)
         # on vérifie dans quel ordre c'est stocké
         if (player1, player2) in cls.relations:
             # update it
@@ -258,16 +682,25 @@ class Position:
     Représente les coordonnées d'un secteur (imaginez une case d'un jeu de plateau en 3D)
 
     Fabrique pour éviter les doublons
-    unique key is (x, y, z) <-- tuple
+    unique key is (x, y, z), packed in one integer (see Position.key())
 
     Only one way to call :
         Position(x, y, z)  # get or create
+
+    Positions without star nor ship (left by failed jumps) are forgotten at the end of a turn,
+    see Position.collect_garbage()
     """
-    positions = {}
+    __slots__ = ("x", "y", "z", "ships")
+
+    positions = WorldRegistry("positions")
+
+    # packing of coords : 21 bits by axis, coords from -2**20 to 2**20 - 1
+    AXIS_BITS = 21
+    AXIS_OFFSET = 1 << (AXIS_BITS - 1)
 
     def __new__(cls, x: int, y: int, z: int):
         """
-            unique key is (x, y, z) <-- tuple
+            unique key is (x, y, z)
 
             Only one way to call :
                 Position(x, y, z)  # get or create
@@ -275,13 +708,10 @@ class Position:
         assert isinstance(x, int)
         assert isinstance(y, int)
         assert isinstance(z, int)
-        coords = (x, y, z)
-
-        if coords in cls.positions:
-            # this position already exists, return it
-            return cls.positions[coords]
+        key = cls.key(x, y, z)
 
-        else:
+        instance = cls.positions.get(key)
+        if instance is None:
             # this position doesn't exist, create it
             instance = object.__new__(cls)
 
@@ -289,33 +719,47 @@ class Position:
             instance.x = x
             instance.y = y
             instance.z = z
-            instance.distances = {}
 
             # for backrefs
             instance.ships = set()
             # instance.star = None              # usefull ? Star(position) do the job
-            cls.positions[coords] = instance
+            cls.positions[key] = instance
 
-            return instance
+        return instance
 
-    def distance_to(self, position):
-        """ compute the distance from this postion (self) to another Position
-            Cache previously calculated distances
+    @classmethod
+    def key(cls, x: int, y: int, z: int):
         """
-        coords = (position.x, position.y, position.z)
+        coords packed in one integer : smaller and quicker to hash than a tuple
+        a coord out of [-AXIS_OFFSET, AXIS_OFFSET) would share its key with another position : ValueError
+        """
+        offset, bits = cls.AXIS_OFFSET, cls.AXIS_BITS
+        if not (-offset <= x < offset and -offset <= y < offset and -offset <= z < offset):
+            raise ValueError(f"Position({x}, {y}, {z}) is out of the galaxy : coords from {-offset} to {offset - 1}")
+        return (((x + offset) << bits | (y + offset)) << bits) | (z + offset)
 
-        # check if this has already been calculated
-        if coords in self.distances:
-            distance = self.distances[coords]
+    @classmethod
+    def reset(cls):
+        current_world().positions = {}
 
-        else:
-            distance = math.sqrt((self.x - position.x) ** 2
-                                 + (self.y - position.y) ** 2
-                                 + (self.z - position.z) ** 2
-                                 )
-            self.distances[coords] = distance
+    @classmethod
+    def collect_garbage(cls):
+        """ forgets the positions without star nor ship, returns the number of positions removed """
+        stars = Star.stars
+        empty = [key for key, position in cls.positions.items() if not position.ships and position not in stars]
+        for key in empty:
+            del cls.positions[key]
+        return len(empty)
 
-        return distance
+    def distance_to(self, position):
+        """ compute the distance from this postion (self) to another Position
+            not cached : a square root is cheaper than a lookup, see Star.distance_matrix() for batches
+        """
+        return math.sqrt(self.squared_distance_to(position))
+
+    def squared_distance_to(self, position):
+        """ squared distance, an integer : exact, and the key of the jump success table (movements.py) """
+        return (self.x - position.x) ** 2 + (self.y - position.y) ** 2 + (self.z - position.z) ** 2
 
     def to_dict(self):
         return {
@@ -337,9 +781,17 @@ class Star:
         Star(position_object)
         Star(x, y, z)
         Star(name)
+
+    Spatial query :
+        Star.stars_in_range(position, radius)
+        Star.distance_matrix()
     """
-    stars = {}
-    star_names = {}
+    __slots__ = ("position", "_name", "visited_by", "planets", "seen_by")
+
+    stars = WorldRegistry("stars")
+    star_names = WorldRegistry("star_names")
+    index = WorldRegistry("star_index")         # spatial index, kept in sync at creation
+    distances = WorldRegistry("distances")      # DistanceMatrix, built at first use after stars creation
 
     def __new__(cls, *args, create: bool = False):
         """
@@ -374,6 +826,9 @@ class Star:
             # backrefs
             # position.star = instance  # not usefull, Star(x, y, z) or Star(position) return the star
             cls.stars[position] = instance
+            cls.index.add(position.x, position.y, position.z, instance)
+            current_world().distances = None
+            visibility.invalidate()
 
             return instance
 
@@ -406,6 +861,14 @@ class Star:
             else:
                 raise TypeError(f"Star() attribute 'position' is needed: Star(position) or Star(x, y, z)")
 
+    @classmethod
+    def reset(cls):
+        world = current_world()
+        world.stars = {}
+        world.star_names = {}
+        world.star_index.clear()
+        world.distances = None
+
     def __str__(self):
         return f"Star({self.name}: {self.position.x}, {self.position.y}, {self.position.z})"
 
@@ -422,18 +885,37 @@ class Star:
             response = True
         return response
 
+    @classmethod
+    def distance_matrix(cls):
+        """
+        Star to star distances (DistanceMatrix, rows computed at first use), index i is the i-th star of Star.stars
+        Built once the galaxy is created (or loaded) : stars are never moved nor deleted.
+        It is not saved in the snapshots, computing a row is faster than reading it.
+        """
+        if cls.distances is None:
+            stars = list(cls.stars.values())
+            coords = [(star.position.x, star.position.y, star.position.z) for star in stars]
+            current_world().distances = DistanceMatrix(stars, coords)
+        return cls.distances
+
+    @classmethod
+    def max_squared_distance(cls):
+        """ upper bound of the squared distance between 2 stars of the galaxy """
+        return cls.index.squared_extent()
+
+    @classmethod
+    def stars_in_range(cls, position: Position, radius: float):
+        """ stars whose distance to position is strictly lower than radius """
+        return cls.index.query(position.x, position.y, position.z, radius)
+
     @staticmethod
     def update_visited(turn: int):
-        # colonies
-        for planet, colony in Colony.colonies.items():
-            planet.star.visited_by[colony.player] = turn
-
-        # ships
-        for (ship_name, player), ship in Ship.ships.items():
-            # Is there a star at this position ?
-            if Star.exists(ship.position):
-                star = Star(ship.position)
+        """ stars where a player has a colony or a ship are visited this turn, see VisibilityEngine.stations() """
+        for player in Player.players.values():
+            for star in visibility.stations(player):
                 star.visited_by[player] = turn
+                position = star.position
+                journal.record("visited", position.x, position.y, position.z, player.name, turn)
 
     @property
     def name(self):
@@ -446,6 +928,11 @@ class Star:
         else:
             self._name = value
             Star.star_names[value.lower()] = self
+            # colonies of this star can now be selected by their name
+            for planet in self.planets.values():
+                if planet.colony is not None:
+                    Colony.names[planet.colony.name.lower()] = planet.colony
+            journal.record("star-name", self.position.x, self.position.y, self.position.z, value)
 
 class Planet:
     """
@@ -465,7 +952,9 @@ class Planet:
         Planet(star=star_obejct, numero=3)
         Planet(name=planet_name)
     """
-    planets = {}
+    __slots__ = ("star", "numero", "temperature", "humidity", "colony")
+
+    planets = WorldRegistry("planets")
 
     def __new__(cls, **kwargs):
         """
@@ -537,6 +1026,10 @@ class Planet:
             index = (star, numero)
             return cls.planets[index]
 
+    @classmethod
+    def reset(cls):
+        current_world().planets = {}
+
     def to_dict(self):
         return {
             "star": self.star.to_dict(),
@@ -584,8 +1077,15 @@ class Colony:
     Selection :
         Colony(planet_object)
         Colony(name)
+        Colony.get(name)    # None if it doesn't exist
+
+    Colony.names is the index of the colonies by lower case name,
+    only colonies on named stars are in it (kept in sync by Star.name)
     """
-    colonies = {}
+    __slots__ = ("planet", "player", "WF", "RO", "food", "parts")
+
+    colonies = WorldRegistry("colonies")
+    names = WorldRegistry("colony_names")    # lowercase name of the star: colony
 
     def __new__(cls, *args, **kwargs):
         """
@@ -631,9 +1131,13 @@ class Colony:
             instance.parts = 0  # in stockpile
 
             # backref
-            player.colonies.append(instance)
+            player.colonies[instance] = None
             planet.colony = instance
+            visibility.add_observer(player, planet.star.position)
             cls.colonies[planet] = instance
+            if planet.star.name:
+                cls.names[instance.name.lower()] = instance
+            instance.record()
 
             return instance
 
@@ -647,13 +1151,22 @@ class Colony:
 
             elif isinstance(argument, str):
                 # selection by name
-                # first select the planet of the same name
-                planet = Planet(name=argument)
-                return cls.colonies[planet]
+                return cls.names[argument.lower()]
 
             else:
                 raise LookupError(f"Colony({argument}) selection error ! try planet_object or colony_name")
 
+    @classmethod
+    def reset(cls):
+        world = current_world()
+        world.colonies = {}
+        world.colony_names = {}
+
+    @classmethod
+    def get(cls, name: str):
+        """ selection by name without checks, None if the colony doesn't exist """
+        return cls.names.get(name.lower())
+
     def to_dict(self):
         return {
             "name": self.name,
@@ -663,11 +1176,21 @@ class Colony:
             "parts": self.parts
         }
 
+    def record(self):
+        """ records the state of the colony in the turn journal """
+        position = self.planet.star.position
+        journal.record("colony", position.x, position.y, position.z, self.planet.numero, self.player.name,
+                       self.WF, self.RO, self.food, self.parts)
+
     def delete(self):
         # remove backrefs
-        self.player.colonies.remove(self)
+        del self.player.colonies[self]
         self.planet.colony = None
+        visibility.remove_observer(self.player, self.planet.star.position)
         Colony.colonies.pop(self.planet)
+        Colony.names.pop(self.name.lower(), None)
+        position = self.planet.star.position
+        journal.record("colony-del", position.x, position.y, position.z, self.planet.numero)
 
     @property
     def name(self):
@@ -695,6 +1218,7 @@ class Ship:
 
     Selection :
         Ship (ship_name, player)
+        Ship.get(ship_name, player)     # None if it doesn't exist
 
     Notes about case-sensitivity:
             - ship.name is case-sensitive
@@ -702,7 +1226,9 @@ class Ship:
             - Ship creation is case-sensitive
             - Ship.ships is lower_case (unique index)
     """
-    ships = {}
+    __slots__ = ("name", "player", "type", "size", "_position")
+
+    ships = WorldRegistry("ships")
 
     def __new__(cls, name: str, player: Player, create=False, size: int = None, ship_type: str = None, position: Position = None):
         """
@@ -720,12 +1246,12 @@ class Ship:
         Selection :
             Ship (ship_name, player)
         """
-        assert isinstance(name, str)
-        assert isinstance(player, Player)
         name_lower = name.lower()
         index = (name_lower, player)
 
         if create:
+            assert isinstance(name, str)
+            assert isinstance(player, Player)
             assert isinstance(size, int)
             assert isinstance(ship_type, str)
             assert isinstance(position, Position)
@@ -746,7 +1272,7 @@ class Ship:
 
             # backrefs
             # position backref is handled by property because it can change during game
-            player.ships.append(instance)
+            player.ships[instance] = None
             cls.ships[index] = instance
 
             return instance
@@ -755,6 +1281,15 @@ class Ship:
             # just selection
             return cls.ships[index]
 
+    @classmethod
+    def reset(cls):
+        current_world().ships = {}
+
+    @classmethod
+    def get(cls, name: str, player: Player):
+        """ selection without checks, None if the ship doesn't exist """
+        return cls.ships.get((name.lower(), player))
+
     def to_dict(self):
         return {
             "owner_name": self.player.name,
@@ -779,16 +1314,27 @@ class Ship:
     @position.setter
     def position(self, value: Position):
         assert isinstance(value, Position)
+        visibility.move_observer(self.player, self._position, value)
+        # moving the backref to easily get all ships on a position
+        if self._position is not None:
+            self._position.ships.discard(self)
         self._position = value
-        # creating backref to easily get all ships on a position
         value.ships.add(self)
+        self.record()
+
+    def record(self):
+        """ records the state of the ship in the turn journal """
+        position = self._position
+        journal.record("ship", self.player.name, self.name, self.type, self.size, position.x, position.y, position.z)
 
     def delete(self):
         # removing backref
         self._position.ships.remove(self)
-        self.player.ships.remove(self)
+        visibility.remove_observer(self.player, self._position)
+        del self.player.ships[self]
         index = (self.name.lower(), self.player)
         del self.ships[index]
+        journal.record("ship-del", self.player.name, self.name)
 
     @staticmethod
     def exists(ship_name: str, player: Player):
@@ -799,12 +1345,12 @@ class Ship:
         return response
 
     @staticmethod
-    def ships_at_position(position):
-        ships = []
-        for ship in Ship.ships.values():
-            if ship.position == position:
-                ships.append(ship)
-        return ships
+    def ships_at_position(position: Position):
+        """ ships at this position, from the backref of the position, sorted by (owner name, ship name) """
+        return sorted(position.ships, key=lambda ship: (ship.player.name, ship.name))
+
+# world used when no world is bound, see World.bound()
+default_world = World()
 
 # Pas pertinent (pour l'instant), car pas d'information changeante à stocker
 # @dataclass
@@ -818,15 +1364,16 @@ class PlanetMemory:
     temperature: int
     humidity: int
 
-@dataclass
+@dataclass(slots=True)
 class ShipMemory:
     player: Player
     name: str
     ship_type: str
     size: int
     position: Position
+    turn: int
 
-@dataclass
+@dataclass(slots=True)
 class ColonyMemory:
     player: Player
     planet: Planet
@@ -834,123 +1381,116 @@ class ColonyMemory:
     RO: int
     turn: int
 
-class Memory:
-    """
-    Cette classe est une mémoire de ce que le joueur a vu,
-    et qui depuis peut ne plus être visible (brouillard de guerre)
-
-    Classe singleton pour éviter les divergences de données
-    On pourrait même n'avoir que des méthodes de classe
-
-    Les données sont rangées par joueur, dans un dict :
-        key is player_name: str
-    Ainsi, Memory[<player_GladOS>] contient les infos que GladOS a vu
-
-    Les infos sont les suivantes :
-            {
-                player1: {
-                    "ships": [list of ships]                    # cleared every turn
-                    "colonies": [list of colony_memory_object]  # permanent, updated in case of revisiting the star
-                },
-                player2: {
-                    "ships": [list of ships]
-                    "colonies": [list of colony_memory_object]
-                },
-            }
-
+class Intel:
     """
-    players = {}
+    Ce qu'un joueur sait des colonies et des vaisseaux des autres joueurs,
+    avec le tour où il les a vus pour la dernière fois (brouillard de guerre)
 
-    @classmethod
-    def update_colonies_memory(cls):
-        """ remember colonies of other players """
-        for player in Player.players.values():
-            # add player in memory
-            if player not in cls.players:
-                cls.players[player] = {}
-            memory = cls.players[player]
-
-            # on efface à chaque tour les vaisseaux vus les tours précédents, impossible à mettre à jour sinon
-            for dico in cls.players.values():
-                dico["ships"] = []
-
-            # update players and ship
-            positions = positions_where_i_am(player)
-            for position in positions:
-                for (ship_name, other_player), ship in Ship.ships_at_position(position):
-                    # (new) player is met
-                    if other_player not in memory:
-                        # nouvelle rencontre
-                        memory[other_player] = {"ships": [], "colonies": []}
-
-                    # remember his ships
-                    memory[other_player]["ships"].append(ship)
-
-            # update players and colonies
-            planets = planet_i_can_see(player)
-            for planet in planets:
-                # is there a colony here ?
-                try:
-                    colony = Colony(planet)
-
-                    other_player = colony.player
-                    if colony.player != player:     # on ne veut pas nos propres colonies, mais celles des autres
-                        # nouvelle rencontre
-                        if other_player not in memory:
-                            memory[other_player] = {"ships": [], "colonies": []}
-
-                        # remember his colony
-                        memory[other_player]["colonies"].append(ColonyMemory(
-                            player=colony.player,
-                            planet=planet,
-                            WF=colony.WF,
-                            RO=colony.RO,
-                            turn=GameData().turn
-                        ))
-
-                except LookupError as e:
-                    # there is no colony on this planet (or it has been destroyed)
-                    # on va check si on avait mémorisé une colonie à cet endroit
-                    # et supprimer son souvenir
-                    # TODO : à tester
-                    for dico in memory.values():
-                        for colony_memory in dico["colonies"]:
-                            if colony_memory.planet == planet:
-                                # remove it, it doesn't exists anymore
-                                dico["colonies"].remove(colony_memory)
-                                continue
-                    continue
+    Indexes :
+        intel.colonies[planet]                      --> ColonyMemory
+        intel.ships[(owner, lower_ship_name)]       --> ShipMemory, in the order of their last sighting
+        intel.owners[owner]                         --> ({planet, ...}, {(owner, lower_ship_name), ...})
+        intel.ships_at[Position.key(x, y, z)]       --> {(owner, lower_ship_name), ...}
+    ships_at is keyed by coords : the Position objects of empty sectors are collected (Position.collect_garbage())
 
+    Updated by GameData.update_intel()
+    """
+    __slots__ = ("colonies", "ships", "owners", "ships_at")
+
+    def __init__(self):
+        self.colonies = {}
+        self.ships = {}
+        self.owners = {}
+        self.ships_at = {}
+
+    def owned_by(self, owner: Player):
+        """ (planets, ships keys) known of this owner """
+        known = self.owners.get(owner)
+        if known is None:
+            known = self.owners[owner] = (set(), set())
+        return known
+
+    def forget_owner_if_unknown(self, owner: Player):
+        planets, ships = self.owners[owner]
+        if not planets and not ships:
+            del self.owners[owner]
+
+    def remember_colony(self, memory: ColonyMemory):
+        previous = self.colonies.get(memory.planet)
+        if previous is not None and previous.player is not memory.player:
+            # the planet has changed hands
+            self.forget_colony(memory.planet)
+        self.colonies[memory.planet] = memory
+        self.owned_by(memory.player)[0].add(memory.planet)
+
+    def forget_colony(self, planet: Planet):
+        """ returns False if there was no colony remembered on this planet """
+        memory = self.colonies.pop(planet, None)
+        if memory is None:
+            return False
+        self.owners[memory.player][0].discard(planet)
+        self.forget_owner_if_unknown(memory.player)
+        return True
+
+    def remember_ship(self, memory: ShipMemory):
+        key = (memory.player, memory.name.lower())
+        previous = self.ships.pop(key, None)
+        if previous is not None:
+            self.forget_position(previous.position, key)
+        # at the end : the ships stay in the order of their last sighting, see forget_ships_before()
+        self.ships[key] = memory
+        self.owned_by(memory.player)[1].add(key)
+        position = memory.position
+        self.ships_at.setdefault(Position.key(position.x, position.y, position.z), set()).add(key)
+
+    def forget_position(self, position: Position, key: tuple):
+        coords = Position.key(position.x, position.y, position.z)
+        keys = self.ships_at[coords]
+        keys.discard(key)
+        if not keys:
+            del self.ships_at[coords]
+
+    def forget_ship(self, key: tuple):
+        """ returns False if this ship wasn't remembered """
+        memory = self.ships.pop(key, None)
+        if memory is None:
+            return False
+        self.forget_position(memory.position, key)
+        self.owners[memory.player][1].discard(key)
+        self.forget_owner_if_unknown(memory.player)
+        return True
+
+    def forget_ships_before(self, turn: int):
+        """ forgets the ships not seen since this turn, returns their number """
+        count = 0
+        while self.ships:
+            key, memory = next(iter(self.ships.items()))
+            if memory.turn >= turn:
+                break
+            self.forget_ship(key)
+            count += 1
+        return count
+
+    def known(self, owner: Player):
+        """ colonies and ships remembered of this owner : ([ColonyMemory, ...], [ShipMemory, ...]) """
+        planets, ships = self.owners.get(owner, ((), ()))
+        return [self.colonies[planet] for planet in planets], [self.ships[key] for key in ships]
+
+
+def memory_metrics():
+    """ sizes of the world registries and caches, see play.play_one_turn() """
+    return {
+        "positions": len(Position.positions),
+        "stars": len(Star.stars),
+        "planets": len(Planet.planets),
+        "colonies": len(Colony.colonies),
+        "ships": len(Ship.ships),
+        "suitability_cache": sum(len(player.suitability) for player in Player.players.values()),
+        "intel": sum(len(intel.colonies) + len(intel.ships) for intel in GameData().intel.values()),
+        "distance_matrix_bytes": Star.distances.nbytes if Star.distances is not None else 0,
+        "jump_tables_bytes": sum(table.nbytes for table in current_world().jump_tables.values()),
+    }
 
 def positions_where_i_am(player: Player):
-    pos_where_i_am = set()
-    # positions of my colonies
-    colonies_positions = [colony.planet.star.position for colony in player.colonies]
-
-    # positions of my ships
-    ships_positions = [ship.position for ship in player.ships]
-
-    # combnination of ships and colonies positions
-    for position in colonies_positions:
-        pos_where_i_am.add(position)
-    for position in ships_positions:
-        pos_where_i_am.add(position)
-
-    return pos_where_i_am
-
-def planet_i_can_see(player: Player):
-    # gather positions where player is
-    pos_where_i_am = positions_where_i_am(player)
-
-    # gather stars where player is
-    stars = set()
-    for position in pos_where_i_am:
-        if Star.exists(position):
-            stars.add(Star(position))
-
-    # gather planets where player is
-    planets = set()
-    for star in stars:
-        planets.update(list(star.planets.values()))
-
-    return planets
+    """ positions of the colonies and ships of the player """
+    return set(visibility.observer_positions(player))
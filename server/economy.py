@@ -0,0 +1,231 @@
+"""
+Batched economy kernel : ressources production of many colonies in one vectorized pass
+
+The colonies data (WF, RO, stockpiles), their planet environment and their owner technologies
+are gathered in numpy arrays, then food & parts net incomes are computed for all of them at once.
+
+The per-colony functions in server/production.py (food_production, parts_production, ...)
+are the reference implementation : both must give the same results.
+
+Planet suitability (production factors and max productions of a planet for a player) only depends on
+the planet environment, the player prefered temperature and his BIO/MECA levels : it is cached on the player,
+see planets_suitability()
+"""
+from typing import List
+from dataclasses import dataclass
+import numpy as np
+
+from server.data import Colony, Planet, Player
+import server.sbc_parameters as sbc
+
+
+def gauss_factor(x: np.ndarray, moy: np.ndarray, std: np.ndarray):
+    """ gauss(x, moy, std) / gauss(moy, moy, std) : the normalisation of the gaussian cancels out """
+    return np.exp(-(x - moy) ** 2 / (2 * std ** 2))
+
+
+def food_factors(temperature: np.ndarray, humidity: np.ndarray, prefered_temperature: np.ndarray, bio: np.ndarray):
+    """ vectorized production.food_planet_factor() """
+    temperature_factor = gauss_factor(temperature, prefered_temperature, sbc.BASE_STD_TEMP + bio)
+    humidity_factor = np.maximum((humidity + bio / 2) / 100, 1)
+    return temperature_factor * humidity_factor
+
+
+def parts_factors(temperature: np.ndarray, humidity: np.ndarray, prefered_temperature: np.ndarray, meca: np.ndarray):
+    """ vectorized production.parts_planet_factor() """
+    temperature_factor = gauss_factor(temperature, prefered_temperature, sbc.BASE_STD_TEMP + meca)
+    humidity_factor = np.maximum((100 - (humidity + meca / 2)) / 100, 1)
+    return temperature_factor * humidity_factor
+
+
+class EconomyBatch:
+    """
+    Structure of arrays for a batch of colonies, index i of each array is self.colonies[i]
+
+    Usage :
+        batch = EconomyBatch(colonies)
+        food_incomes, parts_incomes = batch.net_incomes()
+    """
+    def __init__(self, colonies: List[Colony]):
+        self.colonies = list(colonies)
+        count = len(self.colonies)
+
+        def column(values, dtype=np.float64):
+            return np.fromiter(values, dtype=dtype, count=count)
+
+        # colonies
+        self.WF = column(colony.WF for colony in self.colonies)
+        self.RO = column(colony.RO for colony in self.colonies)
+
+        # planets environment relative to their owner (cached)
+        suitabilities = colonies_suitability(self.colonies)
+        self.food_factor = column(suitability.food_factor for suitability in suitabilities)
+        self.parts_factor = column(suitability.meca_factor for suitability in suitabilities)
+
+    def net_incomes(self):
+        """ vectorized production.food_production() and production.parts_production() """
+        food_created = self.food_factor * self.WF * (sbc.BASE_MAINTENANCE_WF + sbc.BASE_PRODUCTIVITY * np.exp(-self.WF / sbc.POP_THRESHOLD))
+        food_maintenance = sbc.BASE_MAINTENANCE_WF * self.WF
+        food_balance = food_created - food_maintenance
+
+        spare_parts_created = sbc.BASE_PRODUCTIVITY * self.RO * np.exp(-self.RO / sbc.POP_THRESHOLD)
+        spare_parts_maintenance = sbc.BASE_MAINTENANCE_RO * self.RO * (1 - self.parts_factor)
+        spare_parts_balance = spare_parts_created - spare_parts_maintenance
+
+        return food_balance, spare_parts_balance
+
+
+def lambert_w0(z: np.ndarray):
+    """
+    Principal branch W0 of the Lambert W function (w * exp(w) = z), for z >= -1/e
+    Vectorized Halley iterations, the branch point z = -1/e gives w = -1
+    """
+    z = np.maximum(np.asarray(z, dtype=np.float64), -1 / np.e)
+    # initial guess : series around the branch point for low z, log(1+z) otherwise
+    p = np.sqrt(np.maximum(2 * (np.e * z + 1), 0))
+    w = np.where(z < -0.25, -1 + p - p ** 2 / 3, np.log1p(np.maximum(z, -0.25)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(20):
+            ew = np.exp(w)
+            f = w * ew - z
+            step = f / (ew * (w + 1) - (w + 2) * f / (2 * w + 2))
+            step = np.where(np.isfinite(step), step, 0)
+            w = w - step
+            if np.all(np.abs(step) <= 1e-12 * (1 + np.abs(w))):
+                break
+
+    return np.where(p == 0, -1.0, w)
+
+
+def optimal_income(gain: np.ndarray, cost: np.ndarray):
+    """
+    Maximum of the net income curve  income(x) = gain * x * exp(-x/POP_THRESHOLD) - cost * x
+    which is the shape of both food (gain = factor*BASE_PRODUCTIVITY, cost = BASE_MAINTENANCE_WF*(1-factor))
+    and parts productions (gain = BASE_PRODUCTIVITY, cost = BASE_MAINTENANCE_RO*(1-factor))
+
+    income'(x) = 0  <=>  (1-u) exp(-u) = cost/gain  with u = x/POP_THRESHOLD
+                    <=>  u = 1 - W0(e * cost/gain)
+
+    - cost/gain >= 1 : income is never positive, best is x = 0
+    - cost/gain < -exp(-2) : income grows without limit (high techs), x is capped at 2 * POP_THRESHOLD
+    The optimum is searched on integers (floor or ceil of the real optimum)
+
+    returns (max_income, optimal_x) : float and integer arrays
+    """
+    gain = np.asarray(gain, dtype=np.float64)
+    cost = np.asarray(cost, dtype=np.float64)
+    threshold = sbc.POP_THRESHOLD
+
+    def income(x):
+        return gain * x * np.exp(-x / threshold) - cost * x
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        ratio = np.where(gain > 0, cost / gain, np.inf)
+    productive = ratio < 1
+    u = np.where(productive, 1 - lambert_w0(np.e * np.where(productive, ratio, 0)), 0)
+
+    x_floor = np.floor(u * threshold)
+    x_ceil = np.where(productive, np.minimum(x_floor + 1, np.floor(2 * threshold)), 0)
+    income_floor = income(x_floor)
+    income_ceil = income(x_ceil)
+    best_x = np.where(income_ceil > income_floor, x_ceil, x_floor)
+    max_income = np.maximum(income_floor, income_ceil)
+
+    return max_income, best_x.astype(np.int64)
+
+
+def planets_max_productions(planets: List[Planet], player: Player):
+    """
+    Vectorized production.find_max_food_production() and production.find_max_parts_production()
+    over planets, for one player
+
+    returns a dict of arrays (index i is planets[i]) :
+        food_factor, meca_factor, max_food_prod, max_wf, max_parts_prod, max_ro
+    """
+    count = len(planets)
+    temperature = np.fromiter((planet.temperature for planet in planets), dtype=np.float64, count=count)
+    humidity = np.fromiter((planet.humidity for planet in planets), dtype=np.float64, count=count)
+
+    food_factor = food_factors(temperature, humidity, player.prefered_temperature, player.techs["bio"].level)
+    parts_factor = parts_factors(temperature, humidity, player.prefered_temperature, player.techs["meca"].level)
+    max_food_prod, max_wf = optimal_income(food_factor * sbc.BASE_PRODUCTIVITY, sbc.BASE_MAINTENANCE_WF * (1 - food_factor))
+    max_parts_prod, max_ro = optimal_income(sbc.BASE_PRODUCTIVITY, sbc.BASE_MAINTENANCE_RO * (1 - parts_factor))
+
+    return {
+        "food_factor": food_factor,
+        "meca_factor": parts_factor,
+        "max_food_prod": max_food_prod,
+        "max_wf": max_wf,
+        "max_parts_prod": max_parts_prod,
+        "max_ro": max_ro,
+    }
+
+
+@dataclass
+class Suitability:
+    """ production capacities of a planet for a player """
+    food_factor: float
+    meca_factor: float
+    max_food_prod: float
+    max_wf: int
+    max_parts_prod: float
+    max_ro: int
+
+    def to_dict(self):
+        return {
+            "food_factor": self.food_factor,
+            "meca_factor": self.meca_factor,
+            "max_food_prod": self.max_food_prod,
+            "max_wf": self.max_wf,
+            "max_parts_prod": self.max_parts_prod,
+            "max_ro": self.max_ro,
+        }
+
+
+def planets_suitability(planets: List[Planet], player: Player):
+    """
+    Suitability of the planets for a player, from the cache of the player
+    Cache misses are computed together in one vectorized pass
+
+    Cache is player.suitability = {(planet, bio_level, meca_level): Suitability}
+    it is cleared by research.upgrade_tech() when BIO or MECA level changes
+
+    returns a list of Suitability, index i is planets[i]
+    """
+    cache = player.suitability
+    bio = player.techs["bio"].level
+    meca = player.techs["meca"].level
+
+    missing = [planet for planet in dict.fromkeys(planets) if (planet, bio, meca) not in cache]
+    if missing:
+        capacities = planets_max_productions(missing, player)
+        columns = [capacities[key].tolist() for key in
+                   ("food_factor", "meca_factor", "max_food_prod", "max_wf", "max_parts_prod", "max_ro")]
+        for planet, *values in zip(missing, *columns):
+            cache[(planet, bio, meca)] = Suitability(*values)
+
+    return [cache[(planet, bio, meca)] for planet in planets]
+
+
+def colonies_suitability(colonies: List[Colony]):
+    """ suitability of the planet of each colony for its owner, index i is colonies[i] """
+    planets_by_player = {}
+    for colony in colonies:
+        planets_by_player.setdefault(colony.player, []).append(colony.planet)
+    for player, planets in planets_by_player.items():
+        planets_suitability(planets, player)    # fills the cache
+
+    return [colony.player.suitability[(colony.planet, colony.player.techs["bio"].level, colony.player.techs["meca"].level)]
+            for colony in colonies]
+
+
+def colonies_incomes(colonies: List[Colony]):
+    """
+    Net incomes of the colonies for this turn, in one vectorized pass
+
+    returns a dict : {colony: (food_income, parts_income)}, incomes are python floats
+    """
+    batch = EconomyBatch(colonies)
+    food_incomes, parts_incomes = batch.net_incomes()
+    return dict(zip(batch.colonies, zip(food_incomes.tolist(), parts_incomes.tolist())))
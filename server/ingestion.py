@@ -0,0 +1,99 @@
+"""
+Orders ingestion : the orders files of the turn are read, parsed and checked before any execution
+
+    files = orders_files(tmp_folder + "/orders")
+    orders = ingest_orders(tmp_folder + "/orders", workers=8, files=files)
+    ...                                             # the turn is played and saved
+    archive_orders(tmp_folder + "/orders", files)
+
+1- the files are parsed within a pool of threads (reading the files is the main cost with many players)
+2- each command is checked against the schema of its phase (see orders.COMMANDS), invalid commands are ignored
+   and their errors are kept in orders.diagnostics, for the report of the player
+3- a file that can't be used (unreadable, no player) is logged and ignored : it doesn't stop the turn,
+   its player (PLAYER line, or file name orders.<player>.T<turn>.txt as written by the bots) is told in his report
+4- once the turn is saved, the files are moved to the archive folder (archive_orders()) :
+   the orders of a turn that failed are still in the orders folder for the next try
+
+The orders are returned in the order of the files names : same order of play whatever the file system.
+If a player sent several files, the last one (by name) is kept.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from server.orders import Orders
+from server.sbc_parameters import LOG_LEVEL
+
+# logging
+logger = logging.getLogger("sbc")
+
+
+def read_orders(filename: str):
+    """ (orders, None) or (None, error) : a bad file doesn't raise """
+    try:
+        return Orders(filename), None
+    except (OSError, UnicodeDecodeError) as error:
+        return None, repr(error)
+
+def player_of_file(file: str):
+    """ player name given by the file name orders.<player>.T<turn>.txt (see bot.Bot), None for another name """
+    parts = file.split(".")
+    return parts[1].lower() if len(parts) > 2 and parts[0] == "orders" and parts[1] else None
+
+def orders_files(orders_folder: str) -> List[str]:
+    """ names of the orders files waiting in orders_folder, sorted """
+    return sorted(entry.name for entry in os.scandir(orders_folder) if entry.is_file())
+
+def ingest_orders(orders_folder: str, workers: int = 1, files: List[str] = None) -> List[Orders]:
+    """ orders of the players, from the files of orders_folder (default: all of them), see module docstring """
+    if files is None:
+        files = orders_files(orders_folder)
+    logger.debug(f"{LOG_LEVEL(2)}{len(files)} orders files found")
+
+    paths = [f"{orders_folder}/{file}" for file in files]
+    if workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_orders, paths))
+    else:
+        results = [read_orders(path) for path in paths]
+
+    by_player = {}     # key = player name, value = (file, orders)
+    rejected = set()    # players whose orders are only the errors of rejected files
+    for file, (orders, error) in zip(files, results):
+        if error is None and not orders.player_name:
+            error = "no PLAYER line"
+        if error is not None:
+            message = f"orders file {file} ignored : {error}"
+            logger.error(message)
+            player_name = orders.player_name if orders is not None and orders.player_name else player_of_file(file)
+            if player_name is None:
+                continue
+            previous = by_player.get(player_name)
+            if previous is not None:
+                # the orders already received are kept
+                previous[1].diagnostics.append(message)
+            else:
+                empty = Orders()
+                empty.player_name = player_name
+                empty.diagnostics.append(message)
+                by_player[player_name] = (file, empty)
+                rejected.add(player_name)
+            continue
+        for diagnostic in orders.diagnostics:
+            logger.info(f"{LOG_LEVEL(3)}orders file {file} : {diagnostic}")
+
+        previous = by_player.pop(orders.player_name, None)
+        if orders.player_name in rejected:
+            rejected.discard(orders.player_name)
+            orders.diagnostics[:0] = previous[1].diagnostics
+        elif previous is not None:
+            orders.diagnostics.insert(0, f"orders of {previous[0]} replaced by the ones of {file}")
+        by_player[orders.player_name] = (file, orders)
+
+    return [orders for file, orders in by_player.values()]
+
+def archive_orders(orders_folder: str, files: List[str]):
+    """ moves the orders files of a played turn to the archive folder, even the ignored ones """
+    for file in files:
+        os.rename(f"{orders_folder}/{file}", f"{orders_folder}/archive/{file}")
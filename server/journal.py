@@ -0,0 +1,80 @@
+"""
+Turn journal : the changes of the world made during a turn
+
+Objects are referenced by their natural keys (player name, ship name, star coords, ...)
+and states are recorded as absolute values (not increments), so replaying a journal is idempotent.
+
+Ops recorded :
+    ("ship", player_name, ship_name, ship_type, size, x, y, z)       # creation or move
+    ("ship-del", player_name, ship_name)
+    ("colony", x, y, z, numero, player_name, WF, RO, food, parts)     # creation or new state
+    ("colony-del", x, y, z, numero)
+    ("player", player_name, EU)
+    ("tech", player_name, tech_name, level, progression)
+    ("star-name", x, y, z, name)
+    ("visited", x, y, z, player_name, turn)
+    ("seen", x, y, z, player_name)
+    ("relation", player1_name, player2_name, relation_value)
+    ("intel",)      # GameData.update_intel() : done again at replay, the intel only depends on the world
+
+Ops of the journals written before the "intel" op, still replayed :
+    ("memory", observer_name, x, y, z, numero, owner_name, WF, RO, turn)     # colony seen by another player
+    ("memory-del", observer_name, x, y, z, numero)                           # colony seen destroyed
+    ("intel-ship", observer_name, owner_name, ship_name, ship_type, size, x, y, z, turn)
+
+File format : append-only, one JSON line per turn : {"turn": 12, "ops": [[...], [...]]}
+"""
+import json
+import os
+
+
+class Journal:
+    """
+    Recorder of the changes of the world, each World has its own (server.data.journal is the one of the current world)
+    The game engine records only while a turn is played:
+        journal.start(turn)
+        ...                             # data objects call journal.record(...)
+        journal.append_to(filename)     # write the turn and stop recording
+    """
+    def __init__(self):
+        self.recording = False
+        self.turn = None
+        self.ops = []
+
+    def start(self, turn: int):
+        self.recording = True
+        self.turn = turn
+        self.ops = []
+
+    def stop(self):
+        self.recording = False
+        self.ops = []
+
+    def record(self, *op):
+        if self.recording:
+            self.ops.append(op)
+
+    def append_to(self, filename: str):
+        """ append the ops of the current turn to the journal file, then stop recording """
+        line = json.dumps({"turn": self.turn, "ops": self.ops}, ensure_ascii=False, separators=(",", ":"))
+        with open(filename, "a", encoding="utf8") as f:
+            f.write(line + "\n")
+        self.stop()
+
+    @staticmethod
+    def read(filename: str, after_turn: int, up_to_turn: int = None):
+        """
+        returns [(turn, ops), ...] sorted by turn, for after_turn < turn <= up_to_turn
+        if a turn has been written several times (turn played again), the last one is kept
+        """
+        turns = {}
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="utf8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    turn = entry["turn"]
+                    if turn > after_turn and (up_to_turn is None or turn <= up_to_turn):
+                        turns[turn] = entry["ops"]
+        return sorted(turns.items())
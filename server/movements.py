@@ -1,12 +1,13 @@
 from server.data import Planet, Player, Ship, Position
 # from server.sbc_parameters import *
 import server.sbc_parameters as sbc
-from server.data import Planet, Player, Colony, Ship, Star
-from server.orders import Orders
+from server.data import GameData, Planet, Player, Colony, Ship, Star, current_world, visibility
+from server.commands import CompiledCommand, CompiledOrders, PhaseContext, Verb
 from server.report import Report
 
 import math
 import random
+import numpy as np
 from typing import List
 import logging
 
@@ -14,12 +15,42 @@ import logging
 logger = logging.getLogger("sbc")
 
 
-def jump(player: Player, ship: Ship, destination: Position):
-    """ success_chance is in % """
-    distance = ship.position.distance_to(destination)
+def jump_success_table(gv_level: int):
+    """
+    Success chances (%) of jumps for a GV level : 100 * exp(-distance / (JUMP_SAFE_DISTANCE + gv_level))
+    indexed by the squared distance, an integer as coords are integers
+    The table goes up to the largest star to star distance, at most sbc.JUMP_TABLE_SIZE entries :
+    8 bytes by entry (512 KB by GV level with the default size). It is computed once for each level,
+    and kept in the world of the game (freed with it).
+    """
+    size = min(Star.max_squared_distance() + 1, sbc.JUMP_TABLE_SIZE)
+    tables = current_world().jump_tables
+    table = tables.get(gv_level)
+    if table is None or len(table) < size:
+        table = 100 * np.exp(-np.sqrt(np.arange(size)) / (sbc.JUMP_SAFE_DISTANCE + gv_level))
+        tables[gv_level] = table
+    return table
+
+def jump_success_chance(gv_level: int, squared_distance: int):
+    """
+    Success chance (%) of a jump, from jump_success_table()
+    A jump beyond the table (towards an empty sector, or in a huge galaxy) is computed
+    """
+    table = jump_success_table(gv_level)
+    if squared_distance < len(table):
+        return table[squared_distance]
+    return 100 * math.exp(-math.sqrt(squared_distance) / (sbc.JUMP_SAFE_DISTANCE + gv_level))
+
+
+def jump(player: Player, ship: Ship, destination: Position, rng: random.Random = random):
+    """
+    success_chance is in %, see jump_success_chance()
+    rng : random stream of the player for this turn (see server/rng.py)
+    """
+    squared_distance = ship.position.squared_distance_to(destination)
 
-    success_chance = 100 * math.exp(-distance / (sbc.JUMP_SAFE_DISTANCE + player.techs['gv'].level))
-    lottery = random.uniform(0, 100)
+    success_chance = jump_success_chance(player.techs['gv'].level, squared_distance)
+    lottery = rng.uniform(0, 100)
 
     if lottery < success_chance:
         # jump is a success
@@ -29,71 +60,109 @@ def jump(player: Player, ship: Ship, destination: Position):
     else:
         # jump is fail
         # jumping somewhere between origin and destination
-        x = random.randint(min(ship.position.x, destination.x), max(ship.position.x, destination.x))
-        y = random.randint(min(ship.position.y, destination.y), max(ship.position.y, destination.y))
-        z = random.randint(min(ship.position.z, destination.z), max(ship.position.z, destination.z))
+        x = rng.randint(min(ship.position.x, destination.x), max(ship.position.x, destination.x))
+        y = rng.randint(min(ship.position.y, destination.y), max(ship.position.y, destination.y))
+        z = rng.randint(min(ship.position.z, destination.z), max(ship.position.z, destination.z))
         ship.position = Position(x, y, z)
         jump_success = False
 
     return jump_success
 
 
-def movement_phase(player: Player, orders: Orders, report: Report):
-    """ orders execution for the movement phase for this player """
-
-    # se souvenir des systèmes visés pour l'explo pour empecher 2 vaisseaux d'aller explorer le même
-    stars_targeted_for_explo = []
+def movement_phase(player: Player, orders: CompiledOrders, report: Report):
+    """ orders execution for the movement phase for this player, see MOVEMENT_HANDLERS """
 
-    for cmd, *cmd_arguments in orders.move_cmd:
-        logger.debug(f"{sbc.LOG_LEVEL(5)}cmd: {cmd}")
+    # random stream of this player for this turn : doesn't depend on the other players
+    rng = GameData().rng.stream("movements", GameData().turn, player.name)
+    context = PhaseContext(player, report, rng)
 
-        cmd = cmd.lower()
-        match cmd:
-            case "jump":
-                jump_cmd(cmd_arguments, player, report)
-            case "name":
-                assign_name(cmd_arguments, player, report)
-            case "explore":
-                explore(cmd_arguments, stars_targeted_for_explo, player, report)
+    for command in orders.movements:
+        logger.debug(f"{sbc.LOG_LEVEL(5)}cmd: {command.source}")
+        MOVEMENT_HANDLERS[command.verb](command, context)
 
 
-def explore(arguments: List[str], stars_targeted_for_explo: List[Star], player: Player, report: Report):
+class ExplorationPlanner:
+    """
+    Exploration targets of the ships of a player, during a movement phase
+
+    The stars seen by the player are gathered once (from the visibility engine, in the order of Star.stars),
+    then each exploring ship gets :
+        - a star among the least recently visited by the player (never visited = turn 0)
+        - the closest one : the most likely to be reached, jump success chance decreases with distance
+        - not already given to another ship of the player
+    Targets are searched with numpy on arrays of the seen stars, the stars already given are masked.
+    Distances from a ship on a star come from the star distance matrix (Star.distance_matrix()).
+
+    Usage :
+        planner = ExplorationPlanner(player)
+        star = planner.target(ship)     # None if there is no star left to explore
+    """
+    def __init__(self, player: Player):
+        self.player = player
+        self.matrix = Star.distance_matrix()
+        self.stars = sorted(visibility.seen_stars(player), key=self.matrix.index.__getitem__)
+        count = len(self.stars)
+        self.matrix_ids = np.fromiter((self.matrix.index[star] for star in self.stars), dtype=np.int64, count=count)
+        self.coords = np.array([(star.position.x, star.position.y, star.position.z) for star in self.stars],
+                               dtype=np.float64).reshape(count, 3)
+        self.last_visit = np.fromiter((star.visited_by.get(player, 0) for star in self.stars), dtype=np.int64, count=count)
+        self.available = np.ones(count, dtype=bool)
+
+    def target(self, ship: Ship):
+        """ assigns the next exploration target of the ship, None if there is no star left """
+        if not self.available.any():
+            return None
+
+        # least recently visited stars first
+        oldest_visit = self.last_visit[self.available].min()
+        candidates = np.flatnonzero(self.available & (self.last_visit == oldest_visit))
+
+        # then the closest one
+        position = ship.position
+        if position in Star.stars:
+            distances = self.matrix.row(self.matrix.index[Star(position)])[self.matrix_ids[candidates]]
+        else:
+            # a failed jump has left the ship between stars
+            deltas = self.coords[candidates] - (position.x, position.y, position.z)
+            distances = np.sqrt((deltas ** 2).sum(axis=1))
+        chosen = candidates[np.argmin(distances)]
+
+        self.available[chosen] = False
+        return self.stars[chosen]
+
+
+def explore(command: CompiledCommand, context: PhaseContext):
     """
     Orthographique typique :
         EXPLORE BF1 Firefly
+
+    context.planner : exploration targets of the player for this phase, see ExplorationPlanner
     """
+    player, report, rng = context.player, context.report, context.rng
+    ship_type, ship_size, ship_name = command.what, command.size, command.name
+
     # Ship concerned
-    ship_type, ship_size, ship_name = Ship.parse_ship(arguments[:2])
-    if not Ship.exists(ship_name, player):
+    ship = command.ship_of(player)
+    if ship is None:
         # ship doesn't exists !
         report.record_mov(f"{ship_name} doesn't exist for player {player.name}")
         return
 
-    # ship exists, so get it
-    ship = Ship(ship_name, player)
-
-    # destination
-    # closest_unvisited_star
-
-    # get the list of unvisited stars
-    seen_stars = [star for star in Star.stars.values() if player in star.seen_by]
-
-    # sort the list by distance
-    stars_sorted_by_distance = sorted(seen_stars, key=lambda s: ship.position.distance_to(s.position))
-
-    # sort by last_visit : the oldest first -- conserve previous sort by distance for egality : if not visited, last visit = turn 0
-    stars_sorted = sorted(stars_sorted_by_distance, key=lambda star: star.visited_by.get(player, 0))
-
-    # remove explo targets already assigned
-    valid_sorted_destination = [star for star in stars_sorted if
-                                star not in stars_targeted_for_explo]
-    # store this target for future explo ships
-    star_destination = valid_sorted_destination[0]  # TODO : gérer le cas où la liste est vide et xxx[0] n'existe pas
-    stars_targeted_for_explo.append(star_destination)
+    # se souvenir des systèmes visés pour l'explo pour empecher 2 vaisseaux d'aller explorer le même
+    # the planner is built at the first EXPLORE order
+    if context.planner is None:
+        context.planner = ExplorationPlanner(player)
+    planner = context.planner
+
+    # destination : the oldest visited star, then the closest, not targeted by another ship
+    star_destination = planner.target(ship)
+    if star_destination is None:
+        report.record_mov(f"Exploration: no star left to explore for {ship_name}", 5)
+        return
     report.record_mov(f"Exploration: {ship_name} will jump to {star_destination}", 5)
 
     # jump
-    jump_success = jump(player, ship, star_destination.position)
+    jump_success = jump(player, ship, star_destination.position, rng)
 
     # logging
     if jump_success:
@@ -102,20 +171,18 @@ def explore(arguments: List[str], stars_targeted_for_explo: List[Star], player:
         report.record_mov(f"{ship_type}{ship_size} {ship_name} failed to jump to {star_destination}", 5)
 
 
-def assign_name(arguments: List[str], player: Player, report: Report):
+def assign_name(command: CompiledCommand, context: PhaseContext):
     """
         assign a name to star system -and its planets and futures colonies-
 
         NAME X Y Z Earth
-        arguments = ["X", "Y", "Z", "Earth"]
+        command.position = Position(X, Y, Z), command.name = "Earth"
 
     """
-    # parse data    TODO : check syntax ?
-    x = int(arguments[0])
-    y = int(arguments[1])
-    z = int(arguments[2])
-    position = Position(x, y, z)
-    name = arguments[3]
+    player, report = context.player, context.report
+    position = command.position
+    x, y, z = position.x, position.y, position.z
+    name = command.name
 
     # check if the player is at this position
     present = False
@@ -143,42 +210,33 @@ def assign_name(arguments: List[str], player: Player, report: Report):
     report.record_mov(f"star in {x} {y} {z} is now called {star.name}", 5)
 
 
-def jump_cmd(arguments: List[str], player: Player, report: Report):
+def jump_cmd(command: CompiledCommand, context: PhaseContext):
     """
     2 formalism accepted :
         JUMP BF2 Firefly X Y Z
         JUMP BF2 Firefly PL Earth
     """
-    # TODO : check if arguments are as expected
-    # for example BF instead of BF1
+    player, report, rng = context.player, context.report, context.rng
+    ship_type, ship_size, ship_name = command.what, command.size, command.name
 
     # Ship concerned
-    ship_type, ship_size, ship_name = Ship.parse_ship(arguments[:2])
-    if not Ship.exists(ship_name, player):
+    ship = command.ship_of(player)
+    if ship is None:
         # ship doesn't exists !
         report.record_mov(f"{ship_name} doesn't exist for player {player.name}")
         return
 
-    # ship exists
-    ship = Ship(ship_name, player)
-
     # Destination concerned
-    destination = arguments[2:]
-    if destination[0].isnumeric():
+    destination = list(command.source.arguments[2:])
+    if command.position is not None:
         # we try to jump to X Y Z coords
         # destination = ["10", "8", "12"]
-        x = int(destination[0])
-        y = int(destination[1])
-        z = int(destination[2])
-
-        # Retrieve corresponding position
-        destination_position = Position(x, y, z)
-        jump_success = jump(player, ship, destination_position)
+        jump_success = jump(player, ship, command.position, rng)
 
     else:
         # destination formalism is 'PL Earth'
         # destination = ["PL", "Earth"]
-        planet_name = destination[1]
+        planet_name = command.target
 
         # retrieve the position where is the planet according to the naming of this player
         # destination_position = Planet.planets[]   # TODO : recover Planet from its name
@@ -190,3 +248,10 @@ def jump_cmd(arguments: List[str], player: Player, report: Report):
     else:
         report.record_mov(f"{ship_type}{ship_size} {ship_name} failed to jump to {destination}", 5)
 
+
+# execution of the movement commands
+MOVEMENT_HANDLERS = {
+    Verb.JUMP: jump_cmd,
+    Verb.NAME: assign_name,
+    Verb.EXPLORE: explore,
+}
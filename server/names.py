@@ -6,17 +6,18 @@ VOWELS = ["a", "e", "i", "o", "u", "y", "ou", "au", "eu", "ei", "ai", "ay", "ey"
 FIRST = ["a", "b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "q", "r", "s", "t", "v", "w", "x", "z", "th", "bh", "dh", "ph"]
 CONSONANTS = ["b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "q", "r", "s", "t", "v", "w", "x", "z", "th", "bh", "dh", "rr", "ph", "ngu", "ng", "ll", "ss", "rm", "nt", "pp"]
 
-def generate_name():
-    length = random.randrange(3, 6)
+def generate_name(rng: random.Random = random):
+    """ rng : the game engine gives one of its random streams (see server/rng.py) """
+    length = rng.randrange(3, 6)
 
     word = ""
     for i in range(length):
         if i == 0:
-            word += random.choice(FIRST)
+            word += rng.choice(FIRST)
         elif i % 2 == 0:
-            word += random.choice(CONSONANTS)
+            word += rng.choice(CONSONANTS)
         else:
-            word += random.choice(VOWELS)
+            word += rng.choice(VOWELS)
     return word.capitalize()
 
 
@@ -1,5 +1,4 @@
 import math
-import random
 import numpy as np
 import logging
 import os
@@ -9,8 +8,9 @@ import json
 # from typing import List
 
 import server.data as data
-from server.data import GameData, Player, Planet, Position, Star, Ship, Colony, Technologies
+from server.data import GameData, Player, Planet, Position, Star, Ship, Colony, Technologies, World
 from server.names import generate_name
+from server.rng import RandomService
 from server.production import food_planet_factor, parts_planet_factor
 from server.report import generate_initial_reports, distribute_reports
 # from server.sbc_parameters import *
@@ -21,13 +21,29 @@ from server.sbc_parameters import LOG_LEVEL
 logger = logging.getLogger("sbc")
 
 
-def newgame(game_name: str, tmp_folder: str, config):
-    """ script to create the game objects """
+def newgame(game_name: str, tmp_folder: str, config, report_channel: str = "file-json", persist: bool = True,
+            seed: int = None, world: World = None):
+    """
+    script to create the game objects, report_channel : see report.distribute_reports()
+    persist : False to keep the world only in memory (no folders, no checkpoint), see play.play_one_turn()
+    seed : seed of the game (see server/rng.py), same seed & config gives the same galaxy and the same game
+    world : the world where the game is created (see data.World), default is the current world
+
+    returns the reports as dicts for the "dict" channel, None otherwise
+    """
+    if world is not None:
+        with world.bound():
+            return newgame(game_name, tmp_folder, config, report_channel=report_channel, persist=persist, seed=seed)
+
     logger.info(f"{LOG_LEVEL(1)}---- Creation of a new game ----")
 
     # Creating folders
-    os.makedirs(tmp_folder + "/orders", exist_ok=True)
-    os.makedirs(tmp_folder + "/orders/archive", exist_ok=True)
+    if persist:
+        os.makedirs(tmp_folder + "/orders", exist_ok=True)
+        os.makedirs(tmp_folder + "/orders/archive", exist_ok=True)
+
+    # the world may have held another game
+    GameData.reset()
 
     # init game turn counter
     GameData().turn = 0
@@ -36,11 +52,13 @@ def newgame(game_name: str, tmp_folder: str, config):
     star_names = create_player(config)
 
     # Create galaxy
-    galaxy_radius = create_galaxy(len(Player.players))
+    GameData().rng = RandomService(seed)
+    rng = GameData().rng.generator("galaxy", GameData().turn)
+    galaxy_radius = create_galaxy(len(Player.players), rng=rng)
     # print(galaxy_status())
 
     # Make homes (with new star and custom planets)
-    make_homes(galaxy_radius, star_names)
+    make_homes(galaxy_radius, star_names, rng)
     # DEBUG
     # for player in players:
     #     print(galaxy_status(player))
@@ -53,7 +71,15 @@ def newgame(game_name: str, tmp_folder: str, config):
 
     # send reports to players
     # distribute_reports(reports, tmp_folder, channel="file-yaml")  # DEBUG
-    distribute_reports(reports, tmp_folder, channel="file-json")  # DEBUG
+    distributed = distribute_reports(reports, tmp_folder, channel=report_channel)
+
+    # save the world : first checkpoint, and a new turn journal
+    if persist:
+        if os.path.exists(data.journal_file(tmp_folder, game_name)):
+            os.remove(data.journal_file(tmp_folder, game_name))
+        GameData().dump_gamedata(data.checkpoint_file(tmp_folder, game_name, GameData().turn))
+
+    return distributed
 
 
 def create_player(config):
@@ -87,7 +113,8 @@ def create_player(config):
 def create_galaxy(nb_of_player: int,
                   player_density: int = sbc.STAR_DENSITY_PER_PLAYER,
                   galaxy_density: int = sbc.GALAXY_DENSITY,
-                  max_planets_per_star: int = sbc.MAX_PLANETS_PER_STARS):
+                  max_planets_per_star: int = sbc.MAX_PLANETS_PER_STARS,
+                  rng: np.random.Generator = None):
     """
     Create galaxy, stars and planets according to nb_of_player
 
@@ -109,16 +136,17 @@ def create_galaxy(nb_of_player: int,
     Galaxy computation algo :
     nb_of_player --> nb_of_stars --> galaxy_volume --> galaxy_radius
 
-    star creation algo :
+    star creation algo (all stars in one batch) :
     1. pick random coordinates in system : theta[0, 2pi], phi[0, 2pi], radius[0, galaxy_radius]
     2. convert to x y z coordinates with shift (positives coordinates)
-    3. assure unicity
-    Repeat to get correct number of stars
+    3. assure unicity : duplicates are removed
+    Repeat with the missing number of stars
 
-    planets creation algo:
-    For each star :
-    1. random nb of planets
+    planets creation algo (all planets in one batch) :
+    1. random nb of planets for each star
     2. define randomly characteristics of each planet
+
+    rng : the random generator, every draw comes from it (same seed, same galaxy)
     """
     logger.info(f"{LOG_LEVEL(2)}-- Galaxy creation --")
 
@@ -129,81 +157,97 @@ def create_galaxy(nb_of_player: int,
     galaxy_volume = galaxy_density * nb_of_stars
     galaxy_radius = math.ceil((galaxy_volume*3/(4*math.pi)) ** (1/3))
 
-    # stars creation
-    while len(Star.stars) < nb_of_stars:
-        x, y, z = generate_star_position(galaxy_radius)
-        try:
-            Star(Position(x, y, z), create=True)
-        except LookupError:
-            # il y a déjà une étoile, pas de bol, tant pis on recommence
-            pass
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # stars creation : coordinates of all the stars, without duplicates (first draw is kept)
+    coords = np.empty((0, 3), dtype=np.int64)
+    while len(coords) < nb_of_stars:
+        missing = nb_of_stars - len(coords)
+        coords = np.concatenate([coords, generate_stars_positions(missing, galaxy_radius, rng)])
+        _, first = np.unique(coords, axis=0, return_index=True)
+        coords = coords[np.sort(first)]
+    stars = [Star(Position(x, y, z), create=True) for x, y, z in coords.tolist()]
     logger.info(f"{LOG_LEVEL(3)}number of stars created : {len(Star.stars)}")
 
-    # planets creation
-    for position, star in Star.stars.items():
-        # set number of planets for this system
-        nb_of_planet = random.randrange(0, max_planets_per_star, 1)
-
-        logger.debug(f"{LOG_LEVEL(3)}Star at: x: {position.x:>2} y: {position.y:>2} z: {position.z:>2}")
-        # creates the planets
-        for i in range(nb_of_planet):
-            humidity, temperature, atmosphere, size = generate_planet(i + 1)        # TODO : atmosphere, size are not used !
-            Planet(star=star,
-                   numero=i,
-                   temperature=temperature,
-                   humidity=humidity,
-                   create=True
-                   )
+    # planets creation : number of planets of each star, then characteristics of all the planets
+    nb_of_planets = rng.integers(0, max_planets_per_star, size=len(stars))
+    humidities, temperatures = generate_planets(int(nb_of_planets.sum()), rng)
+    numeros = np.arange(nb_of_planets.sum()) - np.repeat(np.cumsum(nb_of_planets) - nb_of_planets, nb_of_planets)
+    for star, numero, temperature, humidity in zip(np.repeat(stars, nb_of_planets).tolist(), numeros.tolist(),
+                                                   temperatures.tolist(), humidities.tolist()):
+        Planet(star=star,
+               numero=numero,
+               temperature=temperature,
+               humidity=humidity,
+               create=True
+               )
     logger.info(f"{LOG_LEVEL(3)}number of planets created : {len(Planet.planets)}")
 
     return galaxy_radius
 
-def generate_star_position(galaxy_radius: int):
+def generate_stars_positions(count: int, galaxy_radius: int, rng: np.random.Generator):
+    """ integer coordinates of count random stars : array of shape (count, 3), may contain duplicates """
     # spheric coords
-    # radius = random.uniform(0, galaxy_radius)
-    radius = galaxy_radius * math.sqrt(random.uniform(0, 1))  # appears to be more uniform on circle, less centered
-    theta = random.uniform(0, 2 * math.pi)
-    phi = random.uniform(0, 2 * math.pi)
+    radius = galaxy_radius * np.sqrt(rng.uniform(0, 1, count))  # appears to be more uniform on circle, less centered
+    theta = rng.uniform(0, 2 * math.pi, count)
+    phi = rng.uniform(0, 2 * math.pi, count)
 
     # cartesian integer coords
-    x = math.ceil(radius * math.cos(theta) * math.sin(phi)) + galaxy_radius
-    y = math.ceil(radius * math.sin(theta) * math.sin(phi)) + galaxy_radius
-    z = math.ceil(radius * math.cos(phi)) + galaxy_radius
+    x = np.ceil(radius * np.cos(theta) * np.sin(phi)) + galaxy_radius
+    y = np.ceil(radius * np.sin(theta) * np.sin(phi)) + galaxy_radius
+    z = np.ceil(radius * np.cos(phi)) + galaxy_radius
+
+    return np.stack([x, y, z], axis=1).astype(np.int64)
 
+def generate_star_position(galaxy_radius: int, rng: np.random.Generator):
+    x, y, z = generate_stars_positions(1, galaxy_radius, rng)[0].tolist()
     return x, y, z
 
-def generate_planet(numero):
+def generate_planets(count: int, rng: np.random.Generator):
+    """ characteristics of count random planets : integer arrays humidity, temperature """
+    # TODO : atmosphere and size are not used, they are not drawn
+    humidity = custom_asymetrical_rnd(0, 50, 100, cohesion=0.5, rng=rng, size=count)
+    temperature = custom_asymetrical_rnd(-270, 20, 1000, cohesion=3, rng=rng, size=count)
+    return humidity.astype(np.int64), temperature.astype(np.int64)
+
+def generate_planet(numero, rng: np.random.Generator):
     """ Create a random planet """
     # solid = random.choice([True, False])  # for later implementation
     solid = True
-    humidity = custom_asymetrical_rnd(0, 50, 100, cohesion=0.5)
-    temperature = custom_asymetrical_rnd(-270, 20, 1000, cohesion=3)
-    atmosphere = custom_asymetrical_rnd(0, 1, 90, cohesion=3)
-    size = random.randrange(sbc.MIN_PLANET_SIZE, sbc.MAX_PLANET_SIZE, 10)
+    humidity = custom_asymetrical_rnd(0, 50, 100, cohesion=0.5, rng=rng)
+    temperature = custom_asymetrical_rnd(-270, 20, 1000, cohesion=3, rng=rng)
+    atmosphere = custom_asymetrical_rnd(0, 1, 90, cohesion=3, rng=rng)
+    size = int(rng.choice(np.arange(sbc.MIN_PLANET_SIZE, sbc.MAX_PLANET_SIZE, 10)))
     logger.debug(f"{LOG_LEVEL(4)}planet_nb: {numero}   humidity= {humidity:>6.2f}   temperature={temperature:>7.1f}   size={size:>4}   atmosphere={atmosphere:>7.3f}")
 
     return int(humidity), int(temperature), atmosphere, size
 
-def generate_custom_planet(humidity: int, temperature: int, planet_size: int = sbc.START_PLANET_SIZE):
+def generate_custom_planet(humidity: int, temperature: int, rng: np.random.Generator, planet_size: int = sbc.START_PLANET_SIZE):
     """ Create a custom planet to fit player characteristics """
     solid = True
-    atmosphere = custom_asymetrical_rnd(0, 1, 90, cohesion=3)
+    atmosphere = custom_asymetrical_rnd(0, 1, 90, cohesion=3, rng=rng)
     size = planet_size
     logger.debug(f"{LOG_LEVEL(4)}custom planet :   humidity= {humidity:>6.2f}   temperature={temperature:>7.1f}   size={size:>4}   atmosphere={atmosphere:>7.3f}")
 
     return int(humidity), int(temperature), atmosphere, size
 
-def custom_asymetrical_rnd(left: float, mode: float, right: float, cohesion: float = 2):
+def custom_asymetrical_rnd(left: float, mode: float, right: float, cohesion: float = 2,
+                           rng: np.random.Generator = None, size: int = None):
     """
     Random pick values within boundary and beta distribution
     we choose alpha=beta in order to have same proba pick on left or on right from mode
     cohesion < 0 : more proba on extremities
     cohesion = 0 : uniform proba
     cohesion > 1 : more proba on center (mode)
+
+    size : None for one float, or the number of values picked at once (array)
     """
-    number = np.random.default_rng().beta(cohesion, cohesion)  # alpha = beta = 2 : rather centred on mode , if = 0.5, rather on extrem
-    number = (number/0.5*(mode-left) + left) if number < 0.5 else ((number-0.5)/(1-0.5)*(right-mode) + mode)
-    return number
+    if rng is None:
+        rng = np.random.default_rng()
+    number = rng.beta(cohesion, cohesion, size)  # alpha = beta = 2 : rather centred on mode , if = 0.5, rather on extrem
+    number = np.where(number < 0.5, number/0.5*(mode-left) + left, (number-0.5)/(1-0.5)*(right-mode) + mode)
+    return number if size is not None else float(number)
 
 # inused code : to be removed ?
 # def galaxy_status(player: data.Player):
@@ -218,17 +262,19 @@ def custom_asymetrical_rnd(left: float, mode: float, right: float, cohesion: flo
 #     return msg
 
 
-def make_homes(galaxy_radius, star_names):
+def make_homes(galaxy_radius, star_names, rng: np.random.Generator = None):
     """ Creating new star with new planets with custom properties adjusted to player
         Also create a first colony
      """
+    if rng is None:
+        rng = np.random.default_rng()
     logger.info(f"{LOG_LEVEL(2)}-- Making homes --")
     for player in Player.players.values():
         # generate new star
         position = None
         will_be_created = False
         while not will_be_created:
-            x, y, z = generate_star_position(galaxy_radius)
+            x, y, z = generate_star_position(galaxy_radius, rng)
             position = Position(x, y, z)
             if position in Star.stars:
                 logger.debug(f"{LOG_LEVEL(3)}There is already a star in {x} {y} {z}, reroll")
@@ -245,15 +291,15 @@ def make_homes(galaxy_radius, star_names):
 
         # create custom planets for equal start condition
         """start condition : 4 planets, 1 suitable, 1 almost suitable, 2 not suitable"""
-        home_planet_nb, second_planet = random.sample(range(1, 5), 2)
+        home_planet_nb, second_planet = (rng.choice(4, size=2, replace=False) + 1).tolist()
         planets = []
         for i in range(1, 5):
             if i == home_planet_nb:
-                humidity, temperature, atmosphere, size = generate_custom_planet(50, player.prefered_temperature, sbc.START_PLANET_SIZE)
+                humidity, temperature, atmosphere, size = generate_custom_planet(50, player.prefered_temperature, rng, sbc.START_PLANET_SIZE)
             elif i == second_planet:
-                humidity, temperature, atmosphere, size = generate_custom_planet(player.techs["bio"].level * 100/sbc.PLAYER_START_POINTS, player.prefered_temperature, int(sbc.START_PLANET_SIZE * 1.5))
+                humidity, temperature, atmosphere, size = generate_custom_planet(player.techs["bio"].level * 100/sbc.PLAYER_START_POINTS, player.prefered_temperature, rng, int(sbc.START_PLANET_SIZE * 1.5))
             else:
-                humidity, temperature, atmosphere, size = generate_planet(i)
+                humidity, temperature, atmosphere, size = generate_planet(i, rng)
 
             Planet(star=star,
                    numero=i,
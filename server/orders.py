@@ -1,14 +1,130 @@
 import re
-from typing import List
+from typing import List, NamedTuple, Tuple
+
+import server.sbc_parameters as sbc
 
 import logging
 # logging
 logger = logging.getLogger("sbc")
 
-# command regex pattern
-command_split_pattern = r"""[^ \t"'\n]+|"[^"]*"|'[^']*'"""
-# command_split_pattern = r"""[^ \t"\n]+|"[^"]*\""""
-command_split_regex = re.compile(command_split_pattern)
+# tokens of a line, in one pass : a word, a "quoted name" or 'quoted name' (# allowed inside), a comment
+# a quote without its closing quote is an error
+token_regex = re.compile(r"""(?P<word>[^\s"'#]+)|"(?P<double>[^"\n]*)"|'(?P<single>[^'\n]*)'"""
+                         r"""|(?P<comment>#)|(?P<quote>["'])""")
+
+# verbs of the headers of the sections of an orders file
+HEADERS = ("player", "production", "movements", "combat")
+
+
+class Command(NamedTuple):
+    """ a command of the orders : BUILD 10 WF is Command("build", ("10", "WF")) """
+    verb: str                   # lowercase
+    arguments: Tuple[str, ...]
+
+    def __str__(self):
+        return " ".join((self.verb.upper(),) + self.arguments)
+
+
+class OrdersSyntaxError(ValueError):
+    """ a line of orders that can't be split in tokens, column : 1 for the first character """
+    def __init__(self, message: str, column: int):
+        super().__init__(message)
+        self.column = column
+
+
+def tokenize(line: str):
+    """ tokens of a line, the comment (right of # out of the quotes) is ignored """
+    if '"' not in line and "'" not in line:
+        # most of the lines, without any name including spaces
+        return line.split("#", 1)[0].split()
+    tokens = []
+    for match in token_regex.finditer(line):
+        kind = match.lastgroup
+        if kind == "comment":
+            break
+        if kind == "quote":
+            raise OrdersSyntaxError(f"quote {match.group()} is not closed", match.start() + 1)
+        tokens.append(match.group(kind))
+    return tokens
+
+def token_columns(line: str):
+    """ column (1 for the first character) of each token of the line, for the diagnostics """
+    columns = []
+    for match in token_regex.finditer(line):
+        if match.lastgroup in ("comment", "quote"):
+            break
+        columns.append(match.start() + 1)
+    return columns
+
+# schema of the commands : known verbs of each phase, and the signatures of their arguments
+# a command is valid if its arguments match one of the signatures of its verb
+COMMANDS = {
+    "production": {
+        "build": [("qty", "unit"), ("qty", "ship", "name")],    # BUILD 10 WF, BUILD 1 BF2 Firefly
+        "research": [("qty", "tech")],                          # RESEARCH 10 bio
+        "sell": [("qty", "goods")],                             # SELL 5 food
+    },
+    "movements": {
+        "jump": [("ship", "name", "coord", "coord", "coord"),   # JUMP BF2 Firefly 10 -3 5
+                 ("ship", "name", "name", "name")],             # JUMP BF2 Firefly PL Earth
+        "name": [("coord", "coord", "coord", "name")],          # NAME 10 -3 5 Saturn
+        "explore": [("ship", "name")],                          # EXPLORE BF1 Firefly
+    },
+    "combat": {
+        "attack": [("ship", "name", "name")],                   # ATTACK BF2 Firefly Bob
+    },
+}
+
+# kinds of arguments : pattern of an argument (str) and its description for the diagnostics
+ARGUMENT_KINDS = {
+    "qty": (r"\d+", "a quantity"),
+    "coord": (r"-?\d{1,6}", "a coordinate (6 digits at most)"),     # inside the packing of Position.key()
+    "ship": (r"(?i:[bm][fsc])\d+", "a ship type and size (BF2)"),
+    "unit": (f"(?i:{sbc.WF}|{sbc.RO})", "WF or RO"),
+    "goods": (f"(?i:{sbc.FOOD}|{sbc.PARTS})", "food or parts"),
+    "tech": (r"(?i:bio|meca|gv)", "bio, meca or gv"),
+    "name": (r"[^\0]+", "a name"),
+}
+kind_regex = {kind: re.compile(pattern) for kind, (pattern, description) in ARGUMENT_KINDS.items()}
+
+# the signatures of each verb in one regex, matched once against the arguments joined by \0 (see schema_error())
+signature_regex = {phase: {verb: re.compile("|".join(r"\0".join(ARGUMENT_KINDS[kind][0] for kind in signature)
+                                                     for signature in signatures))
+                           for verb, signatures in verbs.items()}
+                   for phase, verbs in COMMANDS.items()}
+
+def check_command(phase: str, command: Command):
+    """ None if the command matches the schema of the phase (see COMMANDS), else the error """
+    error = schema_error(phase, command)
+    return None if error is None else error[1]
+
+def schema_error(phase: str, command: Command):
+    """ None if the command matches the schema of the phase, else (index of the faulty token, error) """
+    regex = signature_regex[phase].get(command.verb)
+    if regex is None:
+        return 0, f"{command.verb.upper()} : unknown command in {phase.upper()}, " \
+                  f"expected {', '.join(COMMANDS[phase]).upper()}"
+    arguments = command.arguments
+    if regex.fullmatch("\0".join(arguments)):
+        return None
+
+    # the argument in error, in the signatures with the right count of arguments
+    signatures = COMMANDS[phase][command.verb]
+    error = None
+    for signature in signatures:
+        if len(arguments) != len(signature):
+            continue
+        for index, (argument, kind) in enumerate(zip(arguments, signature), start=1):
+            if not kind_regex[kind].fullmatch(argument):
+                error = index, f"{command} : {argument} should be {ARGUMENT_KINDS[kind][1]}"
+                break
+        else:
+            return None
+
+    if error is None:
+        counts = sorted({len(signature) for signature in signatures})
+        error = 0, f"{command} : {' or '.join(map(str, counts))} arguments expected"
+    return error
 
 class Orders:
     """
@@ -17,78 +133,140 @@ class Orders:
 
     for production orders,  Commands are regrouped by planet/colonies in a dict
 
+    Orders can also be given as python structures, without any file (in-memory simulations) : see Orders.from_dict()
+
     12/02/2021 : orders are available on files, formatted under the following spec:
     - each line is a command
     - separator is " " (white space)
     - use double-quotes to get a name including spaces
-    - everything on right of # is a comment and is ignored
+    - everything on right of # is a comment and is ignored, except inside quotes
 
     data structures for orders :
     orders: Orders
         player_name: str
         prod_cmd: dict, keys are colonies's names
-            colony1_name: List of commands
-            colony2_name: List of commands
-        move_cmd: List
-        combat_cmd: List
+            colony1_name: List of Command
+            colony2_name: List of Command
+        move_cmd: List of Command
+        combat_cmd: List of Command
+        diagnostics: List of str, errors of the commands ignored (see check_command()), for the report
 
     """
-    def __init__(self, filename: str):
-        self.player_name, self.prod_cmd, self.move_cmd, self.combat_cmd = Orders.parsing_file(filename)
+    def __init__(self, filename: str = None):
+        self.diagnostics = []
+        if filename is None:
+            self.player_name, self.prod_cmd, self.move_cmd, self.combat_cmd = "", {}, [], []
+        else:
+            self.player_name, self.prod_cmd, self.move_cmd, self.combat_cmd = Orders.parsing_file(filename,
+                                                                                                 self.diagnostics)
+
+    @classmethod
+    def from_dict(cls, orders: dict):
+        """
+        Orders already split in words, same conventions as parsing_file() (see Command) :
+            {"player": "Bob",
+             "production": {"Colony1": [["BUILD", "10", "WF"], ["SELL", "5", "food"]]},
+             "movements": [["EXPLORE", "BF1", "Firefly"]],
+             "combat": []}
+        """
+        def commands(words_list):
+            return [Command(words[0].lower(), tuple(words[1:])) for words in words_list]
+
+        instance = cls()
+        instance.player_name = orders["player"].lower()
+        instance.prod_cmd = {colony_name.lower(): commands(colony_commands)
+                             for colony_name, colony_commands in orders.get("production", {}).items()}
+        instance.move_cmd = commands(orders.get("movements", []))
+        instance.combat_cmd = commands(orders.get("combat", []))
+        instance.validate()
+        return instance
+
+    def validate(self):
+        """ removes the commands not matching the schema (see check_command()), their errors go to diagnostics """
+        def valid(phase: str, commands: List[Command]):
+            kept = []
+            for command in commands:
+                error = check_command(phase, command)
+                if error is None:
+                    kept.append(command)
+                else:
+                    self.diagnostics.append(error)
+            return kept
+
+        self.prod_cmd = {colony_name: valid("production", commands) for colony_name, commands in self.prod_cmd.items()}
+        self.move_cmd = valid("movements", self.move_cmd)
+        self.combat_cmd = valid("combat", self.combat_cmd)
 
     @staticmethod
-    def parsing_file(filename: str):
-        """ parse a file of orders """
+    def parsing_file(filename: str, diagnostics: List[str] = None):
+        """
+        parse a file of orders, the commands are checked against the schema (see check_command())
+        the errors (malformed lines, invalid commands) are appended to diagnostics with their line and column,
+        the lines are ignored
+        """
         player_name = ""
         prod = {}
         move = []
         combat = []
         flag = None
+        phase = None
+        if diagnostics is None:
+            diagnostics = []
+
+        def diagnostic(line_number: int, column: int, message: str):
+            diagnostics.append(f"line {line_number}, column {column}: {message}")
 
-        with open(filename, 'r') as f:
-            for line in f:
-                result = Orders.parsing_line(line)
-                if result:
-                    if result[0].lower() == "production":
-                        # Each colony name is a key of the dict, and data is a list of action/commands
-                        colony_commands = []
-                        prod[result[2].lower()] = colony_commands
-                        flag = colony_commands
-                        result = None
-                    elif result[0].lower() == "movements":
-                        flag = move
-                        result = None
-                    elif result[0].lower() == "combat":
-                        flag = combat
-                        result = None
-                    elif result[0].lower() == "player":
-                        # Saving player's name as str, disabling Command attribution
-                        player_name = result[1].lower()
-                        flag = None
-                        result = None
-
-                    if result:
-                        flag.append(result)
+        with open(filename, 'r', encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    tokens = tokenize(line)
+                except OrdersSyntaxError as error:
+                    diagnostic(line_number, error.column, str(error))
+                    continue
+                if not tokens:
+                    continue
+
+                verb = tokens[0].lower()
+                if verb not in HEADERS:
+                    if flag is None:
+                        diagnostic(line_number, token_columns(line)[0],
+                                   f"{tokens[0]} is outside of a PRODUCTION, MOVEMENTS or COMBAT section")
+                        continue
+                    command = Command(verb, tuple(tokens[1:]))
+                    error = schema_error(phase, command)
+                    if error is None:
+                        flag.append(command)
+                    else:
+                        index, message = error
+                        diagnostic(line_number, token_columns(line)[index], message)
+
+                elif verb == "production":
+                    if len(tokens) < 3:
+                        diagnostic(line_number, token_columns(line)[0],
+                                   "PRODUCTION needs a colony : PRODUCTION PL Earth")
+                        flag, phase = None, None
+                        continue
+                    # Each colony name is a key of the dict, and data is a list of action/commands
+                    colony_commands = []
+                    prod[tokens[2].lower()] = colony_commands
+                    flag, phase = colony_commands, "production"
+                elif verb == "movements":
+                    flag, phase = move, "movements"
+                elif verb == "combat":
+                    flag, phase = combat, "combat"
+                else:
+                    # Saving player's name as str, disabling Command attribution
+                    if len(tokens) < 2:
+                        diagnostic(line_number, token_columns(line)[0], "PLAYER needs a name")
+                    else:
+                        player_name = tokens[1].lower()
+                    flag, phase = None, None
         return player_name, prod, move, combat
 
     @staticmethod
     def parsing_line(line: str):
         """
-        Steps :
-        1- reject comment : split according to # and conserve the left part
-        2- lowercase the line
-        3- regex split according to whitespace but conserve between quotes "..." or '...'
+        tokens of a line, see tokenize() :
+        split according to whitespace but conserve between quotes "..." or '...', ignore the comment (# ...)
         """
-        line = line.split("#")[0]
-        # line = line.lower()
-        matches = command_split_regex.finditer(line)
-        result = []
-        for m in matches:
-            result.append(m.group().strip("\"'"))
-        return result
-
-
-
-
-
-
+        return tokenize(line)
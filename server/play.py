@@ -1,15 +1,18 @@
 import logging
-import os
 from typing import List
 from time import time
 from dataclasses import dataclass
 
 from server.orders import Orders
+from server.commands import CompiledOrders, compile_orders
+from server.ingestion import archive_orders, ingest_orders, orders_files
 from server.production import production_phase
+from server.economy import colonies_incomes
 from server.movements import movement_phase
+from server.combat import combat_phase
 from server.report import Report
-from server.report import distribute_reports
-from server.data import Player, GameData, Ship, Colony, Star
+from server.report import distribute_reports, generate_reports
+from server.data import Player, GameData, Ship, Colony, Star, Position, memory_metrics, journal, World
 # from server.sbc_parameters import *
 import server.sbc_parameters as sbc
 from server.sbc_parameters import LOG_LEVEL
@@ -24,11 +27,13 @@ logger = logging.getLogger("sbc")
 @dataclass
 class TurnData:
     player: Player
-    orders: Orders
+    orders: CompiledOrders
     report: Report
 
 
-def play_one_turn(game_name: str, tmp_folder: str):
+def play_one_turn(game_name: str, tmp_folder: str, report_workers: int = 1, compact_reports: bool = False,
+                  report_channel: str = "file-json", orders: List[Orders] = None, persist: bool = True,
+                  world: World = None):
     """
     Turn steps :
     1- retrieve orders (files) from players
@@ -39,26 +44,57 @@ def play_one_turn(game_name: str, tmp_folder: str):
     4- send reports
         then rm the reports OR archive them
 
+    report_workers : number of processes generating the reports (forked after the combat phase),
+                     and of threads writing them
+    compact_reports : JSON reports without indentation
+    report_channel : see report.distribute_reports()
+    orders : orders of the players as objects (Orders.from_dict()), the orders files are then ignored
+    persist : False to keep the world only in memory (no turn journal, no checkpoint)
+    world : the world of the game (see data.World), default is the current world
+        the phases (production_phase(), movement_phase(), Report, ...) work in this world
+
+    In-memory simulation (no file at all) :
+        reports = play_one_turn(game_name, tmp_folder, report_channel="dict", orders=orders, persist=False)
+
+    returns the reports as dicts for the "dict" channel, None otherwise
     """
+    if world is not None:
+        with world.bound():
+            return play_one_turn(game_name, tmp_folder, report_workers=report_workers, compact_reports=compact_reports,
+                                 report_channel=report_channel, orders=orders, persist=persist)
+
     logger.info(f"{LOG_LEVEL(1)}-- Game engine running for a new turn --")
+    # loading the world if it doesn't hold the game yet (cron-driven 'game.py play')
+    if not Player.players:
+        start = time()
+        GameData().load_game(tmp_folder, game_name)
+        stop = time()
+        logger.debug(f"{LOG_LEVEL(2)}# Timing # Game data loading in {(stop - start) * 1000:.1f} ms")
+
     # new turn
     GameData().turn += 1
+    if persist:
+        journal.start(GameData().turn)
     turn_data = []  # key is a player, data is TurnData
 
-    # retrieving orders
     start = time()
-    for dirpath, dirnames, orders_files in os.walk(tmp_folder + "/orders"):
-        break
-    logger.debug(f"{LOG_LEVEL(2)}{len(orders_files)} orders files found")
-
-    # parsing orders
-    new_turns = []
-    for file in orders_files:
-        orders = Orders(dirpath + "/" + file)
-        player = Player(orders.player_name)
-        turn_data.append(TurnData(player, orders, Report(player)))
-        # archive orders files
-        os.rename(f"{dirpath}/{file}", f"{dirpath}/archive/{file}")
+    files = []      # orders files of the turn, archived once the turn is saved
+    if orders is None:
+        # retrieving, parsing & checking orders
+        files = orders_files(tmp_folder + "/orders")
+        orders = ingest_orders(tmp_folder + "/orders", sbc.ORDERS_WORKERS, files)
+
+    for player_orders in orders:
+        player = Player.get(player_orders.player_name)
+        if player is None:
+            logger.error(f"orders of an unknown player ignored : {player_orders.player_name}")
+            continue
+        report = Report(player)
+        # verbs, quantities, colonies and ships resolved once, for all the phases
+        compiled = compile_orders(player, player_orders)
+        for diagnostic in player_orders.diagnostics + compiled.diagnostics:
+            report.record_orders(diagnostic)
+        turn_data.append(TurnData(player, compiled, report))
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # orders retrieving and parsing in {(stop - start) * 1000:.1f} ms")
 
@@ -66,8 +102,10 @@ def play_one_turn(game_name: str, tmp_folder: str):
     # production phase - all players one after the other
     logger.debug(f"{LOG_LEVEL(2)}Production phase")
     start = time()
+    # ressources gathering of all the colonies in one vectorized pass, players only spend their own ressources
+    incomes = colonies_incomes([colony for donnees in turn_data for colony in donnees.player.colonies])
     for donnees in turn_data:
-        production_phase(donnees.player, donnees.orders, donnees.report)
+        production_phase(donnees.player, donnees.orders, donnees.report, incomes)
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # Production phase in {(stop - start) * 1000:.1f} ms")
 
@@ -82,15 +120,14 @@ def play_one_turn(game_name: str, tmp_folder: str):
     # update fogwar vision
     start = time()
     Star.update_visited(GameData().turn)
-    GameData().update_colonies_memory()
+    GameData().update_intel()
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # Update visited in {(stop - start) * 1000:.1f} ms")
 
     # Combat phase - everyone together
-    # TODO : implement combat system
     logger.debug(f"{LOG_LEVEL(2)}Combat phase")
     start = time()
-
+    combat_phase([(donnees.player, donnees.orders, donnees.report) for donnees in turn_data], sbc.COMBAT_WORKERS)
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # Combat phase in {(stop - start) * 1000:.1f} ms")
 
@@ -98,8 +135,8 @@ def play_one_turn(game_name: str, tmp_folder: str):
     logger.debug(f"{LOG_LEVEL(2)}Reports generation")
     start = time()
     reports = {}
+    generate_reports([donnees.report for donnees in turn_data], report_workers)
     for donnees in turn_data:
-        donnees.report.generate_status_report()
         reports[donnees.player] = donnees.report
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # Reports creation in {(stop - start) * 1000:.1f} ms")
@@ -108,12 +145,26 @@ def play_one_turn(game_name: str, tmp_folder: str):
     logger.debug(f"{LOG_LEVEL(2)}Report distribution")
     start = time()
     # distribute_reports(reports, tmp_folder, channel="file-yaml")  # DEBUG
-    distribute_reports(reports, tmp_folder, channel="file-json")  # DEBUG
+    distributed = distribute_reports(reports, tmp_folder, channel=report_channel, compact=compact_reports,
+                                     workers=report_workers)
     stop = time()
     logger.debug(f"{LOG_LEVEL(2)}# Timing # Reports distribution in {(stop - start) * 1000:.1f} ms")
 
+    # save the world : turn journal, and periodic checkpoint
+    if persist:
+        start = time()
+        GameData().save_game(tmp_folder, game_name)
+        stop = time()
+        logger.debug(f"{LOG_LEVEL(2)}# Timing # Game data saving in {(stop - start) * 1000:.1f} ms")
+    archive_orders(tmp_folder + "/orders", files)
 
+    # forget the positions left empty (failed jumps, ships moved away), and measure the world
+    start = time()
+    collected = Position.collect_garbage()
+    GameData().metrics = memory_metrics()
+    stop = time()
+    logger.debug(f"{LOG_LEVEL(2)}# Memory # {collected} empty positions removed, "
+                 + ", ".join(f"{name}={value}" for name, value in GameData().metrics.items()))
+    logger.debug(f"{LOG_LEVEL(2)}# Timing # Memory cleaning in {(stop - start) * 1000:.1f} ms")
 
-
-
-
+    return distributed
@@ -28,23 +28,21 @@ Test results with numba :
 # from numba import jit, njit
 # import numpy as np
 import math
-# from typing import List
 from typing import List
 
-from server.data import Planet, Player, Colony, Ship
+from server.data import GameData, Planet, Player, Colony, Ship, journal
 # from server.sbc_parameters import *
 import server.sbc_parameters as sbc
-from server.orders import Orders
+from server.commands import CompiledCommand, CompiledOrders, PhaseContext, Verb
 # from server.report import Report
 from server.research import upgrade_tech
+from server.economy import colonies_incomes, optimal_income
 
 import logging
 
 # logging
 logger = logging.getLogger("sbc")
 
-# TODO : do caching on value computing ?
-
 def food_planet_factor(planet: Planet, player: Player):
     """ Compute the factor of BIOLOGICAL productivity relative to planet environment and player attributes """
     temperature_factor = gauss_factor(planet.temperature, player.prefered_temperature, sbc.BASE_STD_TEMP + player.techs["bio"].level)
@@ -77,68 +75,49 @@ def parts_production(colony: Colony):
     spare_parts_balance = spare_parts_created - spare_parts_maintenance
     return spare_parts_balance
 
-# TODO : supprimer des doublons de code
 def find_max_food_production(planet: Planet, player: Player):
     """
     Compute the maximum hypothetique food production for a planet for a player
-    ATTENTION, copy of algorithm of food production (code duplication)
 
-    Strategy : perform a loop with incrementing WF, store the max net income
+    Strategy : closed form of the optimum of the food income curve, see economy.optimal_income()
+    returns max_income, max_wf
     """
     food_factor = food_planet_factor(planet, player)
+    max_income, max_wf = optimal_income(food_factor * sbc.BASE_PRODUCTIVITY, sbc.BASE_MAINTENANCE_WF * (1 - food_factor))
+    return float(max_income), int(max_wf)
 
-    # start condition
-    wf = 10
-    net_income = 0
-    max_income = 0
-
-    while net_income >= max_income:
-        max_income = net_income
-        wf += 10
-        food_created = food_factor * wf * (sbc.BASE_MAINTENANCE_WF + sbc.BASE_PRODUCTIVITY * math.exp(-wf/sbc.POP_THRESHOLD))
-        food_maintenance = sbc.BASE_MAINTENANCE_WF * wf
-        net_income = food_created - food_maintenance
-
-    max_wf = wf - 10
-
-    return max_income, max_wf
-
-# TODO : supprimer des doublons de code
 def find_max_parts_production(planet: Planet, player: Player):
     """
     Compute the maximum hypothetique parts production for a planet for a player
-    ATTENTION, copy of algorithm of parts production (code duplication)
 
-    Strategy : perform a loop with incrementing RO, store the max net income
+    Strategy : closed form of the optimum of the parts income curve, see economy.optimal_income()
+    returns max_income, max_ro
     """
     parts_factor = parts_planet_factor(planet, player)
+    max_income, max_ro = optimal_income(sbc.BASE_PRODUCTIVITY, sbc.BASE_MAINTENANCE_RO * (1 - parts_factor))
+    return float(max_income), int(max_ro)
 
-    # start condition
-    ro = 10
-    net_income = 0
-    max_income = 0
 
-    while net_income >= max_income:
-        max_income = net_income
-        ro += 10
-        spare_parts_created = sbc.BASE_PRODUCTIVITY * ro * math.exp(-ro / sbc.POP_THRESHOLD)
-        spare_parts_maintenance = sbc.BASE_MAINTENANCE_RO * ro * (1 - parts_factor)
-        net_income = spare_parts_created - spare_parts_maintenance
-
-    max_ro = ro - 10
-
-    return max_income, max_ro
-
-
-def production_phase(player: Player, orders: Orders, report):
+def production_phase(player: Player, orders: CompiledOrders, report, incomes: dict = None):
     """
     handle production phase for a player
     1- ressources gathering (including maintenance costs)
     2- maintenance cost
     3- ordres execution, in the order given by the player (for colony, and for orders within each colony)
+       through PRODUCTION_HANDLERS
+
+    orders : see commands.compile_orders()
+    incomes : {colony: (food_income, parts_income)} computed for all the colonies of the turn
+    by economy.colonies_incomes(), computed here for the player's colonies if not given
     """
     logger.debug(f"{sbc.LOG_LEVEL(3)}Player {player.name}")
 
+    if incomes is None:
+        incomes = colonies_incomes(player.colonies)
+
+    # random stream of this player for this turn : doesn't depend on the other players
+    rng = GameData().rng.stream("production", GameData().turn, player.name)
+
     # 1 - ressources gathering
     for colony in player.colonies:
         logger.debug(f"{sbc.LOG_LEVEL(4)}Colony {colony.name}")
@@ -146,10 +125,9 @@ def production_phase(player: Player, orders: Orders, report):
         report.initialize_prod_report(colony.name)
 
         # Ressources gathering (maintenance cost already counted)
-        food_prod = food_production(colony)
+        food_prod, parts_prod = incomes[colony]
         colony.food += food_prod
         report.record_prod(f"food net income = {food_prod:.1f}", 5)
-        parts_prod = parts_production(colony)
         colony.parts += parts_prod
         report.record_prod(f"parts net income = {parts_prod:.1f}", 5)
 
@@ -157,20 +135,20 @@ def production_phase(player: Player, orders: Orders, report):
         # TODO : intégrer les coûts de maintenance des vaisseaux et autres
 
     # 3 - orders executions
-    for colony_name, ordres in orders.prod_cmd.items():
-        current_colony = Colony(colony_name)
-        # orders execution for this colony
-        for cmd, *cmd_arguments in ordres:
-            logger.debug(f"{sbc.LOG_LEVEL(5)}cmd: {cmd}")
-
-            cmd = cmd.lower()
-            match cmd:
-                case "build":
-                    build(cmd_arguments, current_colony, player, report)
-                case "research":
-                    research(cmd_arguments, current_colony, player, report)
-                case "sell":
-                    sell(cmd_arguments, current_colony, player, report)
+    context = PhaseContext(player, report, rng)
+    colony = None
+    for command in orders.production:
+        logger.debug(f"{sbc.LOG_LEVEL(5)}cmd: {command.source}")
+        if command.colony is not colony:
+            # messages of the commands go to the report of their colony
+            colony = command.colony
+            report.select_prod_report(colony.name)
+        PRODUCTION_HANDLERS[command.verb](command, context)
+
+    # 4 - recording the new state of the economy in the turn journal
+    for colony in player.colonies:
+        colony.record()
+    journal.record("player", player.name, player.EU)
 
 # TODO : est-il pertinent de rendre cette fonction uniquement calculatoire et déporter ailleurs la dépense ?
 def check_if_ressources_are_available( qty: int, price: int, currency_type: str, current_colony: Colony, player: Player, report):
@@ -226,15 +204,15 @@ def check_if_ressources_are_available( qty: int, price: int, currency_type: str,
 
     return int(qty_available)
 
-def build(cmd_arguments: List[str], current_colony: Colony, player: Player, report):
+def build(command: CompiledCommand, context: PhaseContext):
     """
-    cmd_arguments is a list that excludes the command "BUILD"
-    BUILD 10 WF --> ["10", "WF"]
+    BUILD 10 WF --> command.qty = 10, command.what = "wf"
     BUILD 50 RO
     BUILD 1 CH2 FireFly
     """
-    qty_requested = int(cmd_arguments[0])
-    what = cmd_arguments[1].lower()
+    current_colony, player, report = command.colony, context.player, context.report
+    qty_requested = command.qty
+    what = command.what
 
     # Train new WF
     if what == sbc.WF:
@@ -250,15 +228,9 @@ def build(cmd_arguments: List[str], current_colony: Colony, player: Player, repo
         current_colony.RO += qty_available
         report.record_prod(f"{qty_available} RO trained (cost={cost})", 5)
 
-    # Build new Ship
-    elif any(ship_type in what for ship_type in
-             [sbc.BIO_FIGHTER, sbc.BIO_SCOUT, sbc.BIO_CARGO, sbc.MECA_FIGHTER, sbc.MECA_SCOUT, sbc.MECA_CARGO]):
-        ship_type, ship_size, ship_name = Ship.parse_ship(cmd_arguments[1:])
-        create_ships(ship_type, ship_size, ship_name, current_colony, player, report)
-
+    # Build new Ship, type checked by orders.check_command()
     else:
-        # object unknown
-        raise Exception(f"build : unknown object {what}")
+        create_ships(what, command.size, command.name, current_colony, player, report)
 
 def create_ships(ship_type: str, size: int, name: str, current_colony: Colony, player: Player, report):
     """ Generic method to create a ship """
@@ -288,7 +260,7 @@ def create_ships(ship_type: str, size: int, name: str, current_colony: Colony, p
 
     if qty_available > 0:
         # We have money, we can build
-        if (name, player) in Ship.ships:
+        if Ship.get(name, player) is not None:
             # it already exists !
             # TODO : re-credit money
             report.record_prod(f"Error : ship name {name} is probably a duplicate", 5)
@@ -307,29 +279,37 @@ def create_ships(ship_type: str, size: int, name: str, current_colony: Colony, p
         # Not enough money
         report.record_prod(f"Not enough money to build {ship_type}{size}", 5)
 
-def research(cmd_arguments: List[str], current_colony: Colony, player: Player, report):
-    qty = int(cmd_arguments[0])
-    tech_str = cmd_arguments[1].lower()
+def research(command: CompiledCommand, context: PhaseContext):
+    """
+    RESEARCH 10 bio
+    """
+    player, report = context.player, context.report
+    qty = command.qty
+    tech_str = command.what
 
-    available = check_if_ressources_are_available(qty, sbc.COST_RESEARCH, sbc.EU, current_colony, player, report)
+    available = check_if_ressources_are_available(qty, sbc.COST_RESEARCH, sbc.EU, command.colony, player, report)
 
-    level, gain = upgrade_tech(player, tech_str, available)
+    level, gain = upgrade_tech(player, tech_str, available, context.rng)
     report.record_prod(
         f"Research investissement of {available} : Tech {tech_str} level is now {level} (+{gain})", 5)
 
-def sell(cmd_arguments: List[str], current_colony: Colony, player: Player, report):
+def sell(command: CompiledCommand, context: PhaseContext):
     """
     SELL 10 food
     """
-    qty = int(cmd_arguments[0])
-    what = cmd_arguments[1]
+    player, report = context.player, context.report
+    qty = command.qty
+    what = command.what
 
-    available = check_if_ressources_are_available(qty, sbc.SELL_TO_GET_EU, what, current_colony, player, report)
+    available = check_if_ressources_are_available(qty, sbc.SELL_TO_GET_EU, what, command.colony, player, report)
 
     player.EU += available
     report.record_prod(f"Selling {qty} {what.upper()} for {qty} EU", 5)
 
 
-
-
-
+# execution of the production commands
+PRODUCTION_HANDLERS = {
+    Verb.BUILD: build,
+    Verb.RESEARCH: research,
+    Verb.SELL: sell,
+}
@@ -1,19 +1,33 @@
-from server.data import Player, Colony, Planet, GameData, Ship, Star
+from server.data import Player, Colony, Planet, GameData, Ship, Star, visibility, journal
 import server.data as data
 from server.production import food_planet_factor, parts_planet_factor
 import server.production as prod
+from server.economy import colonies_incomes, planets_suitability
 # from server.sbc_parameters import *
 import server.sbc_parameters as sbc
 from server.sbc_parameters import LOG_LEVEL
+from server.report_format import encode_binary_report
 
 import yaml
-# from yaml import CDumper  # necessite ymal-cpp ?
 import json
 import logging
-import numpy as np
-from scipy.spatial.distance import cdist
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from time import time
 
+# optional fast paths
+try:
+    import orjson       # fast JSON encoder, used for compact reports
+except ImportError:
+    orjson = None
+try:
+    from yaml import CSafeDumper as YamlDumper  # libyaml binding
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
 # logging
 logger = logging.getLogger("sbc")
 
@@ -26,31 +40,99 @@ def generate_initial_reports():
     players = Player.players.values()
     reports = {}
     for player in players:
-        report = Report(player)
-        report.generate_status_report()
-        reports[player] = report
+        reports[player] = Report(player)
+    generate_reports(list(reports.values()))
     return reports
 
-def distribute_reports(reports: dict, tmp_folder: str, channel: str = "file-json"):
+def generate_reports(reports: List["Report"], workers: int = 1):
+    """
+    Generate the status reports of the players
+
+    Each status report is a read-only work over the world, so with workers > 1 they are generated
+    in a pool of forked processes that share the world copy-on-write.
+    The fork start method is required (the workers read the world of the parent), and forking is only safe
+    when no other thread is alive : a lock held by a thread would stay locked forever in the child.
+    The thread pools of the turn (ingestion, combat) are shut down before, otherwise (games played in
+    threads, see data.World) the reports are generated serially.
+    Then the updates of the world (stars seen by each player, from the visibility diffs) are merged
+    in the order of the reports, so the result is the same whatever the number of workers.
+    """
+    if workers > 1 and len(reports) > 1 and can_fork():
+        player_names = [report.player.name for report in reports]
+        chunksize = max(1, len(player_names) // (workers * 4))
+        visibility.ensure_built()   # once, before the fork
+        with multiprocessing.get_context("fork").Pool(min(workers, len(reports))) as pool:
+            results = pool.map(status_report_worker, player_names, chunksize=chunksize)
+        for report, status in zip(reports, results):
+            report.load_status(status)
+    else:
+        for report in reports:
+            report.generate_status_report()
+
+    # merge step
+    for report in reports:
+        report.update_seen_stars()
+
+def can_fork():
+    """ a pool of forked processes can be used : fork start method available, and no other thread alive """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return False
+    if threading.active_count() > 1:
+        logger.debug(f"{LOG_LEVEL(2)}{threading.active_count()} threads alive : reports generated without fork")
+        return False
+    return True
+
+def status_report_worker(player_name: str):
+    """ generates the status report of a player within a worker process, returns it as picklable data """
+    report = Report(Player(player_name))
+    report.generate_status_report()
+    return report.to_dict()
+
+def distribute_reports(reports: dict, tmp_folder: str, channel: str = "file-json", compact: bool = False, workers: int = 1):
     """ distribute the report, needs a channel :
         - file-json
         - file-yaml
+        - file-binary : typed columnar arrays, see server/report_format.py
         - dict {"Bob" : report_as_dict, "Joe": report_as_dict} (python object for high speed simulation like genetic algo)
         - TODO : email
         - TODO : file-human-readable
+
+    compact : JSON without indentation (orjson is used if available)
+    workers : number of threads encoding and writing the report files
+    Files are written atomically (temporary file then renamed), a reader never gets a half-written report
     """
     if channel == "file-json":
-        for player, report in reports.items():
-            report.to_json_file(tmp_folder)
+        write_reports(lambda report: report.to_json_file(tmp_folder, compact), reports.values(), workers)
     elif channel == "file-yaml":
-        for player, report in reports.items():
-            report.to_yaml_file(tmp_folder)
+        write_reports(lambda report: report.to_yaml_file(tmp_folder), reports.values(), workers)
+    elif channel == "file-binary":
+        write_reports(lambda report: report.to_binary_file(tmp_folder), reports.values(), workers)
     elif channel == "dict":
         reports_dict = {}
         for player, report in reports.items():
             reports_dict[player.name] = report.to_dict()
         return reports_dict
 
+def write_reports(write, reports, workers: int = 1):
+    """ calls write(report) for each report, within a pool of threads if workers > 1 """
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # consuming results to raise errors of the threads
+            list(executor.map(write, reports))
+    else:
+        for report in reports:
+            write(report)
+
+def write_atomic(filename: str, content: bytes):
+    """ writes a file through a temporary file renamed at the end """
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
+
+def star_coords(star: Star):
+    return star.position.x, star.position.y, star.position.z
+
 class Report:
     def __init__(self, player: Player):
         self.player = player
@@ -59,6 +141,8 @@ class Report:
         self.prod_status = {}
         self.current_prod = None
         self.mov_status = []
+        self.combat_status = []
+        self.orders_status = []     # errors of the orders, the commands concerned are ignored
 
         # initialisation for pycharm check
         self.turn = None
@@ -69,18 +153,39 @@ class Report:
         self.other_players = None
 
     def generate_status_report(self):
+        """ read-only on the world, see update_seen_stars() for the updates """
         self.turn = GameData().turn
 
         self.player_status = self.evaluate_player_status()
         self.colonies_status = self.evaluate_colonies_status()
         self.galaxis_status = self.evaluate_galaxy_status()
         self.ships_status = self.evaluate_ship_status()
-        # self.other_players =        # TODO : changer la façon de présenter les choses dans le rapport !
+        self.other_players = self.evaluate_others_players_status()
+
+    def load_status(self, status: dict):
+        """ status report generated elsewhere (see to_dict()) """
+        self.turn = status["turn"]
+        self.player_status = status["player_status"]
+        self.colonies_status = status["colonies_status"]
+        self.galaxis_status = status["galaxy_status"]
+        self.ships_status = status["ships_status"]
+        self.other_players = status["other_players"]
+
+    def update_seen_stars(self):
+        """ the stars that became visible since the last report are now seen by the player """
+        diff = visibility.pop_diff(self.player)
+        for star in sorted(diff.appeared, key=star_coords):
+            if visibility.mark_seen(self.player, star):
+                journal.record("seen", star.position.x, star.position.y, star.position.z, self.player.name)
 
     def initialize_prod_report(self, colony_name: str):
         self.current_prod = []
         self.prod_status[colony_name] = self.current_prod
 
+    def select_prod_report(self, colony_name: str):
+        """ the next messages of production go to the report of this colony """
+        self.current_prod = self.prod_status[colony_name]
+
     def record_prod(self, msg: str, log_level: int = 0):
         self.current_prod.append(msg)
         logger.debug(f"{LOG_LEVEL(log_level)}{msg}")
@@ -89,13 +194,24 @@ class Report:
         self.mov_status.append(msg)
         logger.debug(f"{LOG_LEVEL(log_level)}{msg}")
 
+    def record_combat(self, msg: str, log_level: int = 0):
+        self.combat_status.append(msg)
+        logger.debug(f"{LOG_LEVEL(log_level)}{msg}")
+
+    def record_orders(self, msg: str, log_level: int = 0):
+        self.orders_status.append(msg)
+        logger.debug(f"{LOG_LEVEL(log_level)}{msg}")
+
     def to_dict(self):
         dictionary = {
             "turn": self.turn,
             "player_status": self.player_status,
             "colonies_status": self.colonies_status,
             "galaxy_status": self.galaxis_status,
-            "ships_status": self.ships_status
+            "ships_status": self.ships_status,
+            "other_players": self.other_players,
+            "orders_status": self.orders_status,
+            "combat_status": self.combat_status,
         }
         return dictionary
 
@@ -104,9 +220,10 @@ class Report:
         keys = set()
 
         # adding ships from position where I am
-        positions = self.positions_where_i_am()
+        # in a stable order (positions and ships are sets) : the order of the report doesn't change from a run to another
+        positions = sorted(self.positions_where_i_am(), key=lambda position: (position.x, position.y, position.z))
         for position in positions:
-            for ship in position.ships:
+            for ship in sorted(position.ships, key=lambda ship: (ship.player.name, ship.name)):
                 index = (ship.name.lower(), ship.player)
                 if index not in keys:
                     status.append(ship.to_dict())
@@ -128,10 +245,10 @@ class Report:
         status = []
 
         # my colonies
+        incomes = colonies_incomes(self.player.colonies)
         for colony in self.player.colonies:
             colony_status = colony.to_dict()
-            colony_status["food_production"] = prod.food_production(colony)     # TODO : cache this information to avoid computing ?
-            colony_status["parts_production"] = prod.parts_production(colony)
+            colony_status["food_production"], colony_status["parts_production"] = incomes[colony]
             colony_status["planet"] = colony.planet.localisation_to_dict()
             # colony_status["planet"]["food_factor"] = food_planet_factor(colony.planet, self.player)
             # colony_status["planet"]["meca_factor"] = parts_planet_factor(colony.planet, self.player)
@@ -148,13 +265,11 @@ class Report:
         """
         status = []
 
-        # update seen status
+        # visible stars are seen, the stars themselves are updated later by update_seen_stars()
         visible_stars = self.find_visible_stars()
-        for star in visible_stars:
-            star.seen_by.add(self.player)
 
-        # update report with all seen stars
-        seen_stars = [star for star in Star.stars.values() if self.player in star.seen_by]
+        # update report with all seen stars, in a stable order
+        seen_stars = sorted(visibility.seen_stars(self.player) | visible_stars, key=star_coords)
         for star in seen_stars:
             # export seen star
             star_dict = star.to_dict()
@@ -163,75 +278,66 @@ class Report:
             star_dict["planets"] = []
             if self.player in star.visited_by:
                 for planet in star.planets.values():
-                    planet_dict = planet.to_dict()
-                    planet_dict["food_factor"] = food_planet_factor(planet, self.player)
-                    planet_dict["meca_factor"] = parts_planet_factor(planet, self.player)
-                    planet_dict["max_food_prod"], planet_dict["max_wf"] = prod.find_max_food_production(planet, self.player)
-                    planet_dict["max_parts_prod"], planet_dict["max_ro"] = prod.find_max_parts_production(planet, self.player)
-                    star_dict["planets"].append(planet_dict)
+                    star_dict["planets"].append(planet.to_dict())
 
             status.append(star_dict)
 
+        # production capacities of all visible planets (cached, misses computed in one vectorized pass)
+        planets = [planet for star in seen_stars if self.player in star.visited_by for planet in star.planets.values()]
+        planets_dicts = [planet_dict for star_dict in status for planet_dict in star_dict["planets"]]
+        for planet_dict, suitability in zip(planets_dicts, planets_suitability(planets, self.player)):
+            planet_dict.update(suitability.to_dict())
+
         return status
 
     def evaluate_others_players_status(self):
-        # On va puiser dans la mémoire morte
-        # for player in GameData().colonies_memory[]:
-        pass
-            # TODO : à implementer : ce qu'on voit des autres, se servir de la Memory :)
-
-    def positions_where_i_am(self):  # TODO : supprimer doublon avec data.positions_where_I_am()
-        pos_where_i_am = set()
-        # positions of my colonies
-        colonies_positions = [colony.planet.star.position for colony in self.player.colonies]
-
-        # positions of my ships
-        ships_positions = [ship.position for ship in self.player.ships]
-
-        # combnination of ships and colonies positions
-        for position in colonies_positions:
-            pos_where_i_am.add(position)
-        for position in ships_positions:
-            pos_where_i_am.add(position)
-
-        return pos_where_i_am
+        """ what the player remembers of the colonies and ships of the others (see data.Intel), with the turn they were seen """
+        status = []
+        intel = GameData().intel.get(self.player)
+        if intel is None:
+            return status
+
+        for owner in sorted(intel.owners, key=lambda player: player.name):
+            colonies, ships = intel.known(owner)
+            colonies.sort(key=lambda memory: (star_coords(memory.planet.star), memory.planet.numero))
+            ships.sort(key=lambda memory: memory.name)
+            status.append({
+                "name": owner.name,
+                "colonies": [{"planet": memory.planet.localisation_to_dict(), "WF": memory.WF, "RO": memory.RO,
+                              "turn": memory.turn} for memory in colonies],
+                "ships": [{"type": memory.ship_type, "name": memory.name, "size": memory.size,
+                           "position": memory.position.to_dict(), "turn": memory.turn} for memory in ships],
+            })
 
-    def coords_where_i_am(self):
-        pos_where_i_am = self.positions_where_i_am()
-        coords_where_i_am = [(position.x, position.y, position.z) for position in pos_where_i_am]
+        return status
 
-        return coords_where_i_am
+    def positions_where_i_am(self):
+        return data.positions_where_i_am(self.player)
 
     def find_visible_stars(self):
         """
-        Get visible stars (war fog) from position where I am (colonies, ships)
+        Get visible stars (war fog) from position where I am (colonies, ships), kept up to date by the visibility engine
         """
-        coords_where_i_am = self.coords_where_i_am()
-
-        # get star within the visibility range
-        all_stars_dict = Star.stars
-        all_stars_coords = [[star.position.x, star.position.y, star.position.z] for star in all_stars_dict.values()]
-
-        # calculate distances           TODO : is it usefull to cache something here ?
-        array_me = np.array([[x, y, z] for x, y, z in coords_where_i_am])
-        array_stars = np.array(all_stars_coords)
-        distances = cdist(array_me, array_stars, "euclidean")
+        return set(visibility.visible_stars(self.player))
 
-        # evaluate visbility matrix
-        visible_matrix = np.where(distances < sbc.VISIBILITY_RANGE)[1]  # problem, gives us 2D array becasue input is 2D --> [1] necessary
+    def to_yaml(self):
+        """ YAML encoded report, with libyaml if available """
+        return yaml.dump(self.to_dict(), Dumper=YamlDumper, allow_unicode=True, encoding="utf-8")
 
-        # retrieve list of visible position
-        visible_stars = set()
-        for i in visible_matrix:
-            visible_stars.add(list(all_stars_dict.values())[i])
-
-        return visible_stars
+    def to_json(self, compact: bool = False):
+        """ JSON encoded report, compact is without indentation """
+        if compact and orjson:
+            return orjson.dumps(self.to_dict())
+        elif compact:
+            return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        else:
+            return json.dumps(self.to_dict(), ensure_ascii=False, indent=4).encode("utf-8")
 
     def to_yaml_file(self, tmp_folder: str):
-        with open(f"{tmp_folder}/report.{self.player.name}.T{self.turn}.YML", "w", encoding="utf-8") as f:
-            yaml.dump(self.to_dict(), f)  # version with python parser of yaml lib --> slow
-            # CDumper(self.to_dict(), f)  # ne marche pas, fichier vide, manque un paquet ?
+        write_atomic(f"{tmp_folder}/report.{self.player.name}.T{self.turn}.YML", self.to_yaml())
+
+    def to_json_file(self, tmp_folder: str, compact: bool = False):
+        write_atomic(f"{tmp_folder}/report.{self.player.name}.T{self.turn}.JSON", self.to_json(compact))
 
-    def to_json_file(self, tmp_folder: str):
-        with open(f"{tmp_folder}/report.{self.player.name}.T{self.turn}.JSON", "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+    def to_binary_file(self, tmp_folder: str):
+        write_atomic(f"{tmp_folder}/report.{self.player.name}.T{self.turn}.NPZ", encode_binary_report(self.to_dict()))
@@ -0,0 +1,225 @@
+"""
+Binary report format : the report as typed columnar arrays (numpy .npz archive, uncompressed)
+
+JSON reports repeat keys ("star", "position", "x", ...) for every planet,
+here each table (stars, planets, colonies, ships) is a set of arrays, planets reference their star by index.
+
+Schema is versioned by REPORT_SCHEMA_VERSION, stored in each report as "schema_version".
+Readers accept older versions listed in SUPPORTED_SCHEMA_VERSIONS.
+
+Schema version 1 :
+    turn, schema_version
+    player_EU, tech_bio, tech_meca, tech_gv
+    star_name ("" if not named), star_xyz (n, 3)
+    planet_star (index in star arrays), planet_numero, planet_temperature, planet_humidity,
+        planet_food_factor, planet_meca_factor, planet_max_food_prod, planet_max_wf, planet_max_parts_prod, planet_max_ro
+    colony_name, colony_star_name, colony_star_xyz (n, 3), colony_numero,
+        colony_WF, colony_RO, colony_food, colony_parts, colony_food_production, colony_parts_production
+    ship_owner, ship_name, ship_type, ship_size, ship_xyz (n, 3)
+
+Schema version 2 : version 1 and what the player knows of the other players ("other_players")
+    other_player_name
+    intel_colony_owner (index in other_player_name), intel_colony_star_name, intel_colony_star_xyz (n, 3),
+        intel_colony_numero, intel_colony_WF, intel_colony_RO, intel_colony_turn
+    intel_ship_owner (index in other_player_name), intel_ship_name, intel_ship_type, intel_ship_size,
+        intel_ship_xyz (n, 3), intel_ship_turn
+
+Schema version 3 : version 2 and the messages of the turn
+    orders_status : errors of the orders of the player
+    combat_status : combats of the player
+"""
+import io
+import numpy as np
+
+REPORT_SCHEMA_VERSION = 3
+SUPPORTED_SCHEMA_VERSIONS = (1, 2, 3)
+
+PLANET_CAPACITIES = ["food_factor", "meca_factor", "max_food_prod", "max_wf", "max_parts_prod", "max_ro"]
+
+
+def xyz(position: dict):
+    return position["x"], position["y"], position["z"]
+
+
+def report_to_columns(report: dict):
+    """ converts a report (as given by Report.to_dict()) to typed columnar arrays """
+    stars = report["galaxy_status"]
+    planets = [(i, planet) for i, star in enumerate(stars) for planet in star["planets"]]
+    colonies = report["colonies_status"]
+    ships = report["ships_status"]
+    technologies = report["player_status"]["technologies"]
+    others = report.get("other_players", [])
+    intel_colonies = [(i, colony) for i, other in enumerate(others) for colony in other["colonies"]]
+    intel_ships = [(i, ship) for i, other in enumerate(others) for ship in other["ships"]]
+
+    columns = {
+        "schema_version": np.array(REPORT_SCHEMA_VERSION),
+        "turn": np.array(report["turn"]),
+
+        "player_EU": np.array(report["player_status"]["EU"], dtype=np.int64),
+        "tech_bio": np.array(technologies["bio"], dtype=np.int32),
+        "tech_meca": np.array(technologies["meca"], dtype=np.int32),
+        "tech_gv": np.array(technologies["gv"], dtype=np.int32),
+
+        "star_name": np.array([star["name"] or "" for star in stars], dtype=str),
+        "star_xyz": np.array([xyz(star["position"]) for star in stars], dtype=np.int32).reshape(-1, 3),
+
+        "planet_star": np.array([i for i, planet in planets], dtype=np.int32),
+        "planet_numero": np.array([planet["numero"] for i, planet in planets], dtype=np.int8),
+        "planet_temperature": np.array([planet["temperature"] for i, planet in planets], dtype=np.int32),
+        "planet_humidity": np.array([planet["humidity"] for i, planet in planets], dtype=np.int32),
+
+        "colony_name": np.array([colony["name"] for colony in colonies], dtype=str),
+        "colony_star_name": np.array([colony["planet"]["star"]["name"] or "" for colony in colonies], dtype=str),
+        "colony_star_xyz": np.array([xyz(colony["planet"]["star"]["position"]) for colony in colonies],
+                                    dtype=np.int32).reshape(-1, 3),
+        "colony_numero": np.array([colony["planet"]["numero"] for colony in colonies], dtype=np.int8),
+        "colony_WF": np.array([colony["WF"] for colony in colonies], dtype=np.int64),
+        "colony_RO": np.array([colony["RO"] for colony in colonies], dtype=np.int64),
+        "colony_food": np.array([colony["food"] for colony in colonies], dtype=np.float64),
+        "colony_parts": np.array([colony["parts"] for colony in colonies], dtype=np.float64),
+        "colony_food_production": np.array([colony["food_production"] for colony in colonies], dtype=np.float64),
+        "colony_parts_production": np.array([colony["parts_production"] for colony in colonies], dtype=np.float64),
+
+        "ship_owner": np.array([ship["owner_name"] for ship in ships], dtype=str),
+        "ship_name": np.array([ship["name"] for ship in ships], dtype=str),
+        "ship_type": np.array([ship["type"] for ship in ships], dtype=str),
+        "ship_size": np.array([ship["size"] for ship in ships], dtype=np.int32),
+        "ship_xyz": np.array([xyz(ship["position"]) for ship in ships], dtype=np.int32).reshape(-1, 3),
+
+        "other_player_name": np.array([other["name"] for other in others], dtype=str),
+        "intel_colony_owner": np.array([i for i, colony in intel_colonies], dtype=np.int32),
+        "intel_colony_star_name": np.array([colony["planet"]["star"]["name"] or "" for i, colony in intel_colonies],
+                                           dtype=str),
+        "intel_colony_star_xyz": np.array([xyz(colony["planet"]["star"]["position"]) for i, colony in intel_colonies],
+                                          dtype=np.int32).reshape(-1, 3),
+        "intel_colony_numero": np.array([colony["planet"]["numero"] for i, colony in intel_colonies], dtype=np.int8),
+        "intel_colony_WF": np.array([colony["WF"] for i, colony in intel_colonies], dtype=np.int64),
+        "intel_colony_RO": np.array([colony["RO"] for i, colony in intel_colonies], dtype=np.int64),
+        "intel_colony_turn": np.array([colony["turn"] for i, colony in intel_colonies], dtype=np.int32),
+        "intel_ship_owner": np.array([i for i, ship in intel_ships], dtype=np.int32),
+        "intel_ship_name": np.array([ship["name"] for i, ship in intel_ships], dtype=str),
+        "intel_ship_type": np.array([ship["type"] for i, ship in intel_ships], dtype=str),
+        "intel_ship_size": np.array([ship["size"] for i, ship in intel_ships], dtype=np.int32),
+        "intel_ship_xyz": np.array([xyz(ship["position"]) for i, ship in intel_ships], dtype=np.int32).reshape(-1, 3),
+        "intel_ship_turn": np.array([ship["turn"] for i, ship in intel_ships], dtype=np.int32),
+
+        "orders_status": np.array(report.get("orders_status", []), dtype=str),
+        "combat_status": np.array(report.get("combat_status", []), dtype=str),
+    }
+    for key in PLANET_CAPACITIES:
+        dtype = np.int64 if key in ("max_wf", "max_ro") else np.float64
+        columns[f"planet_{key}"] = np.array([planet[key] for i, planet in planets], dtype=dtype)
+
+    return columns
+
+
+def encode_binary_report(report: dict):
+    """ binary report as bytes """
+    buffer = io.BytesIO()
+    np.savez(buffer, **report_to_columns(report))
+    return buffer.getvalue()
+
+
+def read_binary_report(filename: str):
+    """
+    reads a binary report, returns its columns : {name: numpy array}
+    raises ValueError if the schema version is not supported
+    """
+    with open(filename, "rb") as f:
+        archive = np.load(f, allow_pickle=False)
+        columns = {key: archive[key] for key in archive.files}
+
+    version = int(columns["schema_version"])
+    if version not in SUPPORTED_SCHEMA_VERSIONS:
+        raise ValueError(f"report {filename} has schema version {version}, supported: {SUPPORTED_SCHEMA_VERSIONS}")
+
+    return columns
+
+
+def is_columnar(report: dict):
+    """ True for columns given by read_binary_report(), False for a report as a dict (JSON) """
+    return "schema_version" in report
+
+
+def columns_to_report(columns: dict):
+    """ rebuilds the report as a dict, like Report.to_dict() or a JSON report """
+    stars = []
+    for name, (x, y, z) in zip(columns["star_name"].tolist(), columns["star_xyz"].tolist()):
+        stars.append({"name": name or None, "position": {"x": x, "y": y, "z": z}, "planets": []})
+
+    capacities = [columns[f"planet_{key}"].tolist() for key in PLANET_CAPACITIES]
+    for star_id, numero, temperature, humidity, *values in zip(columns["planet_star"].tolist(),
+                                                               columns["planet_numero"].tolist(),
+                                                               columns["planet_temperature"].tolist(),
+                                                               columns["planet_humidity"].tolist(),
+                                                               *capacities):
+        star = stars[star_id]
+        planet = {
+            "star": {"name": star["name"], "position": star["position"]},
+            "numero": numero,
+            "temperature": temperature,
+            "humidity": humidity,
+        }
+        planet.update(zip(PLANET_CAPACITIES, values))
+        star["planets"].append(planet)
+
+    colonies = []
+    for name, star_name, (x, y, z), numero, wf, ro, food, parts, food_prod, parts_prod in zip(
+            columns["colony_name"].tolist(), columns["colony_star_name"].tolist(),
+            columns["colony_star_xyz"].tolist(), columns["colony_numero"].tolist(),
+            columns["colony_WF"].tolist(), columns["colony_RO"].tolist(),
+            columns["colony_food"].tolist(), columns["colony_parts"].tolist(),
+            columns["colony_food_production"].tolist(), columns["colony_parts_production"].tolist()):
+        colonies.append({
+            "name": name,
+            "WF": wf,
+            "RO": ro,
+            "food": food,
+            "parts": parts,
+            "food_production": food_prod,
+            "parts_production": parts_prod,
+            "planet": {"star": {"name": star_name or None, "position": {"x": x, "y": y, "z": z}}, "numero": numero},
+        })
+
+    ships = []
+    for owner, name, ship_type, size, (x, y, z) in zip(columns["ship_owner"].tolist(), columns["ship_name"].tolist(),
+                                                        columns["ship_type"].tolist(), columns["ship_size"].tolist(),
+                                                        columns["ship_xyz"].tolist()):
+        ships.append({"owner_name": owner, "type": ship_type, "name": name, "size": size,
+                      "position": {"x": x, "y": y, "z": z}})
+
+    # what the player knows of the others (schema version 2)
+    others = []
+    if "other_player_name" in columns:
+        others = [{"name": name, "colonies": [], "ships": []} for name in columns["other_player_name"].tolist()]
+        for owner, star_name, (x, y, z), numero, wf, ro, turn in zip(
+                columns["intel_colony_owner"].tolist(), columns["intel_colony_star_name"].tolist(),
+                columns["intel_colony_star_xyz"].tolist(), columns["intel_colony_numero"].tolist(),
+                columns["intel_colony_WF"].tolist(), columns["intel_colony_RO"].tolist(),
+                columns["intel_colony_turn"].tolist()):
+            others[owner]["colonies"].append({
+                "planet": {"star": {"name": star_name or None, "position": {"x": x, "y": y, "z": z}}, "numero": numero},
+                "WF": wf, "RO": ro, "turn": turn})
+        for owner, name, ship_type, size, (x, y, z), turn in zip(
+                columns["intel_ship_owner"].tolist(), columns["intel_ship_name"].tolist(),
+                columns["intel_ship_type"].tolist(), columns["intel_ship_size"].tolist(),
+                columns["intel_ship_xyz"].tolist(), columns["intel_ship_turn"].tolist()):
+            others[owner]["ships"].append({"type": ship_type, "name": name, "size": size,
+                                           "position": {"x": x, "y": y, "z": z}, "turn": turn})
+
+    return {
+        "turn": int(columns["turn"]),
+        "player_status": {
+            "EU": int(columns["player_EU"]),
+            "technologies": {"bio": int(columns["tech_bio"]),
+                             "meca": int(columns["tech_meca"]),
+                             "gv": int(columns["tech_gv"])}
+        },
+        "colonies_status": colonies,
+        "galaxy_status": stars,
+        "ships_status": ships,
+        "other_players": others,
+        "orders_status": columns["orders_status"].tolist() if "orders_status" in columns else [],
+        "combat_status": columns["combat_status"].tolist() if "combat_status" in columns else [],
+    }
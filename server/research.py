@@ -1,4 +1,4 @@
-from server.data import Player, Technologies
+from server.data import GameData, Player, Technologies, journal
 
 import random
 
@@ -8,7 +8,7 @@ import logging
 logger = logging.getLogger("sbc")
 
 
-def upgrade_tech(player: Player, tech_str: str, qty: int):
+def upgrade_tech(player: Player, tech_str: str, qty: int, rng: random.Random = None):
     """
     The cost for upgrading 1 level of a tech, is the current_level² in EU
     real qty invested in research is qty multiplied by a random factor (25% of invested amount)
@@ -16,12 +16,16 @@ def upgrade_tech(player: Player, tech_str: str, qty: int):
     When the progression bar reach the cost for upgrading, the level is gained
     surplus is versed to progression bar for next level
 
+    rng : random stream of the player for this turn (see server/rng.py), a stream of this tech if not given
+
     returns new_level, level_gain
     """
+    if rng is None:
+        rng = GameData().rng.stream("research", GameData().turn, player.name, tech_str)
     tech = player.techs[tech_str]
     initial_level = tech.level
 
-    random_factor = random.uniform(0.75, 1.25)
+    random_factor = rng.uniform(0.75, 1.25)
     real_investment = int(qty * random_factor)
 
     tech.progression += real_investment
@@ -32,4 +36,10 @@ def upgrade_tech(player: Player, tech_str: str, qty: int):
         tech.progression -= tech.level ** 2
         tech.level += 1
 
+    journal.record("tech", player.name, tech_str, tech.level, tech.progression)
+
+    # planets suitability depends on BIO and MECA levels
+    if tech_str in ("bio", "meca") and tech.level != initial_level:
+        player.suitability.clear()
+
     return tech.level, tech.level - initial_level
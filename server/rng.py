@@ -0,0 +1,39 @@
+"""
+Random numbers of the game engine
+
+Every random draw of a game comes from a stream derived from the game seed, a subsystem name,
+the turn and some keys (player name, ...) : a stream doesn't depend on the use of the other streams.
+So a turn can be replayed bit for bit, and players can be played in any order (or in parallel)
+with the same results.
+
+The game seed is saved in the snapshots (see GameData.dump_gamedata()).
+"""
+import hashlib
+import random
+import numpy as np
+
+
+class RandomService:
+    """
+    Random streams of a game, derived from the game seed :
+        rng = GameData().rng
+        rng.stream("production", turn, player.name)      # random.Random
+        rng.generator("galaxy", turn)                     # numpy Generator, for batch draws
+    """
+    def __init__(self, seed: int = None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = int(seed)
+
+    def derive(self, subsystem: str, turn: int, *keys):
+        """ 64 bits seed of a stream, stable across processes and python versions (no hash()) """
+        text = "\x1f".join(str(key) for key in (self.seed, subsystem, turn, *keys))
+        return int.from_bytes(hashlib.blake2b(text.encode("utf8"), digest_size=8).digest(), "little")
+
+    def stream(self, subsystem: str, turn: int, *keys):
+        """ a new random.Random for this subsystem, turn and keys """
+        return random.Random(self.derive(subsystem, turn, *keys))
+
+    def generator(self, subsystem: str, turn: int, *keys):
+        """ a new numpy Generator for this subsystem, turn and keys """
+        return np.random.default_rng(self.derive(subsystem, turn, *keys))
@@ -62,9 +62,23 @@ MECA_FIGHTER = "mf"
 MECA_SCOUT = "ms"
 MECA_CARGO = "mc"
 JUMP_SAFE_DISTANCE = 5                   # base distance where jump should be fine
+JUMP_TABLE_SIZE = 2 ** 16                # max squared distance + 1 of the jump chances tables : 512 KB by GV level
+
+# Combat
+FIGHTER_SHOTS_PER_LEVEL = 2         # shots fired by a fighter during a combat, for each level of its size
+HIT_CHANCE = 0.5                    # chance for a shot to hit an enemy ship
+HULL_PER_LEVEL = 3                  # hits to destroy one level of a ship, a ship without level is destroyed
+COMBAT_WORKERS = 4                  # threads resolving the engagements (they are independent)
+
+# Orders
+ORDERS_WORKERS = 8                  # threads reading and parsing the orders files, see server/ingestion.py
 
 # Gravitics specs
 VISIBILITY_RANGE = 5                # by default, each player only sees star within the visibility range from its positions (colonies, ships)
+INTEL_SHIP_TURNS = 20               # a ship of another player not seen for this number of turns is forgotten
+
+# Game saving
+CHECKPOINT_INTERVAL = 10            # a full snapshot of the world every N turns, the turn journal in between
 
 
 def LOG_LEVEL(level: int):
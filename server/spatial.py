@@ -0,0 +1,126 @@
+"""
+Spatial index for objects located on integer sectors (stars, ...)
+
+The galaxy is cut in cubic cells of `cell_size` parsecs, each cell stores the objects it contains.
+A radius query only visits the cells overlapping the bounding box of the sphere,
+so its cost depends on the local density, not on the size of the galaxy.
+
+DistanceMatrix : distances between a fixed set of objects (the stars), by rows, for vectorized searches
+"""
+import math
+from collections import OrderedDict
+import numpy as np
+
+
+class SpatialGrid:
+    """
+    Uniform grid keyed on integer sector coordinates
+
+    Usage :
+        grid = SpatialGrid(cell_size=5)
+        grid.add(x, y, z, star)
+        grid.query(x, y, z, radius=5)   # --> [star, ...] with distance < radius
+        grid.squared_extent()           # --> squared diagonal of the box holding the items
+    """
+    def __init__(self, cell_size: int):
+        assert cell_size > 0
+        self.cell_size = cell_size
+        self.cells = {}     # key = (i, j, k) cell coords, value = list of (x, y, z, item)
+        self.count = 0
+        self.bounds = None  # (min x, min y, min z, max x, max y, max z) of the items added, not shrunk by remove()
+
+    def cell_of(self, x: int, y: int, z: int):
+        size = self.cell_size
+        return x // size, y // size, z // size
+
+    def add(self, x: int, y: int, z: int, item):
+        cell = self.cell_of(x, y, z)
+        self.cells.setdefault(cell, []).append((x, y, z, item))
+        self.count += 1
+        if self.bounds is None:
+            self.bounds = (x, y, z, x, y, z)
+        else:
+            min_x, min_y, min_z, max_x, max_y, max_z = self.bounds
+            self.bounds = (min(min_x, x), min(min_y, y), min(min_z, z), max(max_x, x), max(max_y, y), max(max_z, z))
+
+    def remove(self, x: int, y: int, z: int, item):
+        cell = self.cell_of(x, y, z)
+        entries = self.cells[cell]
+        entries.remove((x, y, z, item))
+        if not entries:
+            del self.cells[cell]
+        self.count -= 1
+
+    def clear(self):
+        self.cells = {}
+        self.count = 0
+        self.bounds = None
+
+    def squared_extent(self):
+        """ squared diagonal of the bounding box of the items : no 2 items are farther from each other """
+        if self.bounds is None:
+            return 0
+        min_x, min_y, min_z, max_x, max_y, max_z = self.bounds
+        return (max_x - min_x) ** 2 + (max_y - min_y) ** 2 + (max_z - min_z) ** 2
+
+    def query(self, x: int, y: int, z: int, radius: float):
+        """ returns the items whose distance to (x, y, z) is strictly lower than radius """
+        found = []
+        radius_2 = radius * radius
+        min_i, min_j, min_k = self.cell_of(math.floor(x - radius), math.floor(y - radius), math.floor(z - radius))
+        max_i, max_j, max_k = self.cell_of(math.ceil(x + radius), math.ceil(y + radius), math.ceil(z + radius))
+        cells = self.cells
+
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for k in range(min_k, max_k + 1):
+                    entries = cells.get((i, j, k))
+                    if not entries:
+                        continue
+                    for ex, ey, ez, item in entries:
+                        if (ex - x) ** 2 + (ey - y) ** 2 + (ez - z) ** 2 < radius_2:
+                            found.append(item)
+        return found
+
+    def __len__(self):
+        return self.count
+
+
+class DistanceMatrix:
+    """
+    Distances (float32) between items located on integer sectors, index i is items[i]
+
+    A row is computed at its first use and kept, up to max_rows rows (the least recently used one is forgotten first) :
+    only the rows of the stars where ships are are needed, a dense n x n matrix doesn't fit big galaxies.
+
+    Usage :
+        matrix = DistanceMatrix(items, coords)      # coords : array of shape (n, 3)
+        matrix.index[item]                          # --> i
+        matrix.row(i)                               # --> distances from items[i] to all the items
+    """
+    def __init__(self, items: list, coords: np.ndarray, max_rows: int = 1024):
+        self.items = list(items)
+        self.index = {item: i for i, item in enumerate(self.items)}
+        self.coords = np.asarray(coords, dtype=np.int64).reshape(len(self.items), 3)
+        self.max_rows = max_rows
+        self.rows = OrderedDict()   # key = i, value = row, the least recently used first
+
+    def row(self, i: int):
+        row = self.rows.get(i)
+        if row is not None:
+            self.rows.move_to_end(i)
+        else:
+            # squared distances are integers (int64 : no overflow), exact, the rounding happens with the square root
+            delta = self.coords - self.coords[i]
+            row = np.sqrt((delta * delta).sum(axis=1), dtype=np.float32)
+            if len(self.rows) >= self.max_rows:
+                self.rows.popitem(last=False)
+            self.rows[i] = row
+        return row
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + sum(row.nbytes for row in self.rows.values())
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import server.sbc_parameters as sbc
+from server.combat import Engagement, combat_phase
+from server.data import GameData, Player, Ship, Position
+from server.commands import CompiledOrders, compile_orders
+from server.orders import Orders
+from server.report import Report
+
+@pytest.fixture
+def battle():
+    GameData.reset()
+    players = [Player(name=name, email=f"{name}@example.com", prefered_temperature=0, create=True)
+               for name in ["GLaDOS", "HAL9000", "Wheatley"]]
+    position = Position(1, 2, 3)
+    for player in players:
+        Ship(name="Firefly", player=player, size=3, ship_type="bf", position=position, create=True)
+        Ship(name="Scout", player=player, size=1, ship_type="bs", position=position, create=True)
+    yield players, position
+    GameData.reset()
+
+def orders(player, *commands):
+    return compile_orders(player, Orders.from_dict({"player": player.name,
+                                                    "combat": [command.split() for command in commands]}))
+
+def test_engagement_targets(battle):
+    (glados, hal, wheatley), position = battle
+    engagement = Engagement(position)
+    engagement.add_attack(Ship("firefly", glados), hal)
+    engagement.prepare()
+
+    # Wheatley is not at war, scouts don't fire
+    assert [(ship.player.name, ship.name) for ship in engagement.ships] == \
+        [("GLaDOS", "Firefly"), ("GLaDOS", "Scout"), ("HAL9000", "Firefly"), ("HAL9000", "Scout")]
+    assert engagement.shooter_group.tolist() == [0, -1, 1, -1]
+    assert [group.tolist() for group in engagement.groups] == [[2, 3], [0, 1]]
+
+    hits = engagement.resolve(np.random.default_rng(1))
+    assert hits[[0, 1]].sum() <= 3 * sbc.FIGHTER_SHOTS_PER_LEVEL
+    assert (hits[[0, 1]].sum(), hits[[2, 3]].sum()) != (0, 0)
+
+@pytest.fixture
+def large_battle():
+    GameData.reset()
+    position = Position(0, 0, 0)
+    players = [Player(name=f"P{i}", email="", prefered_temperature=0, create=True) for i in range(2)]
+    for i in range(5000):
+        for player in players:
+            Ship(name=f"F{i}", player=player, size=10, ship_type="mf", position=position, create=True)
+    yield players, position
+    GameData.reset()
+
+def test_large_battle_is_vectorized(large_battle):
+    players, position = large_battle
+    engagement = Engagement(position)
+    engagement.add_attack(Ship("f0", players[0]), players[1])
+    engagement.prepare()
+    hits = engagement.resolve(np.random.default_rng(2))
+    # about HIT_CHANCE of the shots of each side
+    expected = 5000 * 10 * sbc.FIGHTER_SHOTS_PER_LEVEL * sbc.HIT_CHANCE
+    assert hits[:5000].sum() == pytest.approx(expected, rel=0.05)
+    assert hits[5000:].sum() == pytest.approx(expected, rel=0.05)
+
+def test_combat_phase(battle, monkeypatch):
+    (glados, hal, wheatley), position = battle
+    monkeypatch.setattr(sbc, "HIT_CHANCE", 1.0)     # every shot hits
+    reports = {player: Report(player) for player in battle[0]}
+    combat_phase([(glados, orders(glados, "ATTACK BF3 Firefly HAL9000", "ATTACK BS1 Scout HAL9000"), reports[glados]),
+                  (hal, orders(hal, "ATTACK BF3 Firefly Nobody"), reports[hal]),
+                  (wheatley, CompiledOrders(), reports[wheatley])], workers=2)
+
+    # 6 hits on each side (2 ships) : one ship at least of each side has lost a level, both fighters have fired
+    assert sum(ship.size for ship in glados.ships) < 4
+    assert sum(ship.size for ship in hal.ships) < 4
+    assert [ship.size for ship in wheatley.ships] == [3, 1]
+    assert "Scout is not a fighter, it can't attack" in reports[glados].combat_status
+    assert "Firefly can't attack Nobody" in reports[hal].combat_status
+    assert reports[hal].combat_status[1] == "Combat in 1 2 3 against GLaDOS"
+    assert not reports[wheatley].combat_status
+    # the players read the results of the combat in their reports
+    assert reports[hal].to_dict()["combat_status"] == reports[hal].combat_status
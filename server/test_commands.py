@@ -0,0 +1,58 @@
+import random
+
+from server.commands import Verb, compile_orders
+from server.data import Colony, Planet, Player, Position, Ship, Star, Technologies, World
+from server.orders import Orders
+from server.production import production_phase
+from server.report import Report
+
+def colonies_world(seed: int = 3, count: int = 40):
+    """ world of a player with many colonies, some of them short of food or parts, and the orders of the turn """
+    rnd = random.Random(seed)
+    player = Player(name="GLaDOS", email="glados@example.com", prefered_temperature=30, create=True)
+    player.techs = {tech: Technologies(level=5, progression=0) for tech in ("bio", "meca", "gv")}
+    production = {}
+    for i in range(count):
+        star = Star(Position(i, 0, 0), create=True)
+        star.name = f"Star{i}"
+        planet = Planet(star=star, numero=1, temperature=30, humidity=75, create=True)
+        colony = Colony(planet=planet, player=player, WF=rnd.randint(0, 500), RO=rnd.randint(0, 500), create=True)
+        colony.food, colony.parts = rnd.randint(0, 300), rnd.randint(0, 300)
+        production[colony.name] = [["SELL", str(rnd.randint(0, 200)), "food"],
+                                   ["BUILD", str(rnd.randint(0, 50)), "WF"],
+                                   ["BUILD", str(rnd.randint(0, 50)), "RO"],
+                                   ["SELL", str(rnd.randint(0, 200)), "parts"]]
+        if i == 20:
+            production[colony.name].insert(2, ["RESEARCH", "10", "bio"])
+    orders = Orders.from_dict({"player": "GLaDOS", "production": production})
+    return player, orders
+
+def test_compile_orders():
+    with World().bound():
+        player, orders = colonies_world(count=2)
+        Ship(name="Firefly", player=player, size=2, ship_type="bf", position=Position(0, 0, 0), create=True)
+        orders.prod_cmd["unknown-1"] = orders.prod_cmd["star0-1"]
+        orders.move_cmd = Orders.from_dict({"player": "GLaDOS", "movements": [
+            ["JUMP", "BF2", "Firefly", "1", "-2", "3"], ["JUMP", "BF1", "Scout", "PL", "Earth"]]}).move_cmd
+        compiled = compile_orders(player, orders)
+
+        assert [command.verb for command in compiled.production[:4]] == [Verb.SELL, Verb.BUILD, Verb.BUILD, Verb.SELL]
+        assert compiled.production[0].colony is Colony.get("Star0-1") and compiled.production[0].what == "food"
+        assert len(compiled.production) == 8
+        assert compiled.diagnostics == ["Error : colony unknown-1 doesn't exist for player GLaDOS"]
+        jump, scout = compiled.movements
+        assert jump.ship is Ship.get("Firefly", player) and jump.position == Position(1, -2, 3)
+        # a ship built later in the turn is found at execution by its name
+        assert scout.ship is None and scout.target == "Earth"
+        Ship(name="Scout", player=player, size=1, ship_type="bf", position=Position(0, 0, 0), create=True)
+        assert scout.ship_of(player) is Ship.get("Scout", player)
+
+def test_production_dispatch():
+    with World().bound():
+        player, orders = colonies_world(count=3)
+        report = Report(player)
+        production_phase(player, compile_orders(player, orders), report)
+        # each command reports to its colony
+        for colony_name, commands in orders.prod_cmd.items():
+            qty = commands[0].arguments[0]
+            assert f"Selling {qty} FOOD for {qty} EU" in report.prod_status[Colony.get(colony_name).name]
@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import yaml
+
+from server import newgame, play_one_turn
+from server.daemon import GameServer, HostedGame, WarmWorlds
+from server.data import GameData, Player, World, find_checkpoints
+from server.test_data import world_state
+
+def new_game(name: str, folder: str, seed: int):
+    with open("config.EXAMPLE.yml", "r") as f:
+        config = yaml.safe_load(f)
+    newgame(name, folder, config, seed=seed, world=World())
+    return HostedGame(name=name, folder=folder, interval=10)
+
+def simulate(seed: int, turns: int):
+    """ in-memory game in its own world """
+    world = World()
+    with open("config.EXAMPLE.yml", "r") as f:
+        config = yaml.safe_load(f)
+    newgame("sim", "", config, report_channel="dict", persist=False, seed=seed, world=world)
+    for _ in range(turns):
+        play_one_turn("sim", "", report_channel="dict", orders=[], persist=False, world=world)
+    with world.bound():
+        return world_state()
+
+def test_worlds_are_isolated():
+    alpha, beta = World(), World()
+    with alpha.bound():
+        Player(name="GLaDOS", email="", prefered_temperature=0, create=True)
+        GameData().turn = 3
+        with beta.bound():
+            assert not Player.players and GameData().turn == 0
+            Player(name="HAL9000", email="", prefered_temperature=0, create=True)
+        assert list(Player.players) == ["glados"]
+    assert not Player.players
+    with beta.bound():
+        assert list(Player.players) == ["hal9000"]
+
+def test_worlds_in_threads():
+    expected = [simulate(seed, turns=2) for seed in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(simulate, range(4), [2] * 4)) == expected
+    assert expected[0] != expected[1]
+    assert not Player.players
+
+def test_warm_worlds_eviction(tmp_path):
+    games = [new_game(name, str(tmp_path / name), seed=i) for i, name in enumerate(["alpha", "beta"])]
+
+    worlds = WarmWorlds(capacity=1)
+    assert worlds.play(games[0]) == 1
+    assert worlds.play(games[1]) == 1
+    # alpha has been evicted to a checkpoint, then loaded from it
+    assert list(worlds.worlds) == ["beta"]
+    assert find_checkpoints(games[0].folder, "alpha") == [0, 1]
+    assert worlds.play(games[0]) == 2
+    assert worlds.play(games[0]) == 3
+    assert list(worlds.worlds) == ["alpha"]
+    worlds.evict_all()
+    assert find_checkpoints(games[0].folder, "alpha")[-1] == 3
+    assert not Player.players
+
+def test_warm_worlds_failed_turn(tmp_path, monkeypatch):
+    game = new_game("alpha", str(tmp_path / "alpha"), seed=0)
+    worlds = WarmWorlds(capacity=2)
+    assert worlds.play(game) == 1
+    orders_file = f"{game.folder}/orders/orders.GLaDOS.T2.txt"
+    with open(orders_file, "w") as f:
+        f.write("PLAYER GLaDOS\n")
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("reports lost")
+    monkeypatch.setattr("server.play.generate_reports", broken)
+    with pytest.raises(RuntimeError):
+        worlds.play(game)
+    # the half-played world is dropped, the orders wait for the next try
+    assert not worlds.worlds
+    assert os.path.exists(orders_file)
+
+    monkeypatch.undo()
+    assert worlds.play(game) == 2
+    assert os.path.exists(f"{game.folder}/orders/archive/orders.GLaDOS.T2.txt")
+    worlds.evict_all()
+
+def test_server_plays_due_games(tmp_path):
+    games = [new_game(name, str(tmp_path / name), seed=i) for i, name in enumerate(["alpha", "beta", "gamma"])]
+    for game in games:
+        game.deadline = 100
+    games[2].deadline = 1000
+
+    server = GameServer(games, workers=2, resident=2)
+    server.start()
+    try:
+        assert server.run_pending(now=200) == ["alpha", "beta"]
+        assert server.run_pending(now=200) == []    # already being played
+        results = server.collect(timeout=60)
+        assert sorted(results) == [("alpha", 1, None), ("beta", 1, None)]
+        # the turns missed since the deadline 100 are not played again
+        assert server.next_deadline() == 210
+    finally:
+        server.stop()
+    # the worlds have been saved by the workers when they stopped
+    assert os.path.exists(f"{games[0].folder}/alpha.T1.gamedata")
+
+def test_server_skips_missed_turns(tmp_path):
+    game = new_game("alpha", str(tmp_path / "alpha"), seed=0)
+    game.deadline = 100
+
+    server = GameServer([game], workers=1, resident=1)
+    server.start()
+    try:
+        # the server was down during 90 intervals : only one turn is played
+        assert server.run_pending(now=1000) == ["alpha"]
+        assert server.collect(timeout=60) == [("alpha", 1, None)]
+        assert server.run_pending(now=1001) == []
+        assert game.deadline == 1010
+    finally:
+        server.stop()
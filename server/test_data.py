@@ -0,0 +1,208 @@
+import pytest
+from server.data import GameData, Player, Star, Planet, Colony, Ship, Position, Technologies, RelationShip, Relation, journal
+from server.newgame import create_galaxy
+from server.research import upgrade_tech
+import server.sbc_parameters as sbc
+
+def world_state():
+    """ plain python view of the world, to compare 2 worlds """
+    return {
+        "turn": GameData().turn,
+        "players": [(p.name, p.email, p.prefered_temperature, p.EU, sorted((k, t.level, t.progression) for k, t in p.techs.items()))
+                    for p in Player.players.values()],
+        "stars": [(s.position.x, s.position.y, s.position.z, s.name, sorted((p.name, t) for p, t in s.visited_by.items()),
+                   sorted(p.name for p in s.seen_by)) for s in Star.stars.values()],
+        "planets": [(p.star.position.x, p.numero, p.temperature, p.humidity) for p in Planet.planets.values()],
+        "colonies": [(c.name, c.player.name, c.WF, c.RO, c.food, c.parts) for c in Colony.colonies.values()],
+        "ships": [(s.name, s.player.name, s.type, s.size, s.position.x, s.position.y, s.position.z) for s in Ship.ships.values()],
+        "relations": [(p1.name, p2.name, r) for (p1, p2), r in RelationShip.relations.items()],
+        "memory": sorted((observer.name, m.planet.name, m.player.name, m.WF, m.RO, m.turn)
+                         for observer, intel in GameData().intel.items() for m in intel.colonies.values()),
+        "ships_memory": sorted((observer.name, m.player.name, m.name, m.ship_type, m.size,
+                                m.position.x, m.position.y, m.position.z, m.turn)
+                               for observer, intel in GameData().intel.items() for m in intel.ships.values()),
+    }
+
+@pytest.fixture
+def world():
+    GameData.reset()
+    players = []
+    for name, temperature in [("GLaDOS", 450), ("HAL9000", -150)]:
+        player = Player(name=name, email=f"{name}@example.com", prefered_temperature=temperature, create=True)
+        player.techs["bio"] = Technologies(level=5, progression=3)
+        player.techs["meca"] = Technologies(level=15, progression=0)
+        player.techs["gv"] = Technologies(level=5, progression=0)
+        player.EU = 42
+        players.append(player)
+    create_galaxy(len(players))
+    planets = [next(iter(star.planets.values())) for star in Star.stars.values() if star.planets]
+    for player, planet in zip(players, planets):
+        colony = Colony(planet=planet, player=player, WF=30, RO=20, create=True)
+        colony.food = 12.5
+        planet.star.name = f"Home{player.name}"
+        planet.star.visited_by[player] = 0
+        planet.star.seen_by.add(player)
+        Ship(name="Firefly", player=player, size=2, ship_type="bf", position=Position(1, 2, 3), create=True)
+    RelationShip.set_relationship(players[0], players[1], Relation.ENEMY)
+    GameData().turn = 7
+    yield
+    GameData.reset()
+
+def test_snapshot_roundtrip(world, tmp_path):
+    filename = str(tmp_path / "game.gamedata")
+    before = world_state()
+    GameData().dump_gamedata(filename)
+    GameData.reset()
+    assert not Star.stars
+
+    GameData().load_gamedata(filename)
+    assert world_state() == before
+    colony = next(iter(Player("GLaDOS").colonies))
+    assert Colony(colony.name) is colony
+    assert Ship("firefly", Player("HAL9000")) in Position(1, 2, 3).ships
+
+def test_journal_replay(world, tmp_path):
+    folder = str(tmp_path)
+    GameData().dump_gamedata(f"{folder}/game.T7.gamedata")
+
+    # turn 8 : some changes recorded in the journal
+    GameData().turn = 8
+    journal.start(8)
+    glados, hal = Player("GLaDOS"), Player("HAL9000")
+    ship = Ship("firefly", glados)
+    ship.position = Position(4, 5, 6)
+    Ship(name="Scout", player=hal, size=1, ship_type="ms", position=Position(7, 7, 7), create=True)
+    Ship("firefly", hal).delete()
+    colony = next(iter(glados.colonies))
+    colony.WF += 10
+    colony.food = 3.25
+    colony.record()
+    glados.EU = 7
+    journal.record("player", glados.name, glados.EU)
+    upgrade_tech(hal, "gv", 100)
+    RelationShip.set_relationship(hal, glados, Relation.ALLY)
+    Star.update_visited(8)
+    GameData().update_intel()
+    expected = world_state()
+    GameData().save_game(folder, "game")
+    assert not journal.recording
+
+    GameData.reset()
+    GameData().load_game(folder, "game")
+    assert world_state() == expected
+
+    GameData().load_game(folder, "game", 7)
+    assert GameData().turn == 7
+    assert Ship.exists("firefly", Player("HAL9000"))
+
+def test_snapshot_keeps_seed(world, tmp_path):
+    filename = str(tmp_path / "game.gamedata")
+    seed = GameData().rng.seed
+    GameData().dump_gamedata(filename)
+    GameData.reset()
+    assert GameData().rng.seed != seed
+    GameData().load_gamedata(filename)
+    assert GameData().rng.seed == seed
+
+def test_positions_garbage_collection(world):
+    ship = Ship("firefly", Player("GLaDOS"))
+    old_position = ship.position
+    ship.position = Position(40, 41, 42)
+    assert ship not in old_position.ships
+    used_positions = set(Star.stars) | {ship.position for ship in Ship.ships.values()}
+
+    Position.collect_garbage()
+    # only positions with a star or a ship are kept
+    assert Position(40, 41, 42) is ship.position
+    assert set(Position.positions.values()) == used_positions
+    assert Position.key(-3, 0, 5) != Position.key(3, 0, -5)
+
+def test_position_bounds(world):
+    limit = Position.AXIS_OFFSET
+    assert Position(limit - 1, -limit, 0) is not Position(-limit, limit - 1, 0)
+    for coords in [(1, -limit - 1, 0), (0, limit, 0), (0, 0, 1 << 30)]:
+        with pytest.raises(ValueError):
+            Position(*coords)
+
+def test_lookup_indexes(world):
+    glados = Player("GLaDOS")
+    colony = next(iter(glados.colonies))
+    assert Player.get("glados") is glados and Player.get("Wheatley") is None
+    # the star has been named after the colony creation
+    assert Colony.get(f"homeglados-{colony.planet.numero}") is colony
+    assert Colony.get("nowhere-1") is None
+
+    ship = Ship.get("FIREFLY", glados)
+    assert ship is Ship("firefly", glados)
+    assert Ship.ships_at_position(Position(1, 2, 3)) == [ship, Ship("firefly", Player("HAL9000"))]
+
+    ship.delete()
+    colony.delete()
+    assert Ship.get("firefly", glados) is None and not glados.ships
+    assert Colony.get(colony.name) is None and not glados.colonies
+
+def test_intel(world, tmp_path):
+    glados, hal = Player("GLaDOS"), Player("HAL9000")
+    colony = next(iter(glados.colonies))
+    Ship("firefly", hal).position = colony.planet.star.position
+    GameData().update_intel()
+
+    colonies, ships = GameData().intel[hal].known(glados)
+    assert [(memory.planet, memory.WF, memory.turn) for memory in colonies] == [(colony.planet, 30, 7)]
+    assert ships == []      # the ship of GLaDOS is elsewhere
+    ships = GameData().intel[glados].known(hal)[1]
+    assert [(memory.name, memory.position, memory.turn) for memory in ships] == [("Firefly", colony.planet.star.position, 7)]
+
+    # the intel is saved in the snapshots
+    GameData().dump_gamedata(f"{tmp_path}/game.T7.gamedata")
+    before = world_state()
+    GameData.reset()
+    GameData().load_gamedata(f"{tmp_path}/game.T7.gamedata")
+    assert world_state() == before
+
+    # a destroyed colony is forgotten when its planet is seen again
+    glados, hal = Player("GLaDOS"), Player("HAL9000")
+    next(iter(glados.colonies)).delete()
+    GameData().update_intel()
+    assert GameData().intel[hal].known(glados)[0] == []
+
+def test_intel_forgets_ships(world):
+    glados, hal = Player("GLaDOS"), Player("HAL9000")
+    home = next(iter(glados.colonies)).planet.star.position
+    Ship(name="Scout", player=hal, size=1, ship_type="ms", position=home, create=True)
+    GameData().update_intel()
+    assert sorted(memory.name for memory in GameData().intel[glados].known(hal)[1]) == ["Firefly", "Scout"]
+
+    # the scout is seen gone, only one op in the journal whatever the intel
+    GameData().turn = 8
+    Ship("scout", hal).delete()
+    journal.start(8)
+    GameData().update_intel()
+    assert journal.ops == [("intel",)]
+    journal.stop()
+    assert [memory.name for memory in GameData().intel[glados].known(hal)[1]] == ["Firefly"]
+
+    # GLaDOS' firefly leaves : HAL sees it gone, GLaDOS forgets HAL's firefly after INTEL_SHIP_TURNS turns
+    Ship("firefly", glados).position = home
+    GameData().turn = 8 + sbc.INTEL_SHIP_TURNS
+    GameData().update_intel()
+    assert GameData().intel[hal].known(glados)[1] == []
+    assert GameData().intel[glados].known(hal)[1]
+    GameData().turn += 1
+    GameData().update_intel()
+    assert GameData().intel[glados].known(hal)[1] == []
+
+def test_intel_after_positions_garbage_collection(world):
+    glados, hal = Player("GLaDOS"), Player("HAL9000")
+    Ship(name="Scout", player=hal, size=1, ship_type="ms", position=Position(30, 30, 30), create=True)
+    Ship("firefly", glados).position = Position(30, 30, 30)
+    GameData().update_intel()
+    assert "Scout" in [memory.name for memory in GameData().intel[glados].known(hal)[1]]
+
+    # the sector is left empty, its position is collected, then seen again without the scout
+    Ship("firefly", glados).position = Position(1, 2, 3)
+    Ship("scout", hal).position = Position(1, 2, 4)
+    Position.collect_garbage()
+    Ship("firefly", glados).position = Position(30, 30, 30)
+    GameData().update_intel()
+    assert "Scout" not in [memory.name for memory in GameData().intel[glados].known(hal)[1]]
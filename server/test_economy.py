@@ -0,0 +1,102 @@
+import random
+import math
+import pytest
+
+import server.production as prod
+import server.sbc_parameters as sbc
+from server.data import Technologies
+from server.economy import EconomyBatch, colonies_incomes, optimal_income, planets_max_productions, planets_suitability
+
+class Stub:
+    """ stands for Player, Planet and Colony : only their attributes are used by the economy """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def random_colonies(count: int, seed: int = 1):
+    rnd = random.Random(seed)
+    colonies = []
+    for _ in range(count):
+        bio = rnd.randint(0, 30)
+        player = Stub(prefered_temperature=rnd.randint(-200, 500), suitability={},
+                      techs={"bio": Technologies(bio, 0), "meca": Technologies(30 - bio, 0)})
+        planet = Stub(temperature=rnd.randint(-270, 1000), humidity=rnd.randint(0, 100))
+        colonies.append(Stub(planet=planet, player=player, WF=rnd.randint(0, 8000),
+                             RO=rnd.randint(0, 8000), food=0, parts=0))
+    return colonies
+
+def test_kernel_matches_reference():
+    colonies = random_colonies(300)
+    batch = EconomyBatch(colonies)
+    food_factors, parts_factors = batch.food_factor, batch.parts_factor
+    incomes = colonies_incomes(colonies)
+
+    for i, colony in enumerate(colonies):
+        assert food_factors[i] == pytest.approx(prod.food_planet_factor(colony.planet, colony.player))
+        assert parts_factors[i] == pytest.approx(prod.parts_planet_factor(colony.planet, colony.player))
+        food, parts = incomes[colony]
+        assert food == pytest.approx(prod.food_production(colony), abs=1e-9)
+        assert parts == pytest.approx(prod.parts_production(colony), abs=1e-9)
+
+def test_empty_batch():
+    assert colonies_incomes([]) == {}
+
+def brute_force_max(income, limit: int = 20000):
+    """ first local maximum of income(x) on integers """
+    best_x, best = 0, 0
+    for x in range(1, limit):
+        value = income(x)
+        if value < best:
+            break
+        best_x, best = x, value
+    return best, best_x
+
+def test_max_productions_closed_form():
+    colonies = random_colonies(40, seed=2)
+    for colony in colonies:
+        planet, player = colony.planet, colony.player
+        food_factor = prod.food_planet_factor(planet, player)
+        parts_factor = prod.parts_planet_factor(planet, player)
+
+        def food(wf):
+            return food_factor * wf * (sbc.BASE_MAINTENANCE_WF + sbc.BASE_PRODUCTIVITY * math.exp(-wf / sbc.POP_THRESHOLD)) - sbc.BASE_MAINTENANCE_WF * wf
+
+        def parts(ro):
+            return sbc.BASE_PRODUCTIVITY * ro * math.exp(-ro / sbc.POP_THRESHOLD) - sbc.BASE_MAINTENANCE_RO * ro * (1 - parts_factor)
+
+        max_food, max_wf = prod.find_max_food_production(planet, player)
+        max_parts, max_ro = prod.find_max_parts_production(planet, player)
+        assert (max_food, max_wf) == pytest.approx(brute_force_max(food))
+        assert (max_parts, max_ro) == pytest.approx(brute_force_max(parts))
+
+def test_max_productions_high_techs():
+    # factor > 1 : the income grows without limit, the population is capped at 2 * POP_THRESHOLD
+    factor = 1.5
+    max_food, max_wf = optimal_income([factor * sbc.BASE_PRODUCTIVITY], [sbc.BASE_MAINTENANCE_WF * (1 - factor)])
+    max_parts, max_ro = optimal_income([sbc.BASE_PRODUCTIVITY], [sbc.BASE_MAINTENANCE_RO * (1 - factor)])
+    assert max_wf[0] == max_ro[0] == 2 * sbc.POP_THRESHOLD
+    x = 2 * sbc.POP_THRESHOLD
+    assert max_food[0] == pytest.approx(factor * sbc.BASE_PRODUCTIVITY * x * math.exp(-2) + sbc.BASE_MAINTENANCE_WF * (factor - 1) * x)
+    assert max_parts[0] == pytest.approx(sbc.BASE_PRODUCTIVITY * x * math.exp(-2) + sbc.BASE_MAINTENANCE_RO * (factor - 1) * x)
+
+def test_max_productions_vectorized():
+    colonies = random_colonies(50, seed=3)
+    player = colonies[0].player
+    planets = [colony.planet for colony in colonies]
+    capacities = planets_max_productions(planets, player)
+    for i, planet in enumerate(planets):
+        assert (capacities["max_food_prod"][i], capacities["max_wf"][i]) == pytest.approx(prod.find_max_food_production(planet, player))
+        assert (capacities["max_parts_prod"][i], capacities["max_ro"][i]) == pytest.approx(prod.find_max_parts_production(planet, player))
+
+def test_suitability_cache():
+    colonies = random_colonies(5, seed=4)
+    player = colonies[0].player
+    planets = [colony.planet for colony in colonies]
+    first = planets_suitability(planets, player)
+    assert len(player.suitability) == 5
+    assert planets_suitability(planets[:2], player) == first[:2]
+    assert planets_suitability(planets[:1], player)[0] is first[0]
+
+    # a new BIO level gives new values
+    player.techs["bio"].level += 1
+    player.suitability.clear()
+    assert planets_suitability(planets[:1], player)[0].food_factor == pytest.approx(prod.food_planet_factor(planets[0], player))
@@ -0,0 +1,62 @@
+import os
+
+from server.ingestion import archive_orders, ingest_orders, orders_files
+from server.orders import Orders, Command, check_command
+
+def test_check_command():
+    assert check_command("production", Command("build", ("10", "WF"))) is None
+    assert check_command("production", Command("build", ("1", "BF2", "Firefly"))) is None
+    assert check_command("movements", Command("jump", ("BF2", "Firefly", "10", "-3", "5"))) is None
+    assert check_command("movements", Command("jump", ("BF2", "Firefly", "PL", "Earth"))) is None
+    assert check_command("production", Command("jump", ("BF2", "Firefly", "PL", "Earth"))) == \
+        "JUMP : unknown command in PRODUCTION, expected BUILD, RESEARCH, SELL"
+    assert check_command("production", Command("build", ("ten", "WF"))) == "BUILD ten WF : ten should be a quantity"
+    assert check_command("production", Command("research", ("10", "magic"))) == \
+        "RESEARCH 10 magic : magic should be bio, meca or gv"
+    assert check_command("movements", Command("explore", ("BF1",))) == "EXPLORE BF1 : 2 arguments expected"
+    assert check_command("combat", Command("attack", ("Firefly", "Bob"))) == \
+        "ATTACK Firefly Bob : 3 arguments expected"
+
+def test_ingest_orders(tmp_path):
+    folder = tmp_path / "orders"
+    os.makedirs(folder / "archive")
+    (folder / "1-bob.txt").write_text('player Bob\nEXPLORE BF1 Firefly\n')
+    (folder / "2-alice.txt").write_text('player Alice\nPRODUCTION PL Earth\nBUILD 10 WF\nBUILD lots WF\n'
+                                        'MOVEMENTS\nEXPLORE BF1\nCOMBAT\nATTACK BF1 Firefly Bob\n')
+    (folder / "3-bob.txt").write_text('player Bob\nPRODUCTION\nBUILD 10 RO\nMOVEMENTS\nJUMP BF1 Firefly 1 2 3\n')
+    (folder / "4-nobody.txt").write_text('MOVEMENTS\nEXPLORE BF1 Firefly\n')
+    (folder / "5-binary.txt").write_bytes(b"\xff\xfe\x00player")
+    (folder / "orders.Carol.T1.txt").write_bytes(b"\xff\xfe\x00player")
+
+    alice, bob, carol = ingest_orders(str(folder), workers=4)
+    assert alice.player_name == "alice"
+    assert alice.prod_cmd == {"earth": [Command("build", ("10", "WF"))]}
+    assert alice.move_cmd == []
+    assert alice.combat_cmd == [Command("attack", ("BF1", "Firefly", "Bob"))]
+    assert alice.diagnostics == ["line 4, column 7: BUILD lots WF : lots should be a quantity",
+                                 "line 6, column 1: EXPLORE BF1 : 2 arguments expected"]
+
+    # the last file of Bob is kept
+    assert bob.move_cmd == [Command("jump", ("BF1", "Firefly", "1", "2", "3"))]
+    assert bob.diagnostics == ["orders of 1-bob.txt replaced by the ones of 3-bob.txt",
+                               "line 2, column 1: PRODUCTION needs a colony : PRODUCTION PL Earth",
+                               "line 3, column 1: BUILD is outside of a PRODUCTION, MOVEMENTS or COMBAT section"]
+
+    # the files wait in the folder until the turn is saved, then every one is archived, even the ignored ones
+    files = orders_files(str(folder))
+    assert len(files) == 6
+    archive_orders(str(folder), files)
+    assert sorted(os.listdir(folder)) == ["archive"]
+    assert len(os.listdir(folder / "archive")) == 6
+
+    # a player whose file is rejected is told in his report
+    assert carol.player_name == "carol" and carol.move_cmd == []
+    assert carol.diagnostics[0].startswith("orders file orders.Carol.T1.txt ignored : UnicodeDecodeError")
+
+def test_orders_from_dict_are_checked():
+    orders = Orders.from_dict({"player": "Bob", "production": {"Earth": [["SELL", "5", "gold"]]},
+                               "movements": [["NAME", "1", "2", "3", "Saturn"], ["FLY", "BF1", "Firefly"]]})
+    assert orders.prod_cmd == {"earth": []}
+    assert orders.move_cmd == [Command("name", ("1", "2", "3", "Saturn"))]
+    assert orders.diagnostics == ["SELL 5 gold : gold should be food or parts",
+                                  "FLY : unknown command in MOVEMENTS, expected JUMP, NAME, EXPLORE"]
@@ -0,0 +1,71 @@
+import math
+import random
+import pytest
+
+import server.sbc_parameters as sbc
+from server.data import GameData, Player, Star, Ship, Position
+from server.data import current_world
+from server.movements import ExplorationPlanner, jump_success_chance, jump_success_table
+
+@pytest.fixture
+def explorer():
+    GameData.reset()
+    rnd = random.Random(5)
+    player = Player(name="GLaDOS", email="glados@example.com", prefered_temperature=450, create=True)
+    while len(Star.stars) < 60:
+        position = Position(rnd.randint(0, 20), rnd.randint(0, 20), rnd.randint(0, 20))
+        if position not in Star.stars:
+            star = Star(position, create=True)
+            if rnd.random() < 0.7:
+                star.seen_by.add(player)
+            if rnd.random() < 0.3:
+                star.visited_by[player] = rnd.randint(1, 3)
+    # half of the ships on stars, the others between stars
+    stars = list(Star.stars)
+    ships = [Ship(name=f"Scout{i}", player=player, size=1, ship_type="bs",
+                  position=stars[i] if i % 2 else Position(rnd.randint(0, 20), rnd.randint(0, 20), rnd.randint(0, 20)),
+                  create=True)
+             for i in range(50)]
+    yield player, ships
+    GameData.reset()
+
+def reference_target(player, ship, targeted):
+    """ previous algorithm : full sorts for each ship """
+    seen_stars = [star for star in Star.stars.values() if player in star.seen_by]
+    stars_sorted = sorted(seen_stars, key=lambda s: ship.position.distance_to(s.position))
+    stars_sorted = sorted(stars_sorted, key=lambda star: star.visited_by.get(player, 0))
+    valid = [star for star in stars_sorted if star not in targeted]
+    return valid[0] if valid else None
+
+def test_exploration_planner(explorer):
+    player, ships = explorer
+    planner = ExplorationPlanner(player)
+    targeted = []
+    for ship in ships:
+        expected = reference_target(player, ship, targeted)
+        assert planner.target(ship) is expected
+        targeted.append(expected)
+
+    # more ships than seen stars : no star left
+    assert targeted[-1] is None
+    assert len([star for star in targeted if star]) == len(planner.stars)
+
+def test_jump_success_table(explorer, monkeypatch):
+    for gv, squared_distance in [(1, 0), (5, 27), (12, 1000), (12, 5000)]:
+        chance = jump_success_chance(gv, squared_distance)
+        expected = 100 * math.exp(-math.sqrt(squared_distance) / (sbc.JUMP_SAFE_DISTANCE + gv))
+        assert chance == pytest.approx(expected)
+    # the tables are bounded, and belong to the world
+    assert len(jump_success_table(12)) == Star.max_squared_distance() + 1 <= 3 * 20 ** 2 + 1
+    monkeypatch.setattr(sbc, "JUMP_TABLE_SIZE", 100)
+    current_world().jump_tables.clear()
+    assert len(jump_success_table(1)) == 100
+    assert jump_success_chance(1, 500) == pytest.approx(100 * math.exp(-math.sqrt(500) / (sbc.JUMP_SAFE_DISTANCE + 1)))
+
+def test_far_jump_chance(explorer):
+    # beyond the galaxy, the chance is computed : the table isn't extended
+    squared_distance = 3 * 100000 ** 2
+    chance = jump_success_chance(1, squared_distance)
+    assert chance == pytest.approx(100 * math.exp(-math.sqrt(squared_distance) / (sbc.JUMP_SAFE_DISTANCE + 1)))
+    assert len(current_world().jump_tables[1]) <= 3 * 20 ** 2 + 1
+    assert jump_success_chance(1, 3 * 20 ** 2) == jump_success_table(1)[3 * 20 ** 2]
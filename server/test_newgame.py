@@ -0,0 +1,26 @@
+import numpy as np
+
+import server.sbc_parameters as sbc
+from server.data import GameData, Star, Planet
+from server.newgame import create_galaxy
+
+def galaxy(seed: int, nb_of_player: int = 20):
+    GameData.reset()
+    create_galaxy(nb_of_player, rng=np.random.default_rng(seed))
+    stars = [(s.position.x, s.position.y, s.position.z, sorted(s.planets)) for s in Star.stars.values()]
+    planets = [(p.star.position.x, p.numero, p.temperature, p.humidity) for p in Planet.planets.values()]
+    GameData.reset()
+    return stars, planets
+
+def test_galaxy_generation():
+    stars, planets = galaxy(seed=7)
+    assert len(stars) == 20 * sbc.STAR_DENSITY_PER_PLAYER
+    assert len(set((x, y, z) for x, y, z, numeros in stars)) == len(stars)
+    for x, y, z, numeros in stars:
+        assert numeros == list(range(len(numeros)))
+        assert len(numeros) < sbc.MAX_PLANETS_PER_STARS
+    assert all(-270 <= temperature <= 1000 and 0 <= humidity <= 100 for x, numero, temperature, humidity in planets)
+
+def test_galaxy_generation_is_reproducible():
+    assert galaxy(seed=7) == galaxy(seed=7)
+    assert galaxy(seed=7) != galaxy(seed=8)
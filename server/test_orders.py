@@ -1,64 +1,66 @@
 import pytest
-from server.orders import Orders, Command
+from server.orders import Orders, Command, OrdersSyntaxError, check_command
 
 def test_parsing_line():
     msg = """  \t TRANSFER 1 CU PL "Earth d'en bas" TR 'Firefly de la mort' BAS supercool """
     result = Orders.parsing_line(msg)
-    solution = ['transfer', "1", "cu", 'pl', "earth d'en bas", "tr", "firefly de la mort", "bas", "supercool"]
+    solution = ['TRANSFER', "1", "CU", 'PL', "Earth d'en bas", "TR", "Firefly de la mort", "BAS", "supercool"]
     assert solution == result
 
+def test_parsing_line_comments():
+    assert Orders.parsing_line('NAME 1 2 3 "Alpha #1" # named by Bob') == ["NAME", "1", "2", "3", "Alpha #1"]
+    assert Orders.parsing_line("EXPLORE BF1 Firefly# go") == ["EXPLORE", "BF1", "Firefly"]
+    assert Orders.parsing_line("   # only a comment") == []
+    with pytest.raises(OrdersSyntaxError) as error:
+        Orders.parsing_line('JUMP BF1 "Firefly 1 2 3')
+    assert error.value.column == 10
 
-# Not testable because of Command objects
-# def test_parsing_file():
-#     content = '''# This is a command, works also within a line : everything on right is ignored
-# # First line = name of the Player
-# player Flibustiers
-#
-# # First part = PRODUCTION
-# PRODUCTION PL Earth
-# build 50 WF
-#
-# Production PL "Red Mars"
-# REsearch 10 bio
-#
-#
-#
-#
-# # Second part = MOVEMENTS
-# MOVEMENTS
-# jump FF firefly PL Venus
-#
+def test_coordinates_are_bounded():
+    assert check_command("movements", Command("jump", ("BF1", "Firefly", "999999", "-999999", "0"))) is None
+    assert check_command("movements", Command("jump", ("BF1", "Firefly", "1048576", "0", "0"))) == \
+        "JUMP BF1 Firefly 1048576 0 0 : 1048576 should be a coordinate (6 digits at most)"
+
+def test_parsing_file(tmp_path):
+    content = '''# This is a command, works also within a line : everything on right is ignored
+# First line = name of the Player
+player Flibustiers
+
+# First part = PRODUCTION
+PRODUCTION PL Earth
+build 50 WF
+
+Production PL "Red Mars"
+REsearch 10 bio
+BUILD 1 BF2 "Firefly #2"
+SELL ten food
+
+
+
+# Second part = MOVEMENTS
+MOVEMENTS
+jump FF firefly PL Venus
+
+Explore BF1 Firefly
+NAME 10 -2 4 "Alpha 'A'
 # Orbit DD "ISS barakuda" PL Earth
-#
-# # Last part = COMBAT
-# COMBAT
-# attack FF Firefly PL Venus
-#
-# '''
-#     filename = "temporary_file"
-#     with open(filename, "w") as f:
-#         f.write(content)
-#
-#     player_name, prod_cmd, move_cmd, combat_cmd = Orders.parsing_file(filename)
-#
-#     assert player_name == "flibustiers"
-#     assert prod_cmd == [
-#         {
-#             "type": "pl", "name": "earth", "commands": [
-#                 Command("build", ["50", "wf"]),
-#             ]
-#         },
-#         {
-#             "type": "pl", "name": "red mars", "commands": [
-#                 Command('research', ['10', 'bio']),
-#             ]
-#         }
-#     ]
-#     assert move_cmd == [
-#         Command("jump", ["ff", "firefly", "pl", "venus"]),
-#         Command("orbit", ["dd", "iss barakuda", "pl", "earth"])
-#     ]
-#     assert combat_cmd == [
-#         Command("attack", ["ff", "firefly", "pl", "venus"])
-#     ]
 
+# Last part = COMBAT
+COMBAT
+attack BF1 Firefly Bob
+'''
+    filename = tmp_path / "orders.txt"
+    filename.write_text(content)
+
+    diagnostics = []
+    player_name, prod_cmd, move_cmd, combat_cmd = Orders.parsing_file(str(filename), diagnostics)
+
+    assert player_name == "flibustiers"
+    assert prod_cmd == {
+        "earth": [Command("build", ("50", "WF"))],
+        "red mars": [Command("research", ("10", "bio")), Command("build", ("1", "BF2", "Firefly #2"))],
+    }
+    assert move_cmd == [Command("explore", ("BF1", "Firefly"))]
+    assert combat_cmd == [Command("attack", ("BF1", "Firefly", "Bob"))]
+    assert diagnostics == ["line 12, column 6: SELL ten food : ten should be a quantity",
+                           "line 18, column 6: JUMP FF firefly PL Venus : FF should be a ship type and size (BF2)",
+                           "line 21, column 14: quote \" is not closed"]
@@ -0,0 +1,105 @@
+import multiprocessing
+import random
+import threading
+import pytest
+import yaml
+
+from bot import Bot
+from server import newgame, play_one_turn
+from server.data import World
+from server.orders import Orders
+from server.report import can_fork
+from server.report_format import columns_to_report, read_binary_report
+from server.test_data import world_state
+
+@pytest.fixture
+def game_world():
+    """ a fresh world, bound during the test : the game played doesn't leak to the other tests """
+    world = World()
+    with world.bound():
+        yield world
+
+@pytest.fixture
+def config():
+    with open("config.EXAMPLE.yml", "r") as f:
+        return yaml.safe_load(f)
+
+def test_orders_from_dict(tmp_path):
+    filename = tmp_path / "orders.txt"
+    filename.write_text('player Bob\nPRODUCTION PL "New Earth"\nBUILD 10 WF\nSELL 5 food\n'
+                        'MOVEMENTS\nEXPLORE BF1 Firefly # go\nCOMBAT\n')
+    parsed = Orders(str(filename))
+    built = Orders.from_dict({"player": "Bob",
+                              "production": {"New Earth": [["BUILD", "10", "WF"], ["SELL", "5", "food"]]},
+                              "movements": [["EXPLORE", "BF1", "Firefly"]]})
+    assert vars(built) == vars(parsed)
+
+def load_bots(folder: str):
+    bots = []
+    for i in range(1, 4):
+        with open(f"bot_config.EXAMPLE{i}.yml", "r") as f:
+            bots.append(Bot(yaml.safe_load(f), folder))
+    return bots
+
+def test_in_memory_game(tmp_path, game_world, config):
+    folder = tmp_path / "game"
+    bots = load_bots(str(folder))
+
+    reports = newgame("testing", str(folder), config, report_channel="dict", persist=False)
+    for turn in range(1, 4):
+        orders = []
+        for bot in bots:
+            bot.play_turn(reports[bot.name])
+            orders.append(bot.get_orders())
+            # same orders as the ones written in a file
+            filename = tmp_path / f"orders.{bot.name}.txt"
+            filename.write_text("\n".join(bot.orders_lines()))
+            assert vars(orders[-1]) == vars(Orders(str(filename)))
+        reports = play_one_turn("testing", str(folder), report_channel="dict", orders=orders, persist=False)
+        assert sorted(reports) == sorted(bot.name for bot in bots)
+        assert all(report["turn"] == turn for report in reports.values())
+
+    assert not folder.exists()
+
+def play_seeded_game(folder: str, config: dict, seed: int, reverse_players: bool, turns: int = 6):
+    """ world state at the end of an in-memory game, played in its own world """
+    random.seed(seed)       # bots randomness
+    bots = load_bots(folder)
+    world = World()
+    reports = newgame("testing", folder, config, report_channel="dict", persist=False, seed=seed, world=world)
+    for turn in range(turns):
+        orders = []
+        for bot in bots:
+            bot.play_turn(reports[bot.name])
+            orders.append(bot.get_orders())
+        if reverse_players:
+            orders.reverse()
+        reports = play_one_turn("testing", folder, report_channel="dict", orders=orders, persist=False, world=world)
+    with world.bound():
+        return world_state()
+
+def test_seeded_game_is_reproducible(tmp_path, config):
+    folder = str(tmp_path / "game")
+    state = play_seeded_game(folder, config, 2024, reverse_players=False)
+    # players played in any order : same game
+    assert play_seeded_game(folder, config, 2024, reverse_players=True) == state
+    assert play_seeded_game(folder, config, 2025, reverse_players=False) != state
+
+def test_orders_errors_are_reported(tmp_path, game_world, config):
+    newgame("testing", str(tmp_path), config, report_channel="dict", persist=False)
+    orders = [Orders.from_dict({"player": "GLaDOS", "movements": [["EXPLORE", "BF1"]]})]
+    play_one_turn("testing", str(tmp_path), report_channel="file-binary", orders=orders, persist=False)
+    report = columns_to_report(read_binary_report(str(tmp_path / "report.GLaDOS.T1.NPZ")))
+    assert report["orders_status"] == ["EXPLORE BF1 : 2 arguments expected"]
+
+def test_reports_fork_without_threads():
+    assert can_fork() == ("fork" in multiprocessing.get_all_start_methods())
+    # another thread alive : the reports are generated without fork
+    release = threading.Event()
+    thread = threading.Thread(target=release.wait)
+    thread.start()
+    try:
+        assert not can_fork()
+    finally:
+        release.set()
+        thread.join()
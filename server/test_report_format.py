@@ -0,0 +1,53 @@
+import pytest
+from server.report_format import encode_binary_report, read_binary_report, columns_to_report, is_columnar
+
+def sample_report():
+    sol = {"name": "Sol", "position": {"x": 1, "y": 2, "z": 3}}
+    return {
+        "turn": 4,
+        "player_status": {"EU": 1250, "technologies": {"bio": 3, "meca": 1, "gv": 2}},
+        "colonies_status": [{"name": "Earth", "WF": 100, "RO": 50, "food": 12.5, "parts": 3.0,
+                             "food_production": 1.5, "parts_production": 0.25,
+                             "planet": {"star": sol, "numero": 3}}],
+        "galaxy_status": [
+            {**sol, "planets": [{"star": sol, "numero": 3, "temperature": 15, "humidity": 60,
+                                 "food_factor": 1.0, "meca_factor": 0.5, "max_food_prod": 120.5,
+                                 "max_wf": 3000, "max_parts_prod": 80.25, "max_ro": 2000}]},
+            {"name": None, "position": {"x": -5, "y": 0, "z": 7}, "planets": []},
+        ],
+        "ships_status": [{"owner_name": "GLaDOS", "type": "bf", "name": "Firefly", "size": 2,
+                          "position": {"x": 1, "y": 2, "z": 3}}],
+        "other_players": [{"name": "HAL9000",
+                           "colonies": [{"planet": {"star": sol, "numero": 2}, "WF": 40, "RO": 10, "turn": 3}],
+                           "ships": [{"type": "bs", "name": "Eye", "size": 1, "position": {"x": 1, "y": 2, "z": 3},
+                                      "turn": 4}]}],
+        "orders_status": ["line 3, column 7: BUILD lots WF : lots should be a quantity"],
+        "combat_status": ["Combat in 1 2 3 against HAL9000", "bs1 Eye of HAL9000 has been destroyed"],
+    }
+
+def test_binary_report_roundtrip(tmp_path):
+    filename = tmp_path / "report.GLaDOS.T4.NPZ"
+    filename.write_bytes(encode_binary_report(sample_report()))
+    columns = read_binary_report(str(filename))
+    assert is_columnar(columns)
+    assert not is_columnar(sample_report())
+    assert columns_to_report(columns) == sample_report()
+
+def test_binary_report_version(tmp_path, monkeypatch):
+    filename = tmp_path / "report.NPZ"
+    filename.write_bytes(encode_binary_report(sample_report()))
+    monkeypatch.setattr("server.report_format.SUPPORTED_SCHEMA_VERSIONS", (1,))
+    with pytest.raises(ValueError):
+        read_binary_report(str(filename))
+
+def test_binary_report_version_1(tmp_path, monkeypatch):
+    # reports written before the intel of the other players
+    monkeypatch.setattr("server.report_format.REPORT_SCHEMA_VERSION", 1)
+    report = sample_report()
+    del report["other_players"]
+    filename = tmp_path / "report.NPZ"
+    filename.write_bytes(encode_binary_report(report))
+    columns = read_binary_report(str(filename))
+    for key in [key for key in columns if key.startswith(("other_", "intel_", "orders_", "combat_"))]:
+        del columns[key]
+    assert columns_to_report(columns) == {**report, "other_players": [], "orders_status": [], "combat_status": []}
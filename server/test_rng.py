@@ -0,0 +1,16 @@
+from server.rng import RandomService
+
+def draws(rng, count: int = 5):
+    return [rng.random() for _ in range(count)]
+
+def test_streams_are_independent():
+    service = RandomService(1234)
+    # same seed, subsystem, turn and keys : same draws, whatever the other streams did before
+    first = draws(service.stream("movements", 3, "GLaDOS"))
+    draws(service.stream("movements", 3, "HAL9000"))
+    assert draws(RandomService(1234).stream("movements", 3, "GLaDOS")) == first
+
+    assert draws(service.stream("movements", 4, "GLaDOS")) != first
+    assert draws(service.stream("production", 3, "GLaDOS")) != first
+    assert draws(RandomService(4321).stream("movements", 3, "GLaDOS")) != first
+    assert (service.generator("galaxy", 0).random(3) == service.generator("galaxy", 0).random(3)).all()
@@ -0,0 +1,50 @@
+import math
+import pytest
+import random
+from server.spatial import SpatialGrid, DistanceMatrix
+
+def test_query_matches_brute_force():
+    rnd = random.Random(42)
+    points = [(rnd.randint(0, 40), rnd.randint(0, 40), rnd.randint(0, 40)) for _ in range(500)]
+    grid = SpatialGrid(cell_size=5)
+    for i, (x, y, z) in enumerate(points):
+        grid.add(x, y, z, i)
+
+    for x, y, z in [(0, 0, 0), (20, 20, 20), (40, 3, 17), (-2, 45, 10)]:
+        for radius in [1, 4.5, 5, 12]:
+            expected = {i for i, (px, py, pz) in enumerate(points)
+                        if (px - x) ** 2 + (py - y) ** 2 + (pz - z) ** 2 < radius ** 2}
+            assert set(grid.query(x, y, z, radius)) == expected
+
+def test_remove():
+    grid = SpatialGrid(cell_size=5)
+    grid.add(1, 2, 3, "a")
+    grid.add(1, 2, 4, "b")
+    grid.remove(1, 2, 3, "a")
+    assert grid.query(1, 2, 3, 2) == ["b"]
+    assert len(grid) == 1
+
+def test_squared_extent():
+    grid = SpatialGrid(cell_size=5)
+    assert grid.squared_extent() == 0
+    for x, y, z in [(1, 2, 3), (-4, 2, 10), (0, 7, 5)]:
+        grid.add(x, y, z, (x, y, z))
+    assert grid.squared_extent() == 5 ** 2 + 5 ** 2 + 7 ** 2
+
+def test_distance_matrix():
+    rnd = random.Random(7)
+    points = [(rnd.randint(0, 40), rnd.randint(0, 40), rnd.randint(0, 40)) for _ in range(50)]
+    matrix = DistanceMatrix(range(50), points, max_rows=2)
+    assert len(matrix) == 50
+    for i, j in [(0, 0), (3, 17), (49, 2), (3, 5)]:
+        assert matrix.row(matrix.index[i])[j] == pytest.approx(math.dist(points[i], points[j]), rel=1e-6)
+    # rows computed on demand, the least recently used ones forgotten
+    assert list(matrix.rows) == [49, 3]
+    matrix.row(0)
+    assert list(matrix.rows) == [3, 0]
+
+def test_distance_matrix_far_apart():
+    # squared deltas beyond the int32 range
+    points = [(0, 0, 0), (60000, -60000, 0)]
+    matrix = DistanceMatrix(points, points)
+    assert matrix.row(0)[1] == pytest.approx(math.dist(*points), rel=1e-6)
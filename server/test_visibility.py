@@ -0,0 +1,64 @@
+import random
+import pytest
+
+import server.sbc_parameters as sbc
+from server.data import GameData, Player, Star, Planet, Colony, Ship, Position, visibility
+from server.newgame import create_galaxy
+
+def brute_force_visible(player):
+    """ previous algorithm : every star in range of every colony and ship """
+    positions = {colony.planet.star.position for colony in player.colonies} | {ship.position for ship in player.ships}
+    return {star for star in Star.stars.values()
+            if any(star.position.distance_to(position) < sbc.VISIBILITY_RANGE for position in positions)}
+
+@pytest.fixture
+def fleet():
+    GameData.reset()
+    rnd = random.Random(3)
+    create_galaxy(4)
+    stars = list(Star.stars.values())
+    players = []
+    for name in ["GLaDOS", "HAL9000"]:
+        player = Player(name=name, email=f"{name}@example.com", prefered_temperature=0, create=True)
+        planet = next(planet for planet in Planet.planets.values() if planet.colony is None)
+        Colony(planet=planet, player=player, WF=10, RO=10, create=True)
+        for i in range(20):
+            Ship(name=f"Scout{i}", player=player, size=1, ship_type="bs",
+                 position=rnd.choice(stars).position, create=True)
+        players.append(player)
+    yield rnd, stars, players
+    GameData.reset()
+
+def test_incremental_visibility(fleet):
+    rnd, stars, players = fleet
+    before = {player: brute_force_visible(player) for player in players}
+    for player in players:
+        assert set(visibility.visible_stars(player)) == before[player]
+        visibility.pop_diff(player)
+
+    # ships move (on stars or between them), some of them are destroyed
+    for player in players:
+        for ship in list(player.ships):
+            draw = rnd.random()
+            if draw < 0.2:
+                ship.delete()
+            elif draw < 0.8:
+                star = rnd.choice(stars)
+                ship.position = Position(star.position.x + rnd.randint(-2, 2), star.position.y, star.position.z)
+
+    for player in players:
+        after = brute_force_visible(player)
+        assert set(visibility.visible_stars(player)) == after
+        diff = visibility.pop_diff(player)
+        assert diff.appeared == after - before[player]
+        assert diff.vanished == before[player] - after
+        assert not visibility.pop_diff(player).appeared
+
+def test_rebuild_after_reset(fleet):
+    rnd, stars, players = fleet
+    visible = {player: set(visibility.visible_stars(player)) for player in players}
+    visibility.reset()
+    for player in players:
+        assert set(visibility.visible_stars(player)) == visible[player]
+        # a rebuilt engine gives all the visible stars in the diff, they are seen again
+        assert visibility.pop_diff(player).appeared == visible[player]
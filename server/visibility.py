@@ -0,0 +1,156 @@
+"""
+Fog of war : what each player sees of the galaxy, kept up to date incrementally
+
+A player observes the galaxy from the positions of his colonies and ships (observer positions).
+The engine counts, for each player :
+    - the observers at each position           (several ships and colonies can share a position)
+    - the observer positions in range of each star  (a star is visible while this count is > 0)
+so a ship move only updates the stars around its old and new positions, whatever the size of the galaxy.
+
+Hooks are called by the data objects (Ship.position, Ship.delete(), Colony creation and deletion),
+the stars must be created before the observers : a new star invalidates the engine.
+The engine is built from the registries at its first use after a reset (new game, loaded snapshot).
+
+Stars that become visible or invisible are gathered in a diff for each player, consumed by the reports
+(see Report.update_seen_stars()) :
+    diff = visibility.pop_diff(player)      # VisibilityDiff(appeared={star, ...}, vanished={star, ...})
+"""
+from dataclasses import dataclass, field
+
+
+@dataclass
+class VisibilityDiff:
+    """ stars that became visible / invisible for a player since the last pop_diff() """
+    appeared: set = field(default_factory=set)
+    vanished: set = field(default_factory=set)
+
+
+class VisibilityEngine:
+    """
+    Visible stars of each player
+
+    Usage :
+        visibility = VisibilityEngine(Star, Player, sbc.VISIBILITY_RANGE)     # see server/data.py
+        visibility.visible_stars(player)        # stars visible this turn
+        visibility.seen_stars(player)           # stars seen at least once
+        visibility.observer_positions(player)   # positions of his colonies and ships
+    """
+    def __init__(self, stars, players, visibility_range: float):
+        self.stars = stars      # registry of the stars : stars.stars, stars.stars_in_range()
+        self.players = players  # registry of the players : players.players
+        self.range = visibility_range
+        self.reset()
+
+    def reset(self):
+        """ forgets everything, the engine is built again at its next use """
+        self.built = False
+        self.observers = {}     # player: {position: number of colonies and ships}
+        self.visible = {}       # player: {star: number of observer positions in range}
+        self.seen = {}          # player: set of stars seen at least once (star.seen_by)
+        self.diffs = {}         # player: VisibilityDiff
+
+    def build(self):
+        """ (re)builds the engine from the registries : colonies, ships and stars seen """
+        self.reset()
+        self.built = True
+        for player in self.players.players.values():
+            self.seen[player] = set()
+            for colony in player.colonies:
+                self.add_observer(player, colony.planet.star.position)
+            for ship in player.ships:
+                self.add_observer(player, ship.position)
+        for star in self.stars.stars.values():
+            for player in star.seen_by:
+                self.seen.setdefault(player, set()).add(star)
+
+    def ensure_built(self):
+        if not self.built:
+            self.build()
+
+    def invalidate(self):
+        """ the galaxy has changed (new star) : the engine will be built again at its next use """
+        if self.built:
+            self.reset()
+
+    # hooks of the data objects
+    def add_observer(self, player, position):
+        if not self.built:
+            return
+        positions = self.observers.setdefault(player, {})
+        count = positions.get(position, 0)
+        positions[position] = count + 1
+        if count == 0:
+            visible = self.visible.setdefault(player, {})
+            diff = self.diffs.setdefault(player, VisibilityDiff())
+            for star in self.stars.stars_in_range(position, self.range):
+                in_range = visible.get(star, 0)
+                visible[star] = in_range + 1
+                if in_range == 0:
+                    if star in diff.vanished:
+                        diff.vanished.discard(star)
+                    else:
+                        diff.appeared.add(star)
+
+    def remove_observer(self, player, position):
+        if not self.built:
+            return
+        positions = self.observers[player]
+        count = positions[position] - 1
+        if count:
+            positions[position] = count
+            return
+        del positions[position]
+        visible = self.visible[player]
+        diff = self.diffs.setdefault(player, VisibilityDiff())
+        for star in self.stars.stars_in_range(position, self.range):
+            in_range = visible[star] - 1
+            if in_range:
+                visible[star] = in_range
+            else:
+                del visible[star]
+                if star in diff.appeared:
+                    diff.appeared.discard(star)
+                else:
+                    diff.vanished.add(star)
+
+    def move_observer(self, player, old_position, new_position):
+        if old_position is new_position:
+            return
+        if old_position is not None:
+            self.remove_observer(player, old_position)
+        self.add_observer(player, new_position)
+
+    # queries
+    def observer_positions(self, player):
+        """ positions of the colonies and ships of the player """
+        self.ensure_built()
+        return self.observers.get(player, {}).keys()
+
+    def stations(self, player):
+        """ stars where the player is (colonies, ships) """
+        stars = self.stars.stars
+        return [stars[position] for position in self.observer_positions(player) if position in stars]
+
+    def visible_stars(self, player):
+        """ stars visible this turn by the player """
+        self.ensure_built()
+        return self.visible.get(player, {}).keys()
+
+    def seen_stars(self, player):
+        """ stars seen at least once by the player """
+        self.ensure_built()
+        return self.seen.get(player, set())
+
+    def mark_seen(self, player, star):
+        """ the player has seen the star, returns False if he had already seen it """
+        if player in star.seen_by:
+            return False
+        star.seen_by.add(player)
+        if self.built:
+            self.seen.setdefault(player, set()).add(star)
+        return True
+
+    def pop_diff(self, player):
+        """ stars that became visible / invisible for the player since the last call """
+        self.ensure_built()
+        return self.diffs.pop(player, VisibilityDiff())